@@ -0,0 +1,401 @@
+"""Input backends used to send mouse and keyboard events.
+
+Every backend has the same small set of methods, and AutomationThread only
+talks to them through the dispatch table in engine.ACTIONS. Libraries are
+imported when a backend is created, not when this module is imported, so
+the null and recording backends work without a display.
+"""
+import os
+import sys
+
+
+def grab_root(root, X, region):
+    """Capture ``region`` of an X root window like InputBackend.grab.
+
+    Only the region is transferred from the X server.
+    """
+    import numpy as np
+
+    x, y, width, height = region
+    image = root.get_image(x, y, width, height, X.ZPixmap, 0xffffffff)
+    if image.depth not in (24, 32):
+        raise RuntimeError(f'Unsupported screen depth {image.depth}')
+    pixels = np.frombuffer(image.data, dtype=np.uint8).reshape(height, width, 4)
+    # ZPixmap pixels are BGRX
+    return pixels[:, :, 2::-1]
+
+
+class InputBackend:
+    name = 'base'
+
+    def click(self, position):
+        raise NotImplementedError
+
+    def double_click(self, position):
+        raise NotImplementedError
+
+    def right_click(self, position):
+        raise NotImplementedError
+
+    def move_to(self, position):
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    def press(self, key, presses=1):
+        raise NotImplementedError
+
+    def typewrite(self, text):
+        raise NotImplementedError
+
+    def position(self):
+        raise NotImplementedError
+
+    def get_clipboard(self):
+        import pyperclip
+        return pyperclip.paste()
+
+    def set_clipboard(self, text):
+        import pyperclip
+        pyperclip.copy(text)
+
+    def size(self):
+        """Screen size as ``(width, height)``."""
+        from PIL import ImageGrab
+        return ImageGrab.grab().size
+
+    def grab(self, region):
+        """Capture ``(x, y, width, height)`` as an RGB uint8 array of shape (height, width, 3).
+
+        Pillow captures only the region on macOS, but the whole screen on
+        Windows and X11, cropping it afterwards.
+        """
+        import numpy as np
+        from PIL import ImageGrab
+
+        x, y, width, height = region
+        image = ImageGrab.grab(bbox=(x, y, x + width, y + height))
+        return np.asarray(image.convert('RGB'))
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIBackend(InputBackend):
+    """Sends input through pyautogui.
+
+    pyautogui sleeps ``PAUSE`` seconds after every call (0.1 s by default),
+    which adds to every step's interval. Here it is set explicitly, and it
+    defaults to 0 because the step intervals already control pacing.
+    """
+    name = 'pyautogui'
+
+    def __init__(self, pause=0.0, failsafe=True):
+        import pyautogui
+        pyautogui.PAUSE = pause
+        pyautogui.FAILSAFE = failsafe
+        self.pyautogui = pyautogui
+        self.click = pyautogui.click
+        self.double_click = pyautogui.doubleClick
+        self.right_click = pyautogui.rightClick
+        self.move_to = pyautogui.moveTo
+        self.hotkey = pyautogui.hotkey
+        self.press = pyautogui.press
+        self.typewrite = pyautogui.typewrite
+        # X connection for grab, opened on the first capture
+        self.display = None
+        self.root = None
+
+    def position(self):
+        x, y = self.pyautogui.position()
+        return x, y
+
+    def size(self):
+        width, height = self.pyautogui.size()
+        return width, height
+
+    def grab(self, region):
+        # On X11 only the region is read, instead of Pillow's full screen
+        if self.root is None and sys.platform.startswith('linux') and os.environ.get('DISPLAY'):
+            from Xlib import X
+            from Xlib.display import Display
+
+            self.X = X
+            self.display = Display()
+            self.root = self.display.screen().root
+        if self.root is not None:
+            return grab_root(self.root, self.X, region)
+        return super().grab(region)
+
+    def close(self):
+        if self.display:
+            self.display.close()
+            self.display = self.root = None
+
+
+class XTestBackend(InputBackend):
+    """Sends input straight to the X server through the XTEST extension.
+
+    Linux only. Uses python-xlib, which pynput and pyautogui already depend
+    on. There is no per-call pause and no failsafe check. ``display`` is an
+    X display name such as ``':1'``; by default ``$DISPLAY`` is used.
+    """
+    name = 'xtest'
+
+    KEY_NAMES = {
+        'ctrl': 'Control_L',
+        'shift': 'Shift_L',
+        'alt': 'Alt_L',
+        'enter': 'Return',
+        'up': 'Up',
+        'down': 'Down',
+        'left': 'Left',
+        'right': 'Right',
+        'end': 'End',
+        'home': 'Home',
+        'backspace': 'BackSpace',
+        'tab': 'Tab',
+        'esc': 'Escape',
+    }
+    # Control characters in typed text, whose code points are not keysyms
+    CHAR_NAMES = {
+        '\n': 'Return',
+        '\r': 'Return',
+        '\t': 'Tab',
+    }
+
+    def __init__(self, display=None):
+        from Xlib import X, XK
+        from Xlib.display import Display
+        from Xlib.ext import xtest
+
+        self.X = X
+        self.XK = XK
+        self.fake_input = xtest.fake_input
+        self.display = Display(display)
+        if not self.display.has_extension('XTEST'):
+            self.display.close()
+            raise RuntimeError('X server does not support the XTEST extension')
+        self.root = self.display.screen().root
+        self.shift = self.display.keysym_to_keycode(XK.string_to_keysym('Shift_L'))
+        self.keycodes = {}
+
+    def _button(self, button, count=1):
+        for _ in range(count):
+            self.fake_input(self.display, self.X.ButtonPress, button)
+            self.fake_input(self.display, self.X.ButtonRelease, button)
+
+    def _move(self, position):
+        x, y = position
+        self.fake_input(self.display, self.X.MotionNotify, x=int(x), y=int(y))
+
+    def click(self, position):
+        self._move(position)
+        self._button(1)
+        self.display.sync()
+
+    def double_click(self, position):
+        self._move(position)
+        self._button(1, 2)
+        self.display.sync()
+
+    def right_click(self, position):
+        self._move(position)
+        self._button(3)
+        self.display.sync()
+
+    def move_to(self, position):
+        self._move(position)
+        self.display.sync()
+
+    def _keysym(self, key):
+        if key in self.CHAR_NAMES:
+            return self.XK.string_to_keysym(self.CHAR_NAMES[key])
+        if len(key) == 1:
+            code = ord(key)
+            # Latin-1 keysyms equal the code point, the rest use the Unicode range
+            return code if code < 0x100 else 0x01000000 + code
+        return self.XK.string_to_keysym(self.KEY_NAMES.get(key.lower(), key))
+
+    def _keycode(self, key):
+        # Returns (keycode, needs_shift), cached per key
+        try:
+            return self.keycodes[key]
+        except KeyError:
+            pass
+        keysym = self._keysym(key)
+        keycode = self.display.keysym_to_keycode(keysym) if keysym else 0
+        if not keycode:
+            raise ValueError(f"No key mapped for '{key}'")
+        needs_shift = (self.display.keycode_to_keysym(keycode, 0) != keysym
+                       and self.display.keycode_to_keysym(keycode, 1) == keysym)
+        self.keycodes[key] = keycode, needs_shift
+        return keycode, needs_shift
+
+    def _tap(self, key):
+        keycode, needs_shift = self._keycode(key)
+        if needs_shift:
+            self.fake_input(self.display, self.X.KeyPress, self.shift)
+        self.fake_input(self.display, self.X.KeyPress, keycode)
+        self.fake_input(self.display, self.X.KeyRelease, keycode)
+        if needs_shift:
+            self.fake_input(self.display, self.X.KeyRelease, self.shift)
+
+    def hotkey(self, *keys):
+        keycodes = [self._keycode(key)[0] for key in keys]
+        for keycode in keycodes:
+            self.fake_input(self.display, self.X.KeyPress, keycode)
+        for keycode in reversed(keycodes):
+            self.fake_input(self.display, self.X.KeyRelease, keycode)
+        self.display.sync()
+
+    def press(self, key, presses=1):
+        for _ in range(presses):
+            self._tap(key)
+        self.display.sync()
+
+    def typewrite(self, text):
+        for char in text:
+            self._tap(char)
+        self.display.sync()
+
+    def position(self):
+        pointer = self.root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def size(self):
+        screen = self.display.screen()
+        return screen.width_in_pixels, screen.height_in_pixels
+
+    def grab(self, region):
+        return grab_root(self.root, self.X, region)
+
+    def close(self):
+        self.display.close()
+
+
+class NullBackend(InputBackend):
+    """Accepts every call and does nothing. Used to measure engine overhead.
+
+    ``grab`` reads from ``screen``, an RGB array that tests can draw into,
+    and returns black when it is None.
+    """
+    name = 'null'
+    clipboard = ''
+    screen = None
+    screen_size = (1920, 1080)
+
+    def click(self, position):
+        pass
+
+    def double_click(self, position):
+        pass
+
+    def right_click(self, position):
+        pass
+
+    def move_to(self, position):
+        pass
+
+    def hotkey(self, *keys):
+        pass
+
+    def press(self, key, presses=1):
+        pass
+
+    def typewrite(self, text):
+        pass
+
+    def position(self):
+        return 0, 0
+
+    def get_clipboard(self):
+        return self.clipboard
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+
+    def size(self):
+        if self.screen is None:
+            return self.screen_size
+        return self.screen.shape[1], self.screen.shape[0]
+
+    def grab(self, region):
+        import numpy as np
+
+        x, y, width, height = region
+        if self.screen is None:
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        return self.screen[y:y + height, x:x + width]
+
+
+class RecordingBackend(InputBackend):
+    """Keeps every call in ``calls`` as ``(method, args)`` for inspection.
+
+    Like NullBackend, ``grab`` reads from ``screen``.
+    """
+    name = 'record'
+
+    def __init__(self):
+        self.calls = []
+        self.pointer = (0, 0)
+        self.clipboard = ''
+        self.screen = None
+        self.screen_size = NullBackend.screen_size
+
+    def click(self, position):
+        self.pointer = position
+        self.calls.append(('click', (position,)))
+
+    def double_click(self, position):
+        self.pointer = position
+        self.calls.append(('double_click', (position,)))
+
+    def right_click(self, position):
+        self.pointer = position
+        self.calls.append(('right_click', (position,)))
+
+    def move_to(self, position):
+        self.pointer = position
+        self.calls.append(('move_to', (position,)))
+
+    def hotkey(self, *keys):
+        self.calls.append(('hotkey', keys))
+
+    def press(self, key, presses=1):
+        self.calls.append(('press', (key,) if presses == 1 else (key, presses)))
+
+    def typewrite(self, text):
+        self.calls.append(('typewrite', (text,)))
+
+    def position(self):
+        return self.pointer
+
+    def get_clipboard(self):
+        return self.clipboard
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+        self.calls.append(('set_clipboard', (text,)))
+
+    def size(self):
+        return NullBackend.size(self)
+
+    def grab(self, region):
+        self.calls.append(('grab', (region,)))
+        return NullBackend.grab(self, region)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PyAutoGUIBackend, XTestBackend, NullBackend, RecordingBackend)
+}
+
+
+def create_backend(name, **options):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown input backend '{name}'") from None
+    return backend(**options)
@@ -0,0 +1,42 @@
+"""Measure the cost of one input call on each backend that can start here.
+
+The null and recording backends always run. pyautogui and xtest need an X
+display, for example ``Xvfb :99 & DISPLAY=:99 python benchmarks/bench_backends.py``.
+
+    python benchmarks/bench_backends.py [calls]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import BACKENDS, create_backend  # noqa: E402
+
+CALLS = (
+    ('move_to', ((10, 10),)),
+    ('press', ('left',)),
+    ('hotkey', ('ctrl', 'a')),
+)
+
+
+def run():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    for name in BACKENDS:
+        try:
+            backend = create_backend(name)
+        except Exception as e:
+            print(f"{name:10} skipped: {e}")
+            continue
+        for method, args in CALLS:
+            fn = getattr(backend, method)
+            start = time.perf_counter()
+            for _ in range(calls):
+                fn(*args)
+            elapsed = time.perf_counter() - start
+            print(f"{name:10} {method:8} {elapsed / calls * 1e6:10.2f} us/call {calls / elapsed:12.0f} calls/s")
+        backend.close()
+
+
+if __name__ == '__main__':
+    run()
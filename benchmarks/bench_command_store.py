@@ -0,0 +1,55 @@
+"""Memory and time per command: list of tuples against CommandStore.
+
+    python benchmarks/bench_command_store.py [commands]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from command_store import CommandStore  # noqa: E402
+
+
+def generate(count):
+    for i in range(count):
+        if i % 10 == 9:
+            yield (i % 1920, i % 1080), 0.25 + (i % 7) / 100, 'text', f'value {i % 100}'
+        else:
+            yield (i % 1920, i % 1080), 0.25 + (i % 7) / 100, 'click'
+
+
+def measure(name, build, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    commands = build()
+    built = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for position, interval, action, *extra_data in commands:
+        pass
+    iterated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in range(0, count, 97):
+        commands[index] = ((1, 1), 0.5, 'enter')
+    edited = (time.perf_counter() - start) / len(range(0, count, 97))
+
+    print(f"{name:14} {size / count:7.1f} B/command   build {built:6.2f} s   "
+          f"iterate {iterated / count * 1e9:6.0f} ns/command   edit {edited * 1e9:6.0f} ns")
+    return size
+
+
+def run():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{count} commands")
+    tuples = measure('list of tuples', lambda: list(generate(count)), count)
+    store = measure('CommandStore', lambda: CommandStore(generate(count)), count)
+    print(f"CommandStore uses {store / tuples:.0%} of the tuple list's memory")
+
+
+if __name__ == '__main__':
+    run()
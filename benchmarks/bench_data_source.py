@@ -0,0 +1,54 @@
+"""Memory and speed of data-driven text steps.
+
+Writes a CSV file of N rows, runs a three-step sequence with a
+placeholder text step once per row on the null backend, and reports rows
+per second and the peak memory traced during the run, which should not
+grow with N.
+
+    python benchmarks/bench_data_source.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import NullBackend  # noqa: E402
+from data_source import DataSource  # noqa: E402
+from engine import Engine, compile_commands  # noqa: E402
+
+COMMANDS = [((10, 10), 0.0, 'click'), ((0, 0), 0.0, 'text', '{name}, {city} ({id})'), ((0, 0), 0.0, 'enter')]
+
+
+def bench(directory, rows):
+    path = os.path.join(directory, f'{rows}.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('id,name,city\n')
+        for i in range(rows):
+            f.write(f'{i},Name {i},City {i % 97}\n')
+
+    backend = NullBackend()
+    tracemalloc.start()
+    data = DataSource(path)
+    plan = compile_commands(COMMANDS, backend, data)
+    start = time.perf_counter()
+    Engine(plan, None, data=data).run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    data.close()
+    print(f"{rows:9} rows  {rows / elapsed:10.0f} rows/s  peak {peak / 1024:8.1f} KiB  "
+          f"file {os.path.getsize(path) / 1024 / 1024:6.1f} MiB")
+
+
+def run():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            bench(directory, rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,109 @@
+"""Compare per-step dispatch cost of the old if/elif chain with the compiled plan.
+
+Both paths send to no-op input calls so only the dispatch overhead is timed.
+
+    python benchmarks/bench_dispatch.py [steps]
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import engine  # noqa: E402
+from backends import NullBackend  # noqa: E402
+
+INPUT_FUNCTIONS = ('click', 'doubleClick', 'rightClick', 'hotkey', 'press', 'typewrite', 'moveTo')
+
+
+def noop(*args, **kwargs):
+    pass
+
+
+def legacy_dispatch(commands, pyautogui):
+    for command in commands:
+        position, interval, action, *extra_data = command
+        text = extra_data[0] if extra_data else ""
+
+        if action == 'click':
+            pyautogui.click(position)
+        elif action == '2click':
+            pyautogui.doubleClick(position)
+        elif action == 'right click':
+            pyautogui.rightClick(position)
+        elif action == 'copy':
+            pyautogui.hotkey('ctrl', 'c')
+        elif action == 'paste':
+            pyautogui.hotkey('ctrl', 'v')
+        elif action == 'enter':
+            pyautogui.press('enter')
+        elif action == 'close tab':
+            pyautogui.hotkey('ctrl', 'w')
+        elif action == 'select all':
+            pyautogui.hotkey('ctrl', 'a')
+        elif action == 'text':
+            pyautogui.typewrite(text)
+        elif action == 'move up':
+            pyautogui.press('up')
+        elif action == 'move down':
+            pyautogui.press('down')
+        elif action == 'move left':
+            pyautogui.press('left')
+        elif action == 'move right':
+            pyautogui.press('right')
+        elif action == 'go to end':
+            pyautogui.hotkey('end')
+        elif action == 'go to beginning':
+            pyautogui.hotkey('home')
+        elif action == 'backspace':
+            pyautogui.press('backspace')
+        elif action == 'none':
+            pyautogui.moveTo(position)
+
+
+def plan_dispatch(plan):
+    for step, delay_ms in plan:
+        step()
+
+
+def make_commands(steps):
+    # Waits poll the screen rather than send input, so they are left out
+    actions = [action for action in engine.ACTIONS if action != 'wait']
+    commands = []
+    for i in range(steps):
+        action = actions[i % len(actions)]
+        if action == 'text':
+            commands.append(((i % 800, i % 600), 0.0, action, 'hello'))
+        else:
+            commands.append(((i % 800, i % 600), 0.0, action))
+    return commands
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    pyautogui = SimpleNamespace(**{name: noop for name in INPUT_FUNCTIONS})
+
+    commands = make_commands(steps)
+    plan = engine.compile_commands(commands, NullBackend())
+
+    legacy = best_of(5, legacy_dispatch, commands, pyautogui)
+    compiled = best_of(5, plan_dispatch, plan)
+
+    print(f"steps:   {steps}")
+    print(f"legacy:  {legacy / steps * 1e9:8.1f} ns/step")
+    print(f"plan:    {compiled / steps * 1e9:8.1f} ns/step")
+    print(f"speedup: {legacy / compiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    run()
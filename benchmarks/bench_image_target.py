@@ -0,0 +1,62 @@
+"""Cost of finding an image-anchored click target.
+
+A reference image is drawn at random places on the null backend's
+in-memory 1920x1080 screen. Reports the time for a full-screen search (the
+image moved) and for a lookup near the last hit (the image stayed put).
+
+    python benchmarks/bench_image_target.py [repeat]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from backends import NullBackend  # noqa: E402
+from image_target import ImageTarget  # noqa: E402
+
+SIZES = ((24, 24), (40, 120), (100, 300))
+
+
+def make_button(rng, height, width):
+    button = np.empty((height, width, 3), dtype=np.uint8)
+    button[:] = rng.integers(0, 256, 3)
+    button[height // 4:height * 3 // 4, width // 6:width * 5 // 6] = 255
+    button[height // 3:height * 2 // 3, width // 4:width * 3 // 4:3] = 0
+    return button
+
+
+def run():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = np.random.default_rng(1)
+    backend = NullBackend()
+    background = (rng.random((1080, 1920, 3)) * 80).astype(np.uint8)
+    with tempfile.TemporaryDirectory() as directory:
+        for height, width in SIZES:
+            button = make_button(rng, height, width)
+            path = os.path.join(directory, f'{width}x{height}.png')
+            Image.fromarray(button).save(path)
+            target = ImageTarget(backend, (0, 0), path)
+
+            full = near = 0.0
+            for _ in range(repeat):
+                backend.screen = background.copy()
+                x, y = int(rng.integers(0, 1920 - width)), int(rng.integers(0, 1080 - height))
+                backend.screen[y:y + height, x:x + width] = button
+                start = time.perf_counter()
+                found = target.locate()
+                full += time.perf_counter() - start
+                assert found == (x + width // 2, y + height // 2), (found, x, y)
+                start = time.perf_counter()
+                target.locate()
+                near += time.perf_counter() - start
+            print(f"{width:4}x{height:<4} full search {full / repeat * 1000:7.1f} ms   "
+                  f"near last hit {near / repeat * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    run()
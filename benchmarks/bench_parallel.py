@@ -0,0 +1,48 @@
+"""Batch throughput of the parallel runner with 1, 2, 4 ... workers.
+
+Runs a sequence of 20 steps at 5 ms intervals for a fixed number of loops,
+split between the workers, and reports loops per second and the speed-up
+over one worker. Uses the null backend unless ``--backend`` names one that
+needs a display, in which case every worker gets its own Xvfb server.
+
+    python benchmarks/bench_parallel.py [--loops N] [--max-workers N] [--backend NAME]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from parallel import run_parallel, split_loops  # noqa: E402
+from sequence_file import save_sequence  # noqa: E402
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--loops', type=int, default=64)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', default='null')
+    args = parser.parse_args()
+
+    commands = [((i * 10, i * 10), 0.005, 'click' if i % 2 else 'enter') for i in range(20)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sequence.json')
+        save_sequence(path, commands)
+        workers = 1
+        baseline = None
+        while workers <= args.max_workers:
+            jobs = [(path, loops) for loops in split_loops(args.loops, workers)]
+            start = time.perf_counter()
+            results = run_parallel(jobs, workers, args.backend)
+            elapsed = time.perf_counter() - start
+            assert all(result['completed'] for result in results), results
+            rate = args.loops / elapsed
+            baseline = baseline or rate
+            print(f"{workers:3} workers  {rate:8.1f} loops/s  x{rate / baseline:.1f}")
+            workers *= 2
+
+
+if __name__ == '__main__':
+    run()
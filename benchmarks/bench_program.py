@@ -0,0 +1,50 @@
+"""A repeated block run as a program against the same block written out.
+
+The program is a 'repeat N' block of ten steps; the expanded list has the
+ten steps N times over. Reports compile time, memory held by the compiled
+plan and steps per second on the null backend.
+
+    python benchmarks/bench_program.py [repeats]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import NullBackend  # noqa: E402
+from engine import Engine, compile_commands  # noqa: E402
+from program import compile_program  # noqa: E402
+
+BODY = [((i * 10, i * 10), 0.0, action) for i, action in
+        enumerate(('click', 'enter', 'move down', 'copy', 'paste', 'click', 'backspace', 'none', 'enter', 'copy'))]
+
+
+def measure(name, build, steps):
+    tracemalloc.start()
+    start = time.perf_counter()
+    plan = build()
+    compiled = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    Engine(plan, 1).run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:9} compile {compiled * 1000:8.1f} ms   plan {held / 1024:9.1f} KiB   "
+          f"{steps / elapsed:10.0f} steps/s")
+
+
+def run():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    backend = NullBackend()
+    steps = repeats * len(BODY)
+    program = [((0, 0), 0.0, 'repeat', str(repeats)), *BODY, ((0, 0), 0.0, 'end')]
+    print(f"{len(BODY)} steps repeated {repeats} times")
+    measure('program', lambda: compile_program(program, backend), steps)
+    measure('expanded', lambda: compile_commands(BODY * repeats, backend), steps)
+
+
+if __name__ == '__main__':
+    run()
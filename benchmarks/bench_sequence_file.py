@@ -0,0 +1,57 @@
+"""Compare loading a large line-format sequence up front with streaming it.
+
+Writes a generated sequence to a temporary ``.jsonl`` file and reports, for
+both ways of running it, the time until the first step runs, the time for
+one full loop, and peak Python memory (tracemalloc).
+
+    python benchmarks/bench_sequence_file.py [steps]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import NullBackend  # noqa: E402
+from engine import StreamingPlan, compile_commands  # noqa: E402
+from sequence_file import load_sequence, open_sequence, save_sequence  # noqa: E402
+
+
+def generate(steps):
+    for i in range(steps):
+        if i % 10 == 9:
+            yield (i % 800, i % 600), 0.0, 'text', f'row {i}'
+        else:
+            yield (i % 800, i % 600), 0.0, 'click'
+
+
+def measure(name, make_plan):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    for step, interval in make_plan():
+        if first is None:
+            first = time.perf_counter() - start
+        step()
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:10} first step {first * 1000:9.2f} ms   loop {total:6.2f} s   peak {peak / 2 ** 20:8.1f} MiB")
+
+
+def run():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    backend = NullBackend()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'large.jsonl')
+        save_sequence(path, generate(steps))
+        print(f"{steps} steps, {os.path.getsize(path) / 2 ** 20:.1f} MiB on disk")
+
+        measure('load all', lambda: compile_commands(load_sequence(path)[0], backend))
+        measure('streaming', lambda: StreamingPlan(open_sequence(path), backend))
+
+
+if __name__ == '__main__':
+    run()
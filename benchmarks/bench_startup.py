@@ -0,0 +1,95 @@
+"""Measure how long the command line runner and the window take to start.
+
+Times a full ``python -m cli --dry-run`` process on a one-step sequence,
+compares it with a bare interpreter and with importing the GUI module, and
+checks the runner never loads PyQt6. Also times a process that opens the
+main window and paints it once (offscreen without a display), and checks
+that opening the window loads none of the input and screenshot libraries,
+which wait for the first Get Position or Start.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Process wall time for the dry run, interpreter startup included
+TARGET_MS = 100
+# Process wall time until the main window has been painted
+WINDOW_TARGET_MS = 400
+# Loaded on first use only
+INPUT_MODULES = ('pyautogui', 'pyscreeze', 'pymsgbox', 'pynput', 'PIL', 'numpy', 'Xlib')
+
+FIRST_PAINT = """
+import sys
+from PyQt6.QtWidgets import QApplication
+import main
+app = QApplication(sys.argv)
+app.setStyleSheet(main.STYLE_SHEET)
+window = main.ClickAutomationApp()
+window.show()
+window.repaint()
+app.processEvents()
+print(','.join(name for name in %r if name in sys.modules))
+""" % (INPUT_MODULES,)
+
+
+def best_time(args, runs):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(args, cwd=ROOT, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.decode(errors='replace').strip().splitlines()[-1:]
+    return best * 1000, None
+
+
+def run():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'version': 1, 'commands': [{'position': [0, 0], 'interval': 0, 'action': 'click'}]}, f)
+        sequence = f.name
+
+    try:
+        cases = [
+            ('python', [sys.executable, '-c', 'pass']),
+            ('cli dry run', [sys.executable, '-m', 'cli', sequence, '--dry-run', '-q']),
+            ('import main', [sys.executable, '-c', 'import main']),
+            ('main window', [sys.executable, '-c', FIRST_PAINT]),
+        ]
+        results = {}
+        for name, args in cases:
+            ms, error = best_time(args, runs)
+            results[name] = ms
+            if ms is None:
+                print(f"{name:12} failed: {' '.join(error)}")
+            else:
+                print(f"{name:12} {ms:8.1f} ms")
+
+        check = 'import sys, cli; cli.main([%r, "--dry-run", "-q"]); print("PyQt6" in sys.modules)' % sequence
+        loads_qt = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True,
+                                  text=True).stdout.strip().endswith('True')
+        print(f"cli loads PyQt6: {loads_qt}")
+        loaded = subprocess.run([sys.executable, '-c', FIRST_PAINT], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+        print(f"window loads input libraries: {loaded or 'none'}")
+    finally:
+        os.unlink(sequence)
+
+    ok = results['cli dry run'] is not None and results['cli dry run'] <= TARGET_MS and not loads_qt
+    print(f"target {TARGET_MS} ms: {'ok' if ok else 'FAILED'}")
+    window_ok = results['main window'] is not None and results['main window'] <= WINDOW_TARGET_MS and not loaded
+    print(f"window target {WINDOW_TARGET_MS} ms: {'ok' if window_ok else 'FAILED'}")
+    return 0 if ok and window_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,57 @@
+"""Time per kilobyte for each text strategy.
+
+Needs an X server for a meaningful result; the keystrokes go to whatever
+window has focus, so run it on a spare display, for example::
+
+    Xvfb :99 & DISPLAY=:99 python benchmarks/bench_text.py --backend xtest
+
+Paste needs a clipboard tool that pyperclip can use (xclip or xsel).
+
+    python benchmarks/bench_text.py [--backend NAME] [--size BYTES]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import BACKENDS, create_backend  # noqa: E402
+from engine import bind_text  # noqa: E402
+
+STRATEGIES = ('type', 'paste', 'chunked:0', 'chunked:1000')
+# Backends that drive a real display
+DISPLAY_BACKENDS = ('pyautogui', 'xtest')
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='pyautogui', choices=sorted(BACKENDS))
+    parser.add_argument('--size', type=int, default=1024, help='text length in characters')
+    args = parser.parse_args()
+
+    if args.backend in DISPLAY_BACKENDS and not os.environ.get('DISPLAY'):
+        print(f"{args.backend} skipped: no display (set DISPLAY, e.g. to an Xvfb server)")
+        return
+    try:
+        backend = create_backend(args.backend)
+    except Exception as e:
+        print(f"{args.backend} skipped: {e}")
+        return
+    text = ('lorem ipsum dolor sit amet ' * (args.size // 27 + 1))[:args.size]
+    print(f"backend {args.backend}, {len(text)} characters")
+    for strategy in STRATEGIES:
+        step = bind_text(backend, text, strategy)
+        try:
+            start = time.perf_counter()
+            step()
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(f"{strategy:14} failed: {e}")
+            continue
+        print(f"{strategy:14} {elapsed / len(text) * 1024 * 1000:10.1f} ms/KB")
+    backend.close()
+
+
+if __name__ == '__main__':
+    run()
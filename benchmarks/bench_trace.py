@@ -0,0 +1,60 @@
+"""Per-step cost of execution tracing and the size of the exported traces.
+
+Runs the engine on the null backend with zero intervals, with and without
+a StepTracer, so the difference is the tracing overhead.
+
+    python benchmarks/bench_trace.py [steps]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import NullBackend  # noqa: E402
+from engine import Engine, compile_commands  # noqa: E402
+from tracing import StepTracer, describe_commands, read_binary, write_binary, write_chrome_trace  # noqa: E402
+
+
+def timed_run(plan, tracer=None):
+    engine = Engine(plan, 1, tracer=tracer)
+    start = time.perf_counter()
+    engine.run()
+    return time.perf_counter() - start
+
+
+def best_of(repeat, fn, *args):
+    return min(fn(*args) for _ in range(repeat))
+
+
+def run():
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    commands = [((i % 800, i % 600), 0.0, 'click') for i in range(steps)]
+    plan = compile_commands(commands, NullBackend())
+
+    plain = best_of(5, timed_run, plan)
+    traced = best_of(5, lambda: timed_run(plan, StepTracer(steps, describe_commands(commands))))
+    print(f"steps:     {steps}")
+    print(f"untraced:  {plain / steps * 1e9:8.1f} ns/step")
+    print(f"traced:    {traced / steps * 1e9:8.1f} ns/step")
+    print(f"overhead:  {(traced - plain) / steps * 1e9:8.1f} ns/step")
+
+    tracer = StepTracer(steps, describe_commands(commands))
+    timed_run(plan, tracer)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'trace.json')
+        binary_path = os.path.join(directory, 'trace.bin')
+        start = time.perf_counter()
+        write_chrome_trace(json_path, tracer)
+        json_time = time.perf_counter() - start
+        start = time.perf_counter()
+        write_binary(binary_path, tracer)
+        binary_time = time.perf_counter() - start
+        assert len(read_binary(binary_path)[0]) == steps
+        print(f"json:      {os.path.getsize(json_path) / steps:8.1f} B/step, written in {json_time * 1000:.0f} ms")
+        print(f"binary:    {os.path.getsize(binary_path) / steps:8.1f} B/step, written in {binary_time * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,129 @@
+"""Region capture cost and how quickly wait steps notice a change.
+
+By default the null backend's in-memory screen is drawn into. With
+``--xvfb`` a private Xvfb server is started, a window is painted on it with
+python-xlib and the xtest backend captures from the real X server, so the
+whole path is exercised without a monitor.
+
+    python benchmarks/bench_visual_wait.py [--xvfb] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import create_backend  # noqa: E402
+from engine import Engine, compile_commands  # noqa: E402
+from parallel import XvfbDisplay  # noqa: E402
+
+REGIONS = (1, 32, 128, 512)
+WIDTH, HEIGHT = 800, 600
+
+
+class MemoryCanvas:
+    def __init__(self, backend):
+        import numpy as np
+
+        backend.screen = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        self.screen = backend.screen
+
+    def fill(self, x, y, width, height, color):
+        self.screen[y:y + height, x:x + width] = color
+
+    def close(self):
+        pass
+
+
+class XCanvas:
+    """A full-screen X window painted with solid rectangles."""
+
+    def __init__(self):
+        from Xlib.display import Display
+
+        self.display = Display()
+        screen = self.display.screen()
+        self.window = screen.root.create_window(0, 0, WIDTH, HEIGHT, 0, screen.root_depth,
+                                                background_pixel=screen.black_pixel,
+                                                override_redirect=True)
+        self.window.map()
+        self.gc = self.window.create_gc()
+        self.display.sync()
+
+    def fill(self, x, y, width, height, color):
+        pixel = (color[0] << 16) | (color[1] << 8) | color[2]
+        self.gc.change(foreground=pixel)
+        self.window.fill_rectangle(self.gc, x, y, width, height)
+        self.display.sync()
+
+    def close(self):
+        self.window.destroy()
+        self.display.close()
+
+
+def bench_grab(backend, repeat):
+    for size in REGIONS:
+        region = (0, 0, size, size)
+        backend.grab(region)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            backend.grab(region)
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"grab {size:4}x{size:<4} {elapsed * 1e6:10.1f} us")
+
+
+def bench_reaction(backend, canvas, repeat, poll):
+    # Time from the change being drawn to the wait step returning
+    delays = []
+    for i in range(repeat):
+        color = (i * 37 % 256, 200, 100)
+        canvas.fill(100, 100, 20, 20, (0, 0, 0))
+        plan = compile_commands([((110, 110), 0.0, 'wait', f'color #{bytes(color).hex()} timeout=5 poll={poll}')],
+                                backend)
+        drawn = [0.0]
+
+        def draw():
+            time.sleep(0.05)
+            drawn[0] = time.perf_counter()
+            canvas.fill(100, 100, 20, 20, color)
+
+        thread = threading.Thread(target=draw)
+        thread.start()
+        Engine(plan, 1).run()
+        delays.append(time.perf_counter() - drawn[0])
+        thread.join()
+    delays.sort()
+    print(f"color wait at {poll} polls/s: median {delays[len(delays) // 2] * 1000:.1f} ms, "
+          f"max {delays[-1] * 1000:.1f} ms after the change")
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--xvfb', action='store_true', help='draw on and capture from a private Xvfb server')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    xvfb = XvfbDisplay('1280x1024x24') if args.xvfb else None
+    if xvfb:
+        os.environ['DISPLAY'] = xvfb.name
+    try:
+        if xvfb:
+            backend = create_backend('xtest')
+            canvas = XCanvas()
+        else:
+            backend = create_backend('null')
+            canvas = MemoryCanvas(backend)
+        bench_grab(backend, args.repeat * 10)
+        for poll in (20, 100):
+            bench_reaction(backend, canvas, args.repeat, poll)
+        canvas.close()
+        backend.close()
+    finally:
+        if xvfb:
+            xvfb.close()
+
+
+if __name__ == '__main__':
+    run()
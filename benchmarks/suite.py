@@ -0,0 +1,266 @@
+"""Benchmark suite for the engine, with machine-readable results.
+
+Measures, by default on the null backend so no display is needed:
+
+* throughput: steps per second with zero intervals
+* lateness: p50/p99/max scheduling lateness at 1, 10 and 100 ms intervals
+* control: pause, resume and stop latency of a running engine
+* startup: process time of ``import main``, of opening and painting the
+  main window and of a ``cli --dry-run``
+* memory: bytes per command for 100k commands, stored and compiled
+
+``--xvfb`` starts a private Xvfb server and runs everything against it, so
+``--backend xtest`` or ``--backend pyautogui`` can be measured on a machine
+without a screen. ``--json FILE`` writes the results, and ``--compare FILE``
+prints each metric next to an earlier result file.
+
+    python benchmarks/suite.py [--quick] [--backend NAME] [--xvfb] [--json FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backends import BACKENDS, create_backend  # noqa: E402
+from command_store import CommandStore  # noqa: E402
+from engine import DeadlineScheduler, Engine, RunControl, compile_commands  # noqa: E402
+from parallel import XvfbDisplay  # noqa: E402
+
+from bench_startup import FIRST_PAINT  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def make_commands(count, interval=0.0):
+    return [((i % 800, i % 600), interval, 'click') for i in range(count)]
+
+
+def bench_throughput(backend, steps):
+    plan = compile_commands(make_commands(steps), backend)
+    best = float('inf')
+    for _ in range(3):
+        engine = Engine(plan, 1)
+        start = time.perf_counter()
+        engine.run()
+        best = min(best, time.perf_counter() - start)
+    return {'steps': steps, 'steps_per_s': steps / best, 'ns_per_step': best / steps * 1e9}
+
+
+def bench_lateness(backend, seconds):
+    results = {}
+    for interval_ms in (1, 10, 100):
+        steps = max(10, int(seconds * 1000 / interval_ms))
+        plan = compile_commands(make_commands(steps, interval_ms / 1000), backend)
+        scheduler = DeadlineScheduler()
+        Engine(plan, 1, scheduler).run()
+        stats = scheduler.stats()
+        results[f'{interval_ms}ms'] = {
+            'steps': stats['count'],
+            'p50_ms': stats['p50'] * 1000,
+            'p99_ms': stats['p99'] * 1000,
+            'max_ms': stats['max'] * 1000,
+        }
+    return results
+
+
+class TimedControl(RunControl):
+    """Notes when the engine starts waiting while paused."""
+
+    def __init__(self):
+        super().__init__()
+        self.blocked = threading.Event()
+        self.blocked_at = None
+
+    def wait_if_paused(self):
+        self.blocked_at = time.perf_counter()
+        self.blocked.set()
+        return super().wait_if_paused()
+
+
+def bench_control(backend, repeat):
+    pause = []
+    resume = []
+    stop = []
+    for _ in range(repeat):
+        # Busy zero-interval steps: pause and resume cost one step at most
+        stepped = threading.Event()
+        stepped_at = [0.0]
+
+        def step():
+            # Only the first step after the event was cleared counts
+            if not stepped.is_set():
+                stepped_at[0] = time.perf_counter()
+                stepped.set()
+
+        control = TimedControl()
+        engine = Engine([(step, 0.0)], 10 ** 9, control=control)
+        thread = threading.Thread(target=engine.run)
+        thread.start()
+        stepped.wait()
+
+        requested = time.perf_counter()
+        control.pause()
+        control.blocked.wait()
+        pause.append(control.blocked_at - requested)
+
+        stepped.clear()
+        requested = time.perf_counter()
+        control.resume()
+        stepped.wait()
+        resume.append(stepped_at[0] - requested)
+
+        # Stop during a long interval has to interrupt the sleep
+        control.stop()
+        thread.join()
+        control = RunControl()
+        engine = Engine(compile_commands(make_commands(1, 10.0), backend), 1, DeadlineScheduler(), control)
+        thread = threading.Thread(target=engine.run)
+        thread.start()
+        time.sleep(0.01)
+        requested = time.perf_counter()
+        control.stop()
+        thread.join()
+        stop.append(time.perf_counter() - requested)
+
+    def summary(values):
+        values = sorted(values)
+        return {'median_ms': values[len(values) // 2] * 1000, 'max_ms': values[-1] * 1000}
+
+    return {'pause': summary(pause), 'resume': summary(resume), 'stop': summary(stop)}
+
+
+def process_ms(args, runs):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(args, cwd=ROOT, capture_output=True)
+        if result.returncode != 0:
+            return None
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_startup(runs):
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({'version': 1, 'commands': [{'position': [0, 0], 'interval': 0, 'action': 'click'}]}, f)
+        sequence = f.name
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    try:
+        # None means the case failed
+        return {
+            'python_ms': process_ms([sys.executable, '-c', 'pass'], runs),
+            'import_main_ms': process_ms([sys.executable, '-c', 'import main'], runs),
+            'main_window_ms': process_ms([sys.executable, '-c', FIRST_PAINT], runs),
+            'cli_dry_run_ms': process_ms([sys.executable, '-m', 'cli', sequence, '--dry-run', '-q'], runs),
+        }
+    finally:
+        os.unlink(sequence)
+
+
+def traced_bytes(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def bench_memory(backend, count=100_000):
+    commands = make_commands(count, 0.5)
+    store, store_bytes = traced_bytes(lambda: CommandStore(commands))
+    plan, plan_bytes = traced_bytes(lambda: compile_commands(store, backend))
+    return {
+        'commands': count,
+        'store_bytes_per_command': store_bytes / count,
+        'plan_bytes_per_command': plan_bytes / count,
+    }
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        else:
+            yield name, value
+
+
+def print_results(results, baseline=None):
+    previous = dict(flatten(baseline['results'])) if baseline else {}
+    for name, value in flatten(results):
+        if not isinstance(value, float):
+            line = f'{name:40} {value}'
+        else:
+            line = f'{name:40} {value:14.3f}'
+            old = previous.get(name)
+            if isinstance(old, (int, float)) and old:
+                line += f'   was {old:14.3f}  ({value / old:5.2f}x)'
+        print(line)
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='null', choices=sorted(BACKENDS))
+    parser.add_argument('--xvfb', action='store_true', help='run against a private Xvfb server')
+    parser.add_argument('--quick', action='store_true', help='fewer steps and repeats, for a smoke test')
+    parser.add_argument('--only', nargs='+', choices=('throughput', 'lateness', 'control', 'startup', 'memory'),
+                        help='run only these benchmarks')
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON ('-' for stdout only)")
+    parser.add_argument('--compare', metavar='FILE', help='show each metric next to an earlier JSON result')
+    args = parser.parse_args()
+
+    xvfb = XvfbDisplay('1280x1024x24') if args.xvfb else None
+    if xvfb:
+        os.environ['DISPLAY'] = xvfb.name
+    try:
+        backend = create_backend(args.backend)
+        benchmarks = {
+            'throughput': lambda: bench_throughput(backend, 20_000 if args.quick else 200_000),
+            'lateness': lambda: bench_lateness(backend, 0.5 if args.quick else 3.0),
+            'control': lambda: bench_control(backend, 3 if args.quick else 20),
+            'startup': lambda: bench_startup(2 if args.quick else 10),
+            'memory': lambda: bench_memory(backend),
+        }
+        results = {}
+        for name, bench in benchmarks.items():
+            if not args.only or name in args.only:
+                results[name] = bench()
+        backend.close()
+    finally:
+        if xvfb:
+            xvfb.close()
+
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'xvfb': args.xvfb,
+        'quick': args.quick,
+        'results': results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=1)
+        print()
+        return
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,168 @@
+"""Checkpoints for resuming a run after the last completed step.
+
+While a run goes on, the engine appends one record per completed step to
+the checkpoint file: the loop, the number of steps done in that loop, a
+data cursor (0 unless the run reads a data source) and the plan's own
+state, if it has one. A program (see program.py) saves where its
+interpreter is, so a resumed run continues there without evaluating the
+conditions of the steps it skips again. A record is one ``write`` call,
+so it survives the process crashing. Records
+are fsynced at most every ``sync_interval`` seconds, which bounds what a
+power loss can cost. The file is rewritten with just its latest record
+once it grows past ``compact_after`` records.
+
+The header holds a digest of the sequence, so a checkpoint is only offered
+for the sequence it was written for. A run that finishes removes its
+checkpoint; a stopped or crashed run leaves it behind.
+"""
+import hashlib
+import os
+import struct
+import time
+
+from sequence_file import command_to_line
+
+MAGIC = b'CPCK'
+VERSION = 2
+# magic, version, sequence digest
+HEADER = struct.Struct('<4sH32s')
+# loop, steps done in the loop, data cursor, number of state values that follow
+RECORD = struct.Struct('<IIQI')
+STATE_VALUE = struct.Struct('<I')
+SYNC_INTERVAL = 1.0
+COMPACT_AFTER = 65536
+
+
+def sequence_digest(commands, variant=''):
+    """SHA-256 of the commands as they would be saved, one line each.
+
+    ``variant`` tells apart runs of the same commands whose steps differ,
+    e.g. 'optimized' (see optimizer.py).
+    """
+    digest = hashlib.sha256(variant.encode('utf-8'))
+    columns = getattr(commands, 'columns', None)
+    if columns:
+        # A CommandStore is hashed column by column, which is much faster.
+        # Interned ids depend on the edits that led to the commands, so the
+        # strings they stand for are hashed instead.
+        xs, ys, intervals, action_codes, text_ids, strategy_ids = columns()
+        for column in (xs, ys, intervals):
+            digest.update(column.tobytes())
+        for table, ids in ((commands.action_names, action_codes), (commands.texts, text_ids),
+                           (commands.texts, strategy_ids)):
+            digest.update('\0'.join(map(table.__getitem__, ids)).encode('utf-8', 'surrogatepass'))
+            digest.update(b'\n')
+        return digest.digest()
+    for command in commands:
+        digest.update(command_to_line(command).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.digest()
+
+
+def pack_record(loop, step, cursor, state=()):
+    return RECORD.pack(loop, step, cursor, len(state)) + struct.pack(f'<{len(state)}I', *state)
+
+
+def read_checkpoint(path, digest):
+    """Return ``(loop, step, cursor, state)`` of the last record in ``path``.
+
+    ``step`` is the number of steps completed in ``loop`` and ``state`` a
+    tuple of the plan's state values. Returns None if there is no
+    checkpoint, it belongs to another sequence or it has no complete
+    record.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size + RECORD.size:
+        return None
+    magic, version, stored = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or stored != digest:
+        return None
+    last = None
+    offset = HEADER.size
+    # A crash can leave a partial record at the end
+    while offset + RECORD.size <= len(data):
+        loop, step, cursor, size = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + size * STATE_VALUE.size
+        if end > len(data):
+            break
+        state = struct.unpack_from(f'<{size}I', data, offset + RECORD.size)
+        last = loop, step, cursor, state
+        offset = end
+    return last
+
+
+class Checkpoint:
+    """Append-only checkpoint writer used by engine.Engine.
+
+    ``cursor`` is an optional callable returning the current position in a
+    data source, stored with every record.
+    """
+
+    def __init__(self, path, digest, sync_interval=SYNC_INTERVAL, compact_after=COMPACT_AFTER, cursor=None,
+                 clock=time.monotonic):
+        self.path = path
+        self.digest = digest
+        self.sync_interval = sync_interval
+        self.compact_after = compact_after
+        self.cursor = cursor
+        self.clock = clock
+        self.fd = None
+        self.records = 0
+        self.next_sync = 0.0
+
+    def open(self, loop=1, step=0, state=()):
+        """Start a fresh checkpoint at ``loop`` with ``step`` steps done."""
+        self.rewrite(loop, step, self.cursor() if self.cursor else 0, state)
+
+    def rewrite(self, loop, step, cursor, state=()):
+        # Written aside and renamed, so a crash leaves the old or the new file
+        temporary = f'{self.path}.tmp'
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, HEADER.pack(MAGIC, VERSION, self.digest) + pack_record(loop, step, cursor, state))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temporary, self.path)
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.records = 1
+        self.next_sync = self.clock() + self.sync_interval
+
+    @property
+    def opened(self):
+        # Callers may open it before the run, e.g. to report errors early
+        return self.fd is not None
+
+    def record(self, loop, step, state=()):
+        cursor = self.cursor() if self.cursor else 0
+        if self.records >= self.compact_after:
+            self.rewrite(loop, step, cursor, state)
+            return
+        os.write(self.fd, pack_record(loop, step, cursor, state) if state else RECORD.pack(loop, step, cursor, 0))
+        self.records += 1
+        now = self.clock()
+        if now >= self.next_sync:
+            os.fsync(self.fd)
+            self.next_sync = now + self.sync_interval
+
+    def close(self):
+        if self.fd is not None:
+            os.fsync(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def discard(self):
+        """Close and remove the checkpoint, e.g. when the run finished."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
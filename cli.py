@@ -0,0 +1,294 @@
+"""Run a saved sequence without the GUI.
+
+    python -m cli sequence.json --loops 10 --timing
+
+Uses the same engine as the GUI but never imports Qt, so it starts quickly
+on machines that run sequences from cron.
+"""
+import time
+
+START = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+
+from backends import BACKENDS, create_backend  # noqa: E402
+from checkpoint import SYNC_INTERVAL, Checkpoint, read_checkpoint, sequence_digest  # noqa: E402
+from engine import (DeadlineScheduler, Engine, ProgressChannel, RunControl, StreamingPlan,  # noqa: E402
+                    compile_commands, format_timing_stats)
+from image_target import AnchoredStep  # noqa: E402
+from optimizer import optimize_commands  # noqa: E402
+from program import compile_program, uses_control_flow  # noqa: E402
+from sequence_file import open_sequence  # noqa: E402
+from tracing import StepTracer, describe_commands, describe_streamed, write_trace  # noqa: E402
+from visual_wait import VisualWait  # noqa: E402
+from watchdog import BUDGET, POLICIES, StepBudgets, StreamedBudgets, Watchdog  # noqa: E402
+
+
+def skip():
+    pass
+
+
+def dry_step(step):
+    # Steps that look at the screen are checked when they are bound or
+    # prepared, but never wait for it
+    if isinstance(step, VisualWait):
+        return step.prepare
+    if isinstance(step, AnchoredStep):
+        return skip
+    return step
+
+
+def dry_condition(wait, index):
+    # Conditions are VisualWait.wait methods; dry runs take the 'if' branch
+    wait.__self__.prepare()
+    return True
+
+
+class ZeroIntervals:
+    """Re-iterable view of a plan for dry runs.
+
+    Every interval is 0, wait steps only load what they need, image-anchored
+    steps do nothing and program conditions always hold.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        state = getattr(plan, 'state', None)
+        if state:
+            self.state = state
+
+    def indexed(self, state=None, guard=None):
+        indexed = getattr(self.plan, 'indexed', None)
+        if indexed:
+            steps = indexed(state, dry_condition)
+        else:
+            steps = enumerate(self.plan)
+        for index, (step, interval) in steps:
+            yield index, (dry_step(step), 0.0)
+
+
+def compile_sequence(sequence, backend, optimize=False, data=None):
+    """Compile an opened sequence file the way its contents need.
+
+    Returns ``(plan, optimized)``, where ``optimized`` is the
+    optimizer.Optimized the plan came from, or None. ``data`` is an
+    optional data_source.DataSource for text placeholders.
+    """
+    if sequence.streaming:
+        # Large line files are compiled while they are read
+        return StreamingPlan(sequence, backend, data), None
+    if uses_control_flow(command[2] for command in sequence.commands):
+        # Repeats, subroutines and branches run without expanding them
+        return compile_program(sequence, backend, data), None
+    if optimize:
+        optimized = optimize_commands(sequence)
+        return optimized.compile(backend, data), optimized
+    return compile_commands(sequence, backend, data), None
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Run a saved ClickerPro sequence.')
+    parser.add_argument('sequence', help='sequence file to run')
+    parser.add_argument('-n', '--loops', type=int,
+                        help='number of loops (default: the value saved in the file, or 1)')
+    parser.add_argument('--backend', default='pyautogui', choices=sorted(BACKENDS),
+                        help='input backend (default: pyautogui)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='check and run the sequence with no input sent and no waiting; waits and '
+                             "image targets are only checked, and every 'if' takes its first branch")
+    parser.add_argument('--timing', action='store_true',
+                        help='print startup time, run time and scheduling lateness')
+    parser.add_argument('--interval-mode', action='store_true',
+                        help='sleep after each step instead of keeping an absolute schedule')
+    parser.add_argument('--no-catch-up', action='store_true',
+                        help='when behind schedule, skip ahead instead of catching up')
+    parser.add_argument('--optimize', action='store_true',
+                        help='merge redundant zero-interval steps before running')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write an execution trace: Chrome trace JSON, or compact binary for .bin')
+    parser.add_argument('--trace-capacity', type=int, default=100_000, metavar='N',
+                        help='keep the last N steps in the trace (default: 100000)')
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help='record every completed step in FILE so a stopped run can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue after the last step recorded in the --checkpoint file')
+    parser.add_argument('--checkpoint-sync', type=float, default=SYNC_INTERVAL, metavar='S',
+                        help=f'flush the checkpoint to disk at most every S seconds (default: {SYNC_INTERVAL:g})')
+    parser.add_argument('--data', metavar='FILE',
+                        help='CSV or JSONL rows for {column} placeholders in text steps, one row per loop; '
+                             'without --loops the run ends with the rows')
+    parser.add_argument('--data-offset', type=int, default=0, metavar='N',
+                        help='skip the first N data rows, e.g. to continue an interrupted run')
+    parser.add_argument('--step-timeout', type=float, metavar='S',
+                        help='run steps under a watchdog that steps in when one takes longer than S seconds '
+                             '(text and wait steps get more for their length and timeout)')
+    parser.add_argument('--action-timeout', action='append', default=[], metavar='ACTION=S',
+                        help="budget for one action instead, e.g. 'text=60'; 0 for no limit; can be repeated")
+    parser.add_argument('--timeout-policy', default='abort', choices=POLICIES,
+                        help='what to do with a step over its budget: end the run, skip it, or run it '
+                             'once more before ending the run (default: abort)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print progress')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        sequence = open_sequence(args.sequence)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading {args.sequence}: {e}", file=sys.stderr)
+        return 1
+    num_loops = args.loops if args.loops is not None else sequence.loops or 1
+    action_budgets = {}
+    for budget in args.action_timeout:
+        action, _, seconds = budget.partition('=')
+        try:
+            action_budgets[action.strip()] = float(seconds)
+        except ValueError:
+            print(f"--action-timeout needs ACTION=SECONDS, got '{budget}'", file=sys.stderr)
+            return 1
+    data = None
+    if args.data:
+        from data_source import DataSource
+        try:
+            data = DataSource(args.data, args.data_offset)
+        except (OSError, ValueError) as e:
+            print(f"Error loading {args.data}: {e}", file=sys.stderr)
+            return 1
+        if args.loops is None:
+            # One loop per row, however many there are
+            num_loops = None
+
+    backend_name = 'null' if args.dry_run else args.backend
+    try:
+        backend = create_backend(backend_name)
+    except Exception as e:
+        print(f"Could not start input backend '{backend_name}': {e}", file=sys.stderr)
+        return 1
+
+    try:
+        plan, optimized = compile_sequence(sequence, backend, args.optimize, data)
+    except ValueError as e:
+        print(f"Invalid sequence: {e}", file=sys.stderr)
+        return 1
+    if args.optimize and not optimized and not args.quiet:
+        if sequence.streaming:
+            print("Not optimizing: streaming sequences are compiled as they are read")
+        else:
+            print("Not optimizing: the sequence has control rows")
+    if optimized and not args.quiet:
+        print(optimized.summary())
+
+    # The streaming plan itself, also when a dry run wraps it
+    streamed = plan
+    if args.dry_run:
+        plan = ZeroIntervals(plan)
+        scheduler = None
+    elif args.interval_mode:
+        scheduler = None
+    else:
+        scheduler = DeadlineScheduler(catch_up=not args.no_catch_up)
+
+    def on_progress(loop, step):
+        if optimized:
+            step = optimized.rows[step]
+        print(f"Loop: {loop}/{num_loops or '?'}, step {step + 1}", flush=True)
+
+    checkpoint = None
+    start = (1, 0)
+    if args.checkpoint:
+        try:
+            variant = 'optimized' if optimized else ''
+            if data:
+                variant += f' data={os.path.abspath(args.data)}'
+            digest = sequence_digest(sequence, variant)
+        except ValueError as e:
+            print(f"Invalid sequence: {e}", file=sys.stderr)
+            return 1
+        saved = read_checkpoint(args.checkpoint, digest) if args.resume else None
+        if saved:
+            start = saved[0], saved[1], saved[3]
+            if data:
+                # Back to the row the interrupted loop was working on
+                data.seek(saved[2])
+            if not args.quiet:
+                print(f"Resuming in loop {start[0]}/{num_loops or '?'} after step {start[1]}")
+        elif args.resume and not args.quiet:
+            print(f"No checkpoint for this sequence in {args.checkpoint}, starting from the beginning")
+        checkpoint = Checkpoint(args.checkpoint, digest, args.checkpoint_sync,
+                                cursor=(lambda: data.row_index) if data else None)
+    elif args.resume:
+        print("--resume needs --checkpoint", file=sys.stderr)
+        return 1
+
+    watchdog = None
+    if args.step_timeout is not None or action_budgets:
+        default = args.step_timeout if args.step_timeout is not None else BUDGET
+        rows = optimized.rows if optimized else None
+        describe = None
+        if sequence.streaming:
+            # Each row is budgeted when the plan compiles it
+            budgets = StreamedBudgets(streamed, action_budgets, default, data)
+        else:
+            budgets = StepBudgets(sequence.commands, action_budgets, default, rows, data)
+
+            def describe(step):
+                row = rows[step] if rows else step
+                return f"Step {row + 1} ({sequence.commands[row][2]})"
+
+        def on_timeout(step, seconds, outcome):
+            # An abort is reported by the error that ends the run
+            if outcome != 'aborted':
+                name = describe(step) if describe else f"Step {step + 1}"
+                print(f"{name} {outcome} after {seconds:.1f} s", file=sys.stderr)
+
+        watchdog = Watchdog(budgets, args.timeout_policy, on_timeout=on_timeout, describe=describe,
+                            default=default)
+
+    progress = None if args.quiet else ProgressChannel(on_progress, max_rate=2)
+    tracer = None
+    if args.trace:
+        # The tracer records each step's action and position as it runs
+        tracer = StepTracer(args.trace_capacity, describe_streamed(streamed) if sequence.streaming
+                            else describe_commands(sequence.commands, optimized.rows if optimized else None))
+    engine = Engine(plan, num_loops, scheduler, RunControl(), progress, tracer=tracer, checkpoint=checkpoint,
+                    start=start, data=data, watchdog=watchdog)
+    started = time.perf_counter()
+    if args.timing:
+        print(f"Startup: {(started - START) * 1000:.1f} ms")
+
+    try:
+        completed = engine.run()
+    except KeyboardInterrupt:
+        engine.control.stop()
+        print(f"Interrupted in loop {engine.current_loop}/{num_loops or '?'}", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"Error during automation: {e}", file=sys.stderr)
+        if tracer:
+            tracer.error(e)
+        return 1
+    finally:
+        backend.close()
+        if data:
+            if data.row is not None and engine.current_loop != num_loops:
+                print(f"Data row {data.row_index + 1} was not finished; "
+                      f"--data-offset {data.row_index} continues with it", file=sys.stderr)
+            data.close()
+        if tracer:
+            write_trace(args.trace, tracer)
+
+    if args.timing:
+        elapsed = time.perf_counter() - started
+        steps = engine.steps_run
+        print(f"Run: {elapsed:.3f} s for {steps} steps ({steps / elapsed if elapsed else 0:.0f} steps/s)")
+        if scheduler:
+            print(format_timing_stats(scheduler.stats()))
+    return 0 if completed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Qt model and undoable edits for the command list.
+
+CommandListModel presents a CommandStore to a QListView. Rows are
+formatted only when the view asks for them, so loading a large sequence
+costs one model reset no matter how many steps it has. All edits go
+through the QUndoCommand classes below so they can be undone.
+"""
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt6.QtGui import QColor, QFont, QUndoCommand
+
+from command_store import CommandStore
+from program import CONTROL_ACTIONS
+
+
+class CommandListModel(QAbstractListModel):
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store if store is not None else CommandStore()
+        self.current_row = -1
+        # Bumped on every change to the commands, not on highlighting
+        self.revision = 0
+        self.current_background = QColor('#5A5A5A')
+        self.current_font = QFont()
+        self.current_font.setBold(True)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            position, interval, action, *extra = self.store[row]
+            if action in CONTROL_ACTIONS:
+                # Control rows take no time of their own
+                return ' '.join([action.capitalize(), *extra])
+            return f'Action: {action}, Interval: {interval}s'
+        if row == self.current_row:
+            if role == Qt.ItemDataRole.BackgroundRole:
+                return self.current_background
+            if role == Qt.ItemDataRole.FontRole:
+                return self.current_font
+        return None
+
+    def setStore(self, store):
+        self.beginResetModel()
+        self.store = store
+        self.current_row = -1
+        self.revision += 1
+        self.endResetModel()
+
+    def insertCommands(self, row, commands):
+        if not commands:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(commands) - 1)
+        self.store.insert_many(row, commands)
+        self.revision += 1
+        self.endInsertRows()
+
+    def removeCommands(self, rows):
+        """Remove ``rows`` and return the removed commands in row order."""
+        rows = sorted(rows)
+        removed = [self.store[row] for row in rows]
+        self.revision += 1
+        if len(rows) > 1:
+            # One reset for a bulk removal instead of a signal per row
+            self.beginResetModel()
+            self.store.delete_many(rows)
+            self.endResetModel()
+        elif rows:
+            self.beginRemoveRows(QModelIndex(), rows[0], rows[0])
+            del self.store[rows[0]]
+            self.endRemoveRows()
+        return removed
+
+    def restoreCommands(self, rows, commands):
+        # Put removed commands back at their original rows
+        self.beginResetModel()
+        for row, command in sorted(zip(rows, commands)):
+            self.store.insert(row, command)
+        self.revision += 1
+        self.endResetModel()
+
+    def setCommands(self, rows, commands):
+        for row, command in zip(rows, commands):
+            self.store[row] = command
+        self.revision += 1
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+
+    def setCurrentRow(self, row):
+        # Highlight the step being run. Only the old and new rows are repainted.
+        previous = self.current_row
+        if row == previous:
+            return
+        self.current_row = row
+        if 0 <= previous < len(self.store):
+            self.dataChanged.emit(self.index(previous), self.index(previous))
+        if 0 <= row < len(self.store):
+            self.dataChanged.emit(self.index(row), self.index(row))
+
+
+class InsertCommands(QUndoCommand):
+    def __init__(self, model, row, commands, text='Add'):
+        super().__init__(text)
+        self.model = model
+        self.row = row
+        self.commands = list(commands)
+
+    def redo(self):
+        self.model.insertCommands(self.row, self.commands)
+
+    def undo(self):
+        self.model.removeCommands(range(self.row, self.row + len(self.commands)))
+
+
+class RemoveCommands(QUndoCommand):
+    def __init__(self, model, rows, text='Remove'):
+        super().__init__(text)
+        self.model = model
+        self.rows = sorted(rows)
+        self.commands = []
+
+    def redo(self):
+        self.commands = self.model.removeCommands(self.rows)
+
+    def undo(self):
+        self.model.restoreCommands(self.rows, self.commands)
+
+
+class UpdateCommands(QUndoCommand):
+    def __init__(self, model, rows, commands, text='Edit'):
+        super().__init__(text)
+        self.model = model
+        self.rows = list(rows)
+        self.new = list(commands)
+        self.old = [model.store[row] for row in self.rows]
+
+    def redo(self):
+        self.model.setCommands(self.rows, self.new)
+
+    def undo(self):
+        self.model.setCommands(self.rows, self.old)
+
+
+class ReplaceCommands(QUndoCommand):
+    """Swap in a whole new store, e.g. when loading a file or resetting."""
+
+    def __init__(self, model, store, text='Replace'):
+        super().__init__(text)
+        self.model = model
+        self.new = store
+        self.old = model.store
+
+    def redo(self):
+        self.model.setStore(self.new)
+
+    def undo(self):
+        self.model.setStore(self.old)
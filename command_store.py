@@ -0,0 +1,151 @@
+"""Compact storage for command sequences.
+
+CommandStore behaves like a list of
+``(position, interval, action[, text[, strategy]])`` tuples, but it keeps each field in its own typed array. Action names and
+texts are interned, so a step costs about 20 bytes instead of a tuple, a
+position tuple, a float and a string reference. That matters for generated
+sequences with hundreds of thousands of steps.
+"""
+from array import array
+from itertools import compress
+
+# Actions whose fourth field is text: what to type, a wait condition, or the
+# argument of a control row (see program.py)
+TEXT_ACTIONS = ('text', 'wait', 'repeat', 'sub', 'call', 'if')
+# Pointer actions may have an image to find on screen as their fourth field
+ANCHOR_ACTIONS = ('click', '2click', 'right click', 'none')
+
+
+class CommandStore:
+    def __init__(self, commands=()):
+        self.clear()
+        self.extend(commands)
+
+    def clear(self):
+        self.xs = array('i')
+        self.ys = array('i')
+        self.intervals = array('d')
+        self.action_codes = array('H')
+        self.text_ids = array('I')
+        # Text strategy of text steps, interned in the text table ('' = type)
+        self.strategy_ids = array('I')
+        self.action_names = []
+        self.action_ids = {}
+        # Text 0 is the empty string, used by every non-text step
+        self.texts = ['']
+        self.text_index = {'': 0}
+
+    def intern_action(self, action):
+        try:
+            return self.action_ids[action]
+        except KeyError:
+            code = self.action_ids[action] = len(self.action_names)
+            self.action_names.append(action)
+            return code
+
+    def intern_text(self, text):
+        try:
+            return self.text_index[text]
+        except KeyError:
+            text_id = self.text_index[text] = len(self.texts)
+            self.texts.append(text)
+            return text_id
+
+    def encode(self, command):
+        position, interval, action, *extra_data = command
+        text = extra_data[0] if extra_data and (action in TEXT_ACTIONS or action in ANCHOR_ACTIONS) else ''
+        strategy = extra_data[1] if len(extra_data) > 1 and action == 'text' else ''
+        if strategy == 'type':
+            strategy = ''
+        x, y = position
+        return (int(x), int(y), float(interval), self.intern_action(action),
+                self.intern_text(text), self.intern_text(strategy))
+
+    def decode(self, x, y, interval, code, text_id, strategy_id):
+        action = self.action_names[code]
+        if action == 'text':
+            if strategy_id:
+                return (x, y), interval, action, self.texts[text_id], self.texts[strategy_id]
+            return (x, y), interval, action, self.texts[text_id]
+        if action in TEXT_ACTIONS or (text_id and action in ANCHOR_ACTIONS):
+            return (x, y), interval, action, self.texts[text_id]
+        return (x, y), interval, action
+
+    def columns(self):
+        return self.xs, self.ys, self.intervals, self.action_codes, self.text_ids, self.strategy_ids
+
+    def check_index(self, index):
+        length = len(self.xs)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('command index out of range')
+        return index
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self.check_index(index)
+        return self.decode(*(column[index] for column in self.columns()))
+
+    def __setitem__(self, index, command):
+        index = self.check_index(index)
+        for column, value in zip(self.columns(), self.encode(command)):
+            column[index] = value
+
+    def __delitem__(self, index):
+        index = self.check_index(index)
+        for column in self.columns():
+            del column[index]
+
+    def insert(self, index, command):
+        for column, value in zip(self.columns(), self.encode(command)):
+            column.insert(index, value)
+
+    def insert_many(self, index, commands):
+        """Insert ``commands`` before ``index`` with one move per column."""
+        encoded = [self.encode(command) for command in commands]
+        for column, values in zip(self.columns(), zip(*encoded)):
+            column[index:index] = array(column.typecode, values)
+
+    def delete_many(self, indexes):
+        """Remove the commands at ``indexes`` with one pass per column."""
+        keep = [True] * len(self)
+        for index in indexes:
+            keep[self.check_index(index)] = False
+        self.xs, self.ys, self.intervals, self.action_codes, self.text_ids, self.strategy_ids = (
+            array(column.typecode, compress(column, keep)) for column in self.columns())
+
+    def append(self, command):
+        for column, value in zip(self.columns(), self.encode(command)):
+            column.append(value)
+
+    def extend(self, commands):
+        append = self.append
+        for command in commands:
+            append(command)
+
+    def __iter__(self):
+        decode = self.decode
+        for fields in zip(*self.columns()):
+            yield decode(*fields)
+
+    def __repr__(self):
+        return f'CommandStore({len(self)} commands)'
+
+    def __bool__(self):
+        return len(self.xs) > 0
+
+    def used_actions(self):
+        return {self.action_names[code] for code in set(self.action_codes)}
+
+    def total_interval(self):
+        return sum(self.intervals)
+
+    def nbytes(self):
+        """Approximate memory used by the columns and the interned strings."""
+        size = sum(column.itemsize * len(column) for column in self.columns())
+        return size + sum(len(text) for text in self.texts)
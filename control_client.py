@@ -0,0 +1,215 @@
+"""Client for the control server (see control_server.py).
+
+    python -m control_client submit job.json --loops 5
+    python -m control_client start
+    python -m control_client status
+    python -m control_client watch
+    python -m control_client check
+
+``watch`` prints events as they arrive. ``check`` exercises the whole
+protocol against a private server on the null backend: it submits a
+sequence, starts it, pauses, resumes, polls status from many connections
+at once and stops, and reports anything that did not behave.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+from control_server import MAX_REQUEST, ControlServer, default_socket_path
+
+
+class ControlClient:
+    """One connection to the control server."""
+
+    def __init__(self, path=None):
+        self.path = path or default_socket_path()
+        self.reader = None
+        self.writer = None
+        self.ids = itertools.count(1)
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path, limit=MAX_REQUEST)
+        return self
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+    async def request(self, command, **fields):
+        """Send a request and return the reply, raising RuntimeError if it failed."""
+        request = {'id': next(self.ids), 'command': command, **fields}
+        self.writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError('The control server closed the connection')
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error', 'Request failed'))
+        return reply
+
+    async def events(self):
+        """Subscribe and yield events. The connection serves nothing else afterwards."""
+        yield await self.request('subscribe')
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            yield json.loads(line)
+
+
+async def check(runs=3, pollers=20):
+    # End-to-end exercise of the protocol against a private null server
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+            print(f"FAIL {message}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        from sequence_file import save_sequence
+
+        sequence = os.path.join(directory, 'check.json')
+        save_sequence(sequence, [((i, i), 0.01, 'click') for i in range(20)], loops=5)
+        socket = os.path.join(directory, 'control.sock')
+        server = ControlServer(socket, 'null')
+        serving = asyncio.create_task(server.serve())
+        while not os.path.exists(socket):
+            await asyncio.sleep(0.01)
+
+        client = await ControlClient(socket).connect()
+        watcher = await ControlClient(socket).connect()
+        events = []
+
+        async def watch():
+            async for event in watcher.events():
+                events.append(event)
+
+        watching = asyncio.create_task(watch())
+        for _ in range(runs):
+            await client.request('submit', sequence=sequence)
+        status = await client.request('status')
+        expect(len(status['queued']) == runs, f"{runs} runs queued, got {len(status['queued'])}")
+        try:
+            await client.request('bogus')
+            expect(False, 'unknown command rejected')
+        except RuntimeError:
+            pass
+
+        await client.request('start')
+        await asyncio.sleep(0.3)
+        await client.request('pause')
+        # The step in progress still finishes
+        await asyncio.sleep(0.1)
+        paused = (await client.request('status'))['current']
+        await asyncio.sleep(0.2)
+        still = (await client.request('status'))['current']
+        expect(paused['state'] == 'paused', 'run paused')
+        expect((paused['loop'], paused['step']) == (still['loop'], still['step']), 'no steps while paused')
+        await client.request('resume')
+
+        # Many clients polling at once
+        async def poll():
+            poller = await ControlClient(socket).connect()
+            latencies = []
+            for _ in range(50):
+                start = time.perf_counter()
+                await poller.request('status')
+                latencies.append(time.perf_counter() - start)
+            await poller.close()
+            return latencies
+
+        latencies = sorted(sum(await asyncio.gather(*(poll() for _ in range(pollers))), []))
+        print(f"status from {pollers} clients: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"max {latencies[-1] * 1000:.2f} ms")
+
+        while True:
+            status = await client.request('status')
+            if not status['queued'] and 'current' not in status:
+                break
+            await asyncio.sleep(0.05)
+        expect(status['last']['state'] == 'completed', 'last run completed')
+        finished = [event for event in events if event.get('event') == 'finished']
+        expect(len(finished) == runs, f"{runs} finished events, got {len(finished)}")
+        expect(any(event.get('event') == 'progress' for event in events), 'progress events streamed')
+
+        await client.request('submit', sequence=sequence, loops=100)
+        await asyncio.sleep(0.2)
+        await client.request('stop')
+        await asyncio.sleep(0.2)
+        status = await client.request('status')
+        expect(status['last']['state'] == 'stopped', 'stopped run reported as stopped')
+
+        watching.cancel()
+        await watcher.close()
+        await client.close()
+        serving.cancel()
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+    print('OK' if not failures else f"{len(failures)} checks failed")
+    return not failures
+
+
+async def run_command(args):
+    if args.command == 'check':
+        return 0 if await check() else 1
+    client = await ControlClient(args.socket).connect()
+    try:
+        if args.command == 'watch':
+            async for event in client.events():
+                print(json.dumps(event), flush=True)
+            return 0
+        fields = {}
+        if args.command == 'submit':
+            fields['sequence'] = os.path.abspath(args.sequence)
+            if args.loops is not None:
+                fields['loops'] = args.loops
+        reply = await client.request(args.command, **fields)
+        reply.pop('ok')
+        reply.pop('id', None)
+        if reply:
+            print(json.dumps(reply, indent=2))
+        return 0
+    finally:
+        await client.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m control_client', description='Control a ClickerPro server.')
+    parser.add_argument('--socket', default=default_socket_path(), metavar='PATH',
+                        help='server socket (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    submit = commands.add_parser('submit', help='queue a sequence file')
+    submit.add_argument('sequence')
+    submit.add_argument('-n', '--loops', type=int)
+    for name, description in (('start', 'run queued sequences'), ('pause', 'pause the running sequence'),
+                              ('resume', 'resume it'), ('stop', 'stop the running sequence'),
+                              ('status', 'print the server state'), ('watch', 'print events as they arrive'),
+                              ('check', 'exercise the protocol against a private server')):
+        commands.add_parser(name, help=description)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        return asyncio.run(run_command(args))
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
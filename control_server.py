@@ -0,0 +1,310 @@
+"""Local control server: queue, run and watch sequences over a Unix socket.
+
+    python -m control_server [--socket PATH] [--backend NAME]
+
+Clients send one JSON object per line and get one JSON object back per
+request, with the request's ``id`` copied into the reply::
+
+    {"id": 1, "command": "submit", "sequence": "job.json", "loops": 5}
+    {"id": 1, "ok": true, "run": 1}
+
+Commands:
+
+    submit      queue a sequence file; ``loops`` defaults to the file's own
+    start       run queued sequences one after another, now and as they come
+    pause       pause the running sequence
+    resume      resume it
+    stop        stop the running sequence and stop taking new ones from the queue
+    status      the server state, the queue and the running sequence's position
+    subscribe   turn the connection into a stream of events
+
+Failed requests get ``{"ok": false, "error": "..."}``. Events are
+``{"event": "started" | "progress" | "paused" | "resumed" | "finished", "run": N, ...}``.
+
+Runs execute on a worker thread; the event loop only reads the engine's
+position attributes, so any number of clients can poll status without
+touching the engine. Progress reaches subscribers at most 30 times a
+second, and a subscriber that does not keep up loses events rather than
+holding anything back.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+from collections import deque
+
+from backends import BACKENDS, create_backend
+from engine import DeadlineScheduler, Engine, EtaEstimator, ProgressChannel
+
+# Events buffered per subscriber before new ones are dropped
+SUBSCRIBER_BACKLOG = 1000
+# Longest request line accepted, in bytes
+MAX_REQUEST = 1 << 20
+
+
+def default_socket_path():
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, f'clickerpro-{os.getuid()}.sock')
+
+
+class Run:
+    def __init__(self, number, path, loops):
+        self.number = number
+        self.path = path
+        self.loops = loops
+        # queued, running, paused, completed, stopped or failed
+        self.state = 'queued'
+        self.engine = None
+        self.eta = None
+        self.error = None
+
+    def describe(self):
+        info = {'run': self.number, 'sequence': self.path, 'loops': self.loops, 'state': self.state}
+        engine = self.engine
+        if engine is not None:
+            info['loop'] = engine.current_loop
+            info['step'] = engine.current_step
+        if self.eta is not None and self.state in ('running', 'paused'):
+            info['remaining'] = round(self.eta.remaining(), 3)
+        if self.error:
+            info['error'] = self.error
+        return info
+
+
+def build_run(run, backend):
+    # Runs on the worker thread, so a large sequence does not hold up clients
+    from cli import compile_sequence
+    from sequence_file import open_sequence
+
+    sequence = open_sequence(run.path)
+    if run.loops is None:
+        run.loops = sequence.loops or 1
+    plan = compile_sequence(sequence, backend)[0]
+    weights = getattr(plan, 'weights', None)
+    if weights is not None:
+        run.eta = EtaEstimator(plan.intervals, weights=weights)
+    elif isinstance(plan, list):
+        run.eta = EtaEstimator(interval for step, interval in plan)
+    return plan
+
+
+class ControlServer:
+    def __init__(self, path, backend_name='pyautogui'):
+        self.path = path
+        self.backend_name = backend_name
+        self.backend = None
+        self.queue = deque()
+        self.current = None
+        self.last = None
+        # True between 'start' and 'stop': queued runs are taken one by one
+        self.accepting = False
+        self.numbers = itertools.count(1)
+        self.subscribers = set()
+        self.wakeup = None
+        self.loop = None
+        self.server = None
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle, self.path, limit=MAX_REQUEST)
+        os.chmod(self.path, 0o600)
+        dispatcher = asyncio.create_task(self.dispatch())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            if self.current and self.current.engine:
+                self.current.engine.control.stop()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def publish(self, event):
+        # Called on the event loop thread only
+        for queue in self.subscribers:
+            if queue.qsize() < SUBSCRIBER_BACKLOG:
+                queue.put_nowait(event)
+
+    def publish_threadsafe(self, event):
+        self.loop.call_soon_threadsafe(self.publish, event)
+
+    async def dispatch(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.accepting and self.queue:
+                run = self.current = self.queue.popleft()
+                await self.execute(run)
+                self.current = None
+                self.last = run
+
+    async def execute(self, run):
+        run.state = 'running'
+        self.publish({'event': 'started', 'run': run.number, 'sequence': run.path})
+        try:
+            completed = await asyncio.to_thread(self.run_engine, run)
+            run.state = 'completed' if completed else 'stopped'
+        except Exception as e:
+            run.state = 'failed'
+            run.error = str(e) or type(e).__name__
+        self.publish({'event': 'finished', 'run': run.number, 'state': run.state, 'error': run.error})
+
+    def run_engine(self, run):
+        if self.backend is None:
+            self.backend = create_backend(self.backend_name)
+        plan = build_run(run, self.backend)
+        number = run.number
+
+        def on_progress(loop, step):
+            self.publish_threadsafe({'event': 'progress', 'run': number, 'loop': loop, 'step': step})
+
+        run.engine = Engine(plan, run.loops, DeadlineScheduler(), progress=ProgressChannel(on_progress), eta=run.eta)
+        # A stop may have arrived while the sequence was compiled
+        if run.state == 'stopping':
+            return False
+        return run.engine.run()
+
+    def status(self):
+        if self.current:
+            state = 'paused' if self.current.state == 'paused' else 'running'
+        else:
+            state = 'idle' if self.accepting else 'stopped'
+        reply = {'state': state, 'queued': [run.describe() for run in self.queue]}
+        if self.current:
+            reply['current'] = self.current.describe()
+        if self.last:
+            reply['last'] = self.last.describe()
+        return reply
+
+    def command(self, request):
+        """Carry out one request and return the reply fields."""
+        name = request.get('command')
+        run = self.current
+        if name == 'submit':
+            path = request.get('sequence')
+            loops = request.get('loops')
+            if not isinstance(path, str) or not path:
+                raise ValueError("'submit' needs a 'sequence' file")
+            if loops is not None and (not isinstance(loops, int) or loops < 0):
+                raise ValueError("'loops' must be a whole number")
+            if not os.path.isfile(path):
+                raise ValueError(f"No sequence file '{path}'")
+            run = Run(next(self.numbers), os.path.abspath(path), loops)
+            self.queue.append(run)
+            self.wakeup.set()
+            return {'run': run.number, 'queued': len(self.queue)}
+        if name == 'start':
+            self.accepting = True
+            self.wakeup.set()
+            return {}
+        if name == 'stop':
+            self.accepting = False
+            if run:
+                if run.engine:
+                    run.engine.control.stop()
+                else:
+                    run.state = 'stopping'
+            return {}
+        if name in ('pause', 'resume'):
+            if not run or not run.engine:
+                raise ValueError('Nothing is running')
+            if name == 'pause':
+                run.engine.control.pause()
+                run.state = 'paused'
+            else:
+                run.engine.control.resume()
+                run.state = 'running'
+            self.publish({'event': f'{name}d', 'run': run.number})
+            return {}
+        if name == 'status':
+            return self.status()
+        raise ValueError(f"Unknown command '{name}'")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"ok": false, "error": "Request too long"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('A request must be a JSON object')
+                except ValueError as e:
+                    reply = {'ok': False, 'error': f'Invalid request: {e}'}
+                else:
+                    if request.get('command') == 'subscribe':
+                        await self.stream(request, reader, writer)
+                        break
+                    try:
+                        reply = {'ok': True, **self.command(request)}
+                    except ValueError as e:
+                        reply = {'ok': False, 'error': str(e)}
+                    if 'id' in request:
+                        reply['id'] = request['id']
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, request, reader, writer):
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        # Finishes when the subscriber disconnects
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            reply = {'ok': True, **self.status()}
+            if 'id' in request:
+                reply['id'] = request['id']
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            await writer.drain()
+            while True:
+                event = asyncio.ensure_future(queue.get())
+                await asyncio.wait((event, closed), return_when=asyncio.FIRST_COMPLETED)
+                if not event.done():
+                    event.cancel()
+                    return
+                writer.write(json.dumps(event.result()).encode('utf-8') + b'\n')
+                await writer.drain()
+        finally:
+            closed.cancel()
+            self.subscribers.discard(queue)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m control_server',
+                                     description='Serve the ClickerPro control protocol on a Unix socket.')
+    parser.add_argument('--socket', default=default_socket_path(), metavar='PATH',
+                        help='socket to listen on (default: %(default)s)')
+    parser.add_argument('--backend', default='pyautogui', choices=sorted(BACKENDS),
+                        help='input backend (default: pyautogui)')
+    parser.add_argument('--start', action='store_true', help='run sequences as soon as they are submitted')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = ControlServer(args.socket, args.backend)
+    server.accepting = args.start
+    print(f"Listening on {args.socket}", flush=True)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Rows of data for text steps, one row per loop.
+
+With a data source attached to a run, text steps can contain placeholders
+in ``str.format`` syntax, e.g. ``{name}`` or ``{price:>8}``, filled from
+the current row. Write ``{{`` and ``}}`` for literal braces. Without a
+data source, texts are typed as they are.
+
+Rows come from a CSV file with a header line or a JSONL file with one
+object per line, and are read one at a time as the run advances, so
+memory use does not depend on the size of the file. The number of rows
+is never counted; a run without a loop count ends when the rows do, and
+``rows_left()`` estimates what is left from the bytes read so far.
+
+``row_index`` is the index of the row in use (the first data row is 0).
+Opening a source at ``start`` skips that many rows, which is how an
+interrupted run continues at the record it was working on.
+"""
+import csv
+import json
+import os
+from string import Formatter
+
+
+def template_fields(text):
+    """Return the field names used in ``text``, e.g. ``{'name'}`` for 'Hi {name}'."""
+    fields = set()
+    try:
+        parsed = list(Formatter().parse(text))
+    except ValueError as e:
+        raise ValueError(f"Invalid placeholder in text: {e}") from None
+    for literal, field, spec, conversion in parsed:
+        if field is None:
+            continue
+        # Only plain column names, no positions, attributes or indexing
+        if not field or field.isdigit() or '.' in field or '[' in field:
+            raise ValueError(f"Invalid placeholder '{{{field}}}' in text, use a column name")
+        fields.add(field)
+    return fields
+
+
+class DataSource:
+    def __init__(self, path, start=0):
+        self.path = path
+        self.format = 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+        self.file = None
+        self.seek(start)
+
+    def seek(self, start):
+        """Read from the beginning again, skipping ``start`` rows."""
+        if self.file:
+            self.file.close()
+        self.size = os.path.getsize(self.path)
+        self.file = open(self.path, 'rb')
+        # Bytes read so far, for estimating the rows left
+        self.position = 0
+        self.rows = self.read_rows()
+        self.columns = None
+        self.row = None
+        if self.format == 'csv':
+            try:
+                self.columns = next(self.rows)
+            except StopIteration:
+                self.columns = []
+        self.first = self.position
+        self.next_index = 0
+        for _ in range(start):
+            if not self.advance():
+                break
+        self.row = None
+
+    def lines(self):
+        for line in self.file:
+            self.position += len(line)
+            # The first line may start with a byte order mark
+            yield line.decode('utf-8-sig' if self.position == len(line) else 'utf-8')
+
+    def read_rows(self):
+        if self.format == 'csv':
+            reader = csv.reader(self.lines())
+            try:
+                # Blank lines are skipped, like in JSONL files
+                yield from filter(None, reader)
+            except csv.Error as e:
+                raise ValueError(f"{self.path}, line {reader.line_num}: {e}") from None
+            return
+        for number, line in enumerate(self.lines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{self.path}, line {number}: {e}") from None
+            if not isinstance(row, dict):
+                raise ValueError(f"{self.path}, line {number}: a row must be a JSON object")
+            yield row
+
+    @property
+    def row_index(self):
+        return self.next_index - 1 if self.row is not None else self.next_index
+
+    def advance(self):
+        """Move to the next row. Returns False when there are no more rows."""
+        try:
+            row = next(self.rows)
+        except StopIteration:
+            self.row = None
+            return False
+        if self.columns is not None:
+            row = dict(zip(self.columns, row))
+        self.row = row
+        self.next_index += 1
+        return True
+
+    def check_fields(self, fields):
+        # JSONL rows can differ, so only CSV columns are known in advance
+        if self.columns is not None:
+            missing = sorted(fields.difference(self.columns))
+            if missing:
+                raise ValueError(f"No column {', '.join(missing)} in {self.path}")
+
+    def fill(self, text):
+        try:
+            return text.format_map(self.row)
+        except KeyError as e:
+            raise ValueError(f"Row {self.row_index + 1} of {self.path} has no {e}") from None
+
+    def rows_left(self):
+        """Estimated rows after the current one, from the average row size so far."""
+        read = self.position - self.first
+        if not self.next_index or read <= 0:
+            return 0
+        return round(self.next_index * (self.size - self.position) / read)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,601 @@
+"""Automation engine shared by the GUI and the command line runner.
+
+Nothing here imports Qt, so unattended runs (``python -m cli``) start
+without loading PyQt6. AutomationThread in main.py wraps Engine in a
+QThread and turns its callbacks into signals.
+"""
+import threading
+import time
+from array import array
+from functools import partial
+from itertools import count, islice
+
+
+# Each action maps to a binder that takes (backend, position, text) and returns
+# a zero-argument callable, so the run loop never looks at the action name.
+ACTIONS = {
+    'click': lambda backend, position, text: bind_pointer(backend.click, backend, position, text),
+    '2click': lambda backend, position, text: bind_pointer(backend.double_click, backend, position, text),
+    'right click': lambda backend, position, text: bind_pointer(backend.right_click, backend, position, text),
+    'copy': lambda backend, position, text: partial(backend.hotkey, 'ctrl', 'c'),
+    'paste': lambda backend, position, text: partial(backend.hotkey, 'ctrl', 'v'),
+    'enter': lambda backend, position, text: partial(backend.press, 'enter'),
+    'close tab': lambda backend, position, text: partial(backend.hotkey, 'ctrl', 'w'),
+    'select all': lambda backend, position, text: partial(backend.hotkey, 'ctrl', 'a'),
+    'text': lambda backend, position, text: partial(backend.typewrite, text),
+    'move up': lambda backend, position, text: partial(backend.press, 'up'),
+    'move down': lambda backend, position, text: partial(backend.press, 'down'),
+    'move left': lambda backend, position, text: partial(backend.press, 'left'),
+    'move right': lambda backend, position, text: partial(backend.press, 'right'),
+    'go to end': lambda backend, position, text: partial(backend.hotkey, 'end'),
+    'go to beginning': lambda backend, position, text: partial(backend.hotkey, 'home'),
+    'backspace': lambda backend, position, text: partial(backend.press, 'backspace'),
+    'none': lambda backend, position, text: bind_pointer(backend.move_to, backend, position, text),
+    'wait': lambda backend, position, text: bind_wait(backend, position, text),
+}
+
+# Actions that press one key, by key name. Repeats of these can be sent as
+# one batched press (see optimizer.py).
+PRESS_KEYS = {
+    'enter': 'enter',
+    'move up': 'up',
+    'move down': 'down',
+    'move left': 'left',
+    'move right': 'right',
+    'backspace': 'backspace',
+}
+
+
+# Text steps can carry a strategy as a fifth field:
+#   'type'        one key event per character (the default)
+#   'paste'       put the text on the clipboard, press Ctrl+V, restore the clipboard
+#   'chunked:N'   type in chunks at N characters per second
+TEXT_STRATEGIES = ('type', 'paste', 'chunked')
+TYPING_RATE = 200
+TYPING_CHUNK = 16
+# Time the target application gets to read the clipboard before it is restored
+PASTE_SETTLE = 0.05
+
+
+def paste_text(backend, text, settle=PASTE_SETTLE):
+    try:
+        saved = backend.get_clipboard()
+    except Exception:
+        saved = None
+    backend.set_clipboard(text)
+    backend.hotkey('ctrl', 'v')
+    if saved is not None:
+        time.sleep(settle)
+        backend.set_clipboard(saved)
+
+
+def type_chunked(backend, text, rate=TYPING_RATE, chunk=TYPING_CHUNK):
+    # Chunks are timed against the start so the overall rate does not drift
+    typewrite = backend.typewrite
+    start = time.perf_counter()
+    for offset in range(0, len(text), chunk):
+        typewrite(text[offset:offset + chunk])
+        if rate:
+            delay = start + (offset + chunk) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def parse_text_strategy(strategy):
+    """Split a strategy such as 'chunked:50' into its name and rate."""
+    name, _, rate = (strategy or 'type').partition(':')
+    if name not in TEXT_STRATEGIES:
+        raise ValueError(f"Unknown text strategy '{strategy}'")
+    if rate:
+        if name != 'chunked':
+            raise ValueError(f"Text strategy '{name}' does not take a rate")
+        try:
+            rate = float(rate)
+        except ValueError:
+            raise ValueError(f"Invalid typing rate in text strategy '{strategy}'") from None
+        if rate < 0:
+            raise ValueError(f"Invalid typing rate in text strategy '{strategy}'")
+    else:
+        rate = TYPING_RATE if name == 'chunked' else None
+    return name, rate
+
+
+def type_row(send, text, data):
+    send(data.fill(text))
+
+
+def bind_text(backend, text, strategy, data=None):
+    name, rate = parse_text_strategy(strategy)
+    if name == 'paste':
+        send = partial(paste_text, backend)
+    elif name == 'chunked':
+        send = partial(type_chunked, backend, rate=rate)
+    else:
+        send = backend.typewrite
+    if data is not None:
+        # With a data source, placeholders are filled from the current row
+        from data_source import template_fields
+        fields = template_fields(text)
+        if fields:
+            data.check_fields(fields)
+            return partial(type_row, send, text, data)
+        # Literal braces are typed once
+        text = text.replace('{{', '{').replace('}}', '}')
+    return partial(send, text)
+
+
+def bind_pointer(method, backend, position, image):
+    # A pointer step with an image acts wherever the image is found on screen
+    if image:
+        from image_target import bind_anchored
+        return bind_anchored(method, backend, position, image)
+    return partial(method, position)
+
+
+def bind_wait(backend, position, text):
+    from visual_wait import VisualWait, parse_wait
+    return VisualWait(backend, position, parse_wait(text))
+
+
+def compile_command(index, command, backend, data=None):
+    position, interval, action, *extra_data = command
+    try:
+        bind = ACTIONS[action]
+    except KeyError:
+        raise ValueError(f"Unknown action '{action}' in command {index + 1}") from None
+    text = extra_data[0] if extra_data else ""
+    try:
+        if action == 'text' and (len(extra_data) > 1 or data is not None):
+            return bind_text(backend, text, extra_data[1] if len(extra_data) > 1 else None, data), interval
+        return bind(backend, position, text), interval
+    except ValueError as e:
+        raise ValueError(f"{e} in command {index + 1}") from None
+
+
+def check_actions(actions):
+    for action in actions:
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action '{action}'")
+
+
+def compile_commands(commands, backend, data=None):
+    """Bind every command to its backend handler once, before the run starts.
+
+    Returns a list of ``(step, interval)`` pairs. Raises ValueError for an
+    unknown action so a bad sequence is rejected before anything is sent.
+    ``data`` is an optional data_source.DataSource for text placeholders.
+    """
+    return [compile_command(index, command, backend, data) for index, command in enumerate(commands)]
+
+
+class StreamingPlan:
+    """A plan compiled step by step while ``source`` is read.
+
+    Used for sequences too large to hold in memory. ``source`` must be
+    re-iterable, e.g. a sequence_file.SequenceFile, which reads the file
+    again on every loop. An unknown action is only reported when the run
+    reaches it. ``length`` is known once the source has been read fully.
+    ``current`` is ``(index, command)`` of the step last yielded, e.g. for
+    watchdog.StreamedBudgets.
+    """
+
+    def __init__(self, source, backend, data=None):
+        self.source = source
+        self.backend = backend
+        self.data = data
+        self.length = None
+        self.current = None
+
+    def __iter__(self):
+        backend = self.backend
+        data = self.data
+        index = -1
+        for index, command in enumerate(self.source):
+            step = compile_command(index, command, backend, data)
+            self.current = index, command
+            yield step
+        self.length = index + 1
+
+
+class DeadlineScheduler:
+    """Keeps an absolute deadline per step on a monotonic clock.
+
+    Waiting sleeps until shortly before the deadline and spins for the rest,
+    so fine intervals are honoured and time spent in the action itself does
+    not push the schedule back. When a step finishes past its deadline the
+    scheduler either runs the following steps back to back until it has
+    caught up (``catch_up=True``) or moves the schedule forward to now.
+    """
+
+    def __init__(self, catch_up=True, spin=0.002, clock=time.perf_counter, sleep=time.sleep):
+        self.catch_up = catch_up
+        self.spin = spin
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = None
+        self.lateness = array('d')
+
+    def restart(self):
+        # Start counting from now, e.g. at the beginning of a run or after a pause
+        self.deadline = self.clock()
+
+    def wait(self, interval):
+        if self.deadline is None:
+            self.restart()
+        self.deadline += interval
+        deadline = self.deadline
+
+        remaining = deadline - self.clock()
+        if remaining > self.spin:
+            # A sleep that returns True was interrupted, e.g. by a stop
+            if self.sleep(remaining - self.spin):
+                return
+        now = self.clock()
+        while now < deadline:
+            now = self.clock()
+
+        late = now - deadline
+        self.lateness.append(late)
+        if not self.catch_up and late > 0:
+            self.deadline = now
+
+    def stats(self):
+        """Return count, p50, p99 and max lateness in seconds."""
+        if not self.lateness:
+            return {'count': 0, 'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        ordered = sorted(self.lateness)
+        count = len(ordered)
+        return {
+            'count': count,
+            'p50': ordered[(count - 1) // 2],
+            'p99': ordered[min(count - 1, int(count * 0.99))],
+            'max': ordered[-1],
+        }
+
+
+def format_timing_stats(stats):
+    return (f"Timing over {stats['count']} steps: "
+            f"p50 {stats['p50'] * 1000:.2f} ms late, "
+            f"p99 {stats['p99'] * 1000:.2f} ms late, "
+            f"max {stats['max'] * 1000:.2f} ms late")
+
+
+class EtaEstimator:
+    """Estimates the time left in a run from measured step durations.
+
+    Each step keeps an exponentially smoothed duration, seeded with its
+    configured interval (or with the estimates of an earlier run). The
+    engine records how long every step really took, action and wait
+    included but time spent paused excluded. ``remaining()`` is O(1), so a
+    GUI can poll it while the run goes on.
+
+    ``weights`` gives how often each step runs per loop, for plans that
+    repeat or skip steps (see program.Program). By default every step runs
+    once.
+    """
+
+    def __init__(self, prior=(), smoothing=0.3, weights=None):
+        self.estimates = array('d', prior)
+        self.smoothing = smoothing
+        self.weights = weights
+        if weights is None:
+            self.loop_total = sum(self.estimates)
+        else:
+            self.loop_total = sum(w * e for w, e in zip(weights, self.estimates))
+        self.num_loops = 0
+        # Estimated time of the steps already run in the current loop
+        self.done_in_loop = 0.0
+        # Loops not started yet, not counting the one in progress
+        self.loops_left = 0
+        self.finished = False
+
+    def start(self, num_loops):
+        self.num_loops = num_loops
+        self.done_in_loop = 0.0
+        self.loops_left = num_loops - 1
+        self.finished = num_loops <= 0
+
+    def set_loops_left(self, loops):
+        # For runs whose length is only estimated as they go, e.g. by data rows
+        self.num_loops += loops - self.loops_left
+        self.loops_left = loops
+        self.finished = False
+
+    def record(self, index, duration):
+        estimates = self.estimates
+        if index < len(estimates):
+            old = estimates[index]
+            new = old + self.smoothing * (duration - old)
+            estimates[index] = new
+            if self.weights is None:
+                self.loop_total += new - old
+            else:
+                self.loop_total += self.weights[index] * (new - old)
+        else:
+            # Streaming plans only learn their length on the first loop
+            new = duration
+            estimates.append(new)
+            self.loop_total += new
+        self.done_in_loop += new
+
+    def end_loop(self):
+        self.done_in_loop = 0.0
+        if self.loops_left:
+            self.loops_left -= 1
+        else:
+            self.finished = True
+
+    def remaining(self):
+        if self.finished:
+            return 0.0
+        loop_total = self.loop_total
+        return max(0.0, loop_total - self.done_in_loop) + self.loops_left * loop_total
+
+    def fraction_done(self):
+        """Estimated share of the whole run completed, from 0 to 1."""
+        if self.finished:
+            return 1.0
+        total = self.num_loops * self.loop_total
+        if total <= 0:
+            return 0.0
+        return min(1.0, max(0.0, 1 - self.remaining() / total))
+
+
+# The RunControl of the engine running on the current thread, if any
+active = threading.local()
+
+
+def interruptible_sleep(seconds):
+    """Sleep inside a step. Returns True if the running engine was stopped.
+
+    Steps that wait for a long time, such as visual waits, use this so a
+    stop does not have to wait for them to finish.
+    """
+    control = getattr(active, 'control', None)
+    if control is None:
+        time.sleep(seconds)
+        return False
+    return control.sleep(seconds)
+
+
+class RunControl:
+    """Pause, resume and stop flags that wake a waiting thread immediately."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.paused = False
+        self.stopped = False
+
+    def pause(self):
+        with self.condition:
+            self.paused = True
+            self.condition.notify_all()
+
+    def resume(self):
+        with self.condition:
+            self.paused = False
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def wait_if_paused(self):
+        """Block while paused. Returns True if the thread actually waited."""
+        with self.condition:
+            if not self.paused:
+                return False
+            while self.paused and not self.stopped:
+                self.condition.wait()
+            return True
+
+    def sleep(self, seconds):
+        """Sleep for ``seconds`` unless stopped first. Returns True if stopped."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.stopped, seconds)
+            return self.stopped
+
+
+class ProgressChannel:
+    """Reports the run position as (loop, step) at a bounded rate.
+
+    ``report`` is called after every step but only passes the position on
+    to ``publish`` when at least ``1 / max_rate`` seconds have passed, so a
+    fast engine does not flood its consumer. ``flush`` always publishes the
+    latest position if it has not been published yet. The engine calls it
+    when it pauses and when the run ends, so the final state is never lost.
+    """
+
+    def __init__(self, publish, max_rate=30.0, clock=time.perf_counter):
+        self.publish = publish
+        self.gap = 1.0 / max_rate
+        self.clock = clock
+        self.next_time = 0.0
+        self.position = None
+        self.published = None
+
+    def report(self, loop, step):
+        self.position = loop, step
+        now = self.clock()
+        if now >= self.next_time:
+            self.next_time = now + self.gap
+            self.published = self.position
+            self.publish(loop, step)
+
+    def flush(self):
+        position = self.position
+        if position is not None and position != self.published:
+            self.next_time = self.clock() + self.gap
+            self.published = position
+            self.publish(*position)
+
+
+class Engine:
+    """Runs a compiled plan ``num_loops`` times.
+
+    A plan is an iterable of ``(step, interval)`` pairs. Plans with an
+    ``indexed()`` method, such as program.Program, yield
+    ``(index, (step, interval))`` instead, so steps that run many times or
+    not at all still report the index of their command.
+
+    Progress goes through ``progress``, a ProgressChannel. ``tracer`` is an
+    optional tracing.StepTracer that records every step. ``checkpoint`` is
+    an optional checkpoint.Checkpoint told about every completed step, and
+    ``start`` the ``(loop, steps done)`` a resumed run continues from. Plans
+    with a ``state()`` method, such as program.Program, have it saved with
+    every step, and ``start`` may carry it as a third item so the plan's
+    ``indexed(state)`` continues from there instead of running its first
+    steps again without their effects. run()
+    returns True if all loops finished and False if the run was stopped.
+
+    ``data`` is an optional data_source.DataSource, advanced to its next row
+    at the start of every loop. The run ends early when the rows run out,
+    and ``num_loops`` may be None to run once per row.
+
+    ``watchdog`` is an optional watchdog.Watchdog that runs every step under
+    a time budget, so a hung step can neither hang the run nor delay a stop.
+    """
+
+    def __init__(self, plan, num_loops, scheduler=None, control=None, progress=None, eta=None,
+                 tracer=None, checkpoint=None, start=(1, 0), data=None, watchdog=None):
+        self.plan = plan
+        self.num_loops = num_loops
+        self.control = control or RunControl()
+        # Without a scheduler each interval is a plain sleep
+        self.scheduler = scheduler
+        if scheduler:
+            scheduler.sleep = self.control.sleep
+        self.progress = progress
+        self.eta = eta
+        self.tracer = tracer
+        self.checkpoint = checkpoint
+        self.start = start
+        self.data = data
+        self.watchdog = watchdog
+        self.current_loop = 0
+        # Index of the step running now, for cheap polling from another thread
+        self.current_step = -1
+        # Steps run so far, updated when the run ends
+        self.steps_run = 0
+
+    def run(self):
+        active.control = self.control
+        checkpoint = self.checkpoint
+        if checkpoint and not checkpoint.opened:
+            checkpoint.open(*self.start)
+        try:
+            completed = self.run_loops()
+            if completed and checkpoint:
+                # Nothing left to resume
+                checkpoint.discard()
+            return completed
+        finally:
+            active.control = None
+            if self.watchdog:
+                self.watchdog.close()
+            if checkpoint:
+                checkpoint.close()
+            if self.progress:
+                self.progress.flush()
+
+    def run_loops(self):
+        control = self.control
+        scheduler = self.scheduler
+        progress = self.progress
+        eta = self.eta
+        tracer = self.tracer
+        checkpoint = self.checkpoint
+        data = self.data
+        watchdog = self.watchdog
+        guard = None
+        if watchdog:
+            def guard(wait, index):
+                # Conditions of a program run under the watchdog like steps
+                return watchdog.result if watchdog.run(wait, index, control) else None
+        clock = time.perf_counter
+        clock_ns = time.perf_counter_ns
+        started = 0.0
+        traced = scheduled = 0
+        ran = 0
+        if scheduler:
+            scheduler.restart()
+        first_loop, done, *saved = self.start
+        plan_state = getattr(self.plan, 'state', None) if checkpoint else None
+        if self.num_loops is None:
+            loops = count(first_loop)
+            if eta:
+                eta.start(1)
+        else:
+            loops = range(first_loop, self.num_loops + 1)
+            if eta:
+                eta.start(self.num_loops - first_loop + 1)
+        indexed = getattr(self.plan, 'indexed', None)
+        for self.current_loop in loops:
+            if data is not None:
+                if not data.advance():
+                    break
+                if eta and self.num_loops is None:
+                    eta.set_loops_left(data.rows_left())
+            # Resuming where the plan's saved state says
+            resume = saved[0] if done and saved and saved[0] else None
+            steps = indexed(resume, guard) if indexed else enumerate(self.plan)
+            if done and resume is None:
+                # Resuming: the first steps of this loop already ran
+                steps = islice(steps, done, None)
+            for self.current_step, (step, interval) in steps:
+                if control.paused:
+                    if progress:
+                        progress.flush()
+                    if tracer:
+                        tracer.pause_started()
+                    if control.wait_if_paused():
+                        if tracer:
+                            tracer.pause_ended()
+                        if scheduler:
+                            # Time spent paused is not lateness
+                            scheduler.restart()
+                if control.stopped:
+                    self.steps_run = ran
+                    return False
+                if eta:
+                    started = clock()
+                if tracer:
+                    if scheduler:
+                        scheduled = int(scheduler.deadline * 1e9)
+                    traced = clock_ns()
+
+                if watchdog:
+                    if not watchdog.run(step, self.current_step, control) and control.stopped:
+                        # Stopped while the step hung, so it is not done
+                        self.steps_run = ran
+                        return False
+                else:
+                    step()
+                ran += 1
+
+                if checkpoint:
+                    done += 1
+                    if plan_state:
+                        checkpoint.record(self.current_loop, done, plan_state())
+                    else:
+                        checkpoint.record(self.current_loop, done)
+                if tracer:
+                    tracer.record(self.current_loop, self.current_step, traced, clock_ns(), scheduled, step)
+                if progress:
+                    progress.report(self.current_loop, self.current_step)
+                if scheduler:
+                    scheduler.wait(interval)
+                else:
+                    control.sleep(interval)
+                if control.stopped:
+                    self.steps_run = ran
+                    return False
+                if eta:
+                    eta.record(self.current_step, clock() - started)
+
+            done = 0
+            if eta:
+                eta.end_loop()
+        self.steps_run = ran
+        return True
@@ -0,0 +1,331 @@
+"""Pointer steps that find their target on screen by a reference image.
+
+A click, double click, right click or move ('none') step can carry an
+image in its text field::
+
+    button.png [threshold=0.9] [scales=1,0.9,1.1]
+
+The step then acts on the centre of wherever the image is found, so it
+keeps working when a window moves. The step's position is where the image
+was last seen and seeds the first search.
+
+Searching is normalised cross-correlation computed with NumPy FFTs, at a
+few template scales. Every step remembers its last hit. If the image is
+still exactly there, that costs a capture of the image's area and one dot
+product. Otherwise a small window around the last hit is searched at full
+resolution, and only if that misses too is the whole screen captured,
+searched downscaled and the best candidates refined at full resolution.
+Fine detail can blur away when downscaling, so if no candidate holds up
+the whole screen is searched once more at full resolution. A step whose
+image is nowhere on screen raises TargetNotFound.
+"""
+import shlex
+
+THRESHOLD = 0.9
+SCALES = (1.0, 0.9, 1.1, 0.8, 1.25)
+# Full-screen searches run on the screen shrunk by up to this factor
+DOWNSCALE = 4
+# Smallest template side, in pixels, still searched after downscaling
+MIN_SIDE = 8
+# The search window around the last hit, in template sizes each side
+WINDOW = 1
+# Best peaks per scale of a downscaled full-screen search refined at full
+# resolution, whatever their coarse score
+COARSE_PEAKS = 3
+
+# Grayscale templates by path, shared by every step that uses the image
+templates = {}
+
+
+class TargetNotFound(Exception):
+    pass
+
+
+def parse_anchor(text):
+    """Parse ``'button.png threshold=0.8'`` into ``(path, threshold, scales)``."""
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f"Invalid image target: {e}") from None
+    paths = [word for word in words if '=' not in word]
+    if len(paths) != 1:
+        raise ValueError(f"Image target '{text}' must name one image")
+    threshold = THRESHOLD
+    scales = SCALES
+    for word in words:
+        if '=' not in word:
+            continue
+        name, value = word.split('=', 1)
+        try:
+            if name == 'threshold':
+                threshold = float(value)
+                if not 0 < threshold <= 1:
+                    raise ValueError
+            elif name == 'scales':
+                scales = tuple(float(scale) for scale in value.split(','))
+                if not scales or min(scales) <= 0:
+                    raise ValueError
+            else:
+                raise ValueError(f"Unknown option '{name}' for image target")
+        except ValueError as e:
+            raise ValueError(str(e) or f"Invalid {name} '{value}' for image target") from None
+    return paths[0], threshold, scales
+
+
+def to_gray(frame):
+    import numpy as np
+    return frame[..., :3].astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+
+
+def load_template(path):
+    try:
+        return templates[path]
+    except KeyError:
+        pass
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            template = to_gray(np.asarray(image.convert('RGB')))
+    except OSError as e:
+        raise ValueError(f"Could not load image '{path}': {e}") from None
+    if template.std() == 0:
+        raise ValueError(f"Image '{path}' is a single colour and cannot be located")
+    templates[path] = template
+    return template
+
+
+def downscale(image, factor):
+    # Average each factor x factor block
+    if factor == 1:
+        return image
+    height, width = image.shape[0] // factor, image.shape[1] // factor
+    return image[:height * factor, :width * factor].reshape(height, factor, width, factor).mean(axis=(1, 3))
+
+
+def resize(image, scale):
+    # Nearest-neighbour resize, enough for matching UI elements at another size
+    import numpy as np
+
+    if scale == 1:
+        return image
+    height = max(1, round(image.shape[0] * scale))
+    width = max(1, round(image.shape[1] * scale))
+    rows = np.minimum((np.arange(height) / scale).astype(int), image.shape[0] - 1)
+    columns = np.minimum((np.arange(width) / scale).astype(int), image.shape[1] - 1)
+    return image[rows[:, None], columns]
+
+
+def fast_length(n):
+    # Smallest 2^a * 3^b * 5^c >= n; FFTs of such sizes are much faster
+    best = 1 << (n - 1).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            length = power35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def summed_area(image):
+    import numpy as np
+
+    table = np.zeros((image.shape[0] + 1, image.shape[1] + 1))
+    table[1:, 1:] = image.cumsum(0).cumsum(1)
+    return table
+
+
+def window_sums(table, height, width):
+    return table[height:, width:] - table[:-height, width:] - table[height:, :-width] + table[:-height, :-width]
+
+
+class Correlator:
+    """Normalised cross-correlation of templates against one image.
+
+    The image's spectrum and summed-area tables are computed once, so
+    trying several template scales costs one inverse FFT each.
+    """
+
+    def __init__(self, image, max_height, max_width):
+        import numpy as np
+
+        self.image = image
+        self.shape = (fast_length(image.shape[0] + max_height - 1), fast_length(image.shape[1] + max_width - 1))
+        self.spectrum = np.fft.rfft2(image, self.shape)
+        self.sums = summed_area(image)
+        self.squares = summed_area(image * image)
+
+    def scores(self, template):
+        """Score of every top-left corner, or None if the template does not fit."""
+        import numpy as np
+
+        H, W = self.image.shape
+        h, w = template.shape
+        if h > H or w > W or h + H - 1 > self.shape[0] or w + W - 1 > self.shape[1]:
+            return None
+        centred = template - template.mean()
+        norm = np.sqrt((centred * centred).sum())
+        if norm == 0:
+            return None
+
+        spectrum = self.spectrum * np.fft.rfft2(centred[::-1, ::-1], self.shape)
+        numerator = np.fft.irfft2(spectrum, self.shape)[h - 1:H, w - 1:W]
+        sums = window_sums(self.sums, h, w)
+        variance = np.maximum(window_sums(self.squares, h, w) - sums * sums / (h * w), 0)
+        denominator = np.sqrt(variance) * norm
+        return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 1e-6)
+
+    def match(self, template):
+        """Return ``(score, x, y)`` for the top-left corner of the best match.
+
+        The score is -1 when the template does not fit in the image.
+        """
+        scores = self.scores(template)
+        if scores is None:
+            return -1.0, 0, 0
+        y, x = divmod(int(scores.argmax()), scores.shape[1])
+        return float(scores[y, x]), x, y
+
+    def peaks(self, template, count):
+        """Return up to ``count`` best ``(score, x, y)``, at least a template size apart."""
+        import numpy as np
+
+        scores = self.scores(template)
+        if scores is None:
+            return []
+        h, w = template.shape
+        found = []
+        for _ in range(count):
+            y, x = divmod(int(scores.argmax()), scores.shape[1])
+            score = float(scores[y, x])
+            if score == -np.inf:
+                break
+            found.append((score, x, y))
+            # Suppress the neighbourhood of this peak
+            scores[max(0, y - h + 1):y + h, max(0, x - w + 1):x + w] = -np.inf
+        return found
+
+
+def match(image, template):
+    """Best normalised cross-correlation of ``template`` in ``image``."""
+    return Correlator(image, *template.shape).match(template)
+
+
+class ImageTarget:
+    """Finds a reference image on screen, starting near the last hit."""
+
+    def __init__(self, backend, position, path, threshold=THRESHOLD, scales=SCALES):
+        self.backend = backend
+        self.template = load_template(path)
+        self.path = path
+        self.threshold = threshold
+        self.scales = scales
+        # (centre, scale) of the last hit, seeded with the step's position
+        self.hit = (tuple(int(v) for v in position), scales[0])
+        self.resized = {}
+        self.screen_size = None
+        self.full_searches = 0
+
+    def scaled(self, scale):
+        try:
+            return self.resized[scale]
+        except KeyError:
+            template = self.resized[scale] = resize(self.template, scale)
+            return template
+
+    def still_there(self, centre, scale):
+        # Score the template exactly where it was last found
+        import numpy as np
+
+        width, height = self.screen_size
+        template = self.scaled(scale)
+        h, w = template.shape
+        left, top = centre[0] - w // 2, centre[1] - h // 2
+        if left < 0 or top < 0 or left + w > width or top + h > height:
+            return False
+        image = to_gray(self.backend.grab((left, top, w, h)))
+        a = image - image.mean()
+        b = template - template.mean()
+        denominator = np.sqrt((a * a).sum() * (b * b).sum())
+        return denominator > 1e-6 and float((a * b).sum()) / denominator >= self.threshold
+
+    def search_near(self, centre, scale):
+        width, height = self.screen_size
+        template = self.scaled(scale)
+        h, w = template.shape
+        left = max(0, centre[0] - w // 2 - WINDOW * w)
+        top = max(0, centre[1] - h // 2 - WINDOW * h)
+        right = min(width, centre[0] + w // 2 + WINDOW * w + 1)
+        bottom = min(height, centre[1] + h // 2 + WINDOW * h + 1)
+        if right - left < w or bottom - top < h:
+            return None
+        image = to_gray(self.backend.grab((left, top, right - left, bottom - top)))
+        score, x, y = match(image, template)
+        if score < self.threshold:
+            return None
+        return (left + x + w // 2, top + y + h // 2), scale
+
+    def search_full(self):
+        self.full_searches += 1
+        width, height = self.screen_size
+        screen = to_gray(self.backend.grab((0, 0, width, height)))
+        factor = max(1, min(DOWNSCALE, min(self.template.shape) // MIN_SIDE))
+        small = downscale(screen, factor)
+        scaled = [(scale, downscale(self.scaled(scale), factor)) for scale in self.scales]
+        correlator = Correlator(small, max(template.shape[0] for scale, template in scaled),
+                                max(template.shape[1] for scale, template in scaled))
+        candidates = []
+        for scale, template in scaled:
+            h, w = template.shape
+            for score, x, y in correlator.peaks(template, COARSE_PEAKS):
+                candidates.append((score, ((x + w // 2) * factor, (y + h // 2) * factor), scale))
+        # Refine the most promising candidates at full resolution
+        for score, centre, scale in sorted(candidates, reverse=True):
+            hit = self.search_near(centre, scale)
+            if hit:
+                return hit
+        if factor == 1:
+            return None
+        # Downscaling lost the image's detail; search at full resolution
+        templates = [(scale, self.scaled(scale)) for scale in self.scales]
+        correlator = Correlator(screen, max(template.shape[0] for scale, template in templates),
+                                max(template.shape[1] for scale, template in templates))
+        best = max((correlator.match(template) + (scale, template.shape) for scale, template in templates),
+                   key=lambda result: result[0])
+        score, x, y, scale, (h, w) = best
+        if score < self.threshold:
+            return None
+        return (x + w // 2, y + h // 2), scale
+
+    def locate(self):
+        if self.screen_size is None:
+            self.screen_size = self.backend.size()
+        if self.still_there(*self.hit):
+            return self.hit[0]
+        hit = self.search_near(*self.hit) or self.search_full()
+        if hit is None:
+            raise TargetNotFound(f"Image '{self.path}' not found on screen")
+        self.hit = hit
+        return hit[0]
+
+
+class AnchoredStep:
+    """Calls a pointer method on wherever the target image is found."""
+
+    def __init__(self, method, target):
+        self.method = method
+        self.target = target
+
+    def __call__(self):
+        self.method(self.target.locate())
+
+
+def bind_anchored(method, backend, position, text):
+    path, threshold, scales = parse_anchor(text)
+    return AnchoredStep(method, ImageTarget(backend, position, path, threshold, scales))
@@ -0,0 +1,106 @@
+"""Auto-pause when the user moves the mouse during a run.
+
+pynput calls ``on_move`` on its own thread for every pixel of movement, so
+the handler only compares a few numbers. It calls ``on_trip`` once per burst
+of user motion and then stays quiet until it is armed again. ``on_trip``
+runs on the listener thread, so the GUI passes a signal's ``emit`` to get the
+pause request queued onto its own thread.
+"""
+import threading
+
+
+class InputGuard:
+    def __init__(self, on_trip, min_distance=3, tolerance=2):
+        self.on_trip = on_trip
+        # User movement smaller than this (in pixels) is treated as jitter
+        self.min_distance = min_distance
+        # How close a motion event must be to the automation's target to be ours
+        self.tolerance = tolerance
+        self.armed = False
+        self.anchor = None
+        # The automation's last two pointer targets. Events for the previous
+        # one can still arrive after the next step has started.
+        self.expected = None
+        self.previous = None
+        self.listener = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        from pynput.mouse import Listener
+
+        self.arm()
+        self.listener = Listener(on_move=self.on_move)
+        self.listener.start()
+
+    def stop(self):
+        self.disarm()
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def arm(self):
+        self.anchor = None
+        self.armed = True
+
+    def disarm(self):
+        self.armed = False
+
+    def expect(self, position):
+        # Called by the automation just before it moves the pointer
+        self.previous = self.expected
+        self.expected = position
+
+    def is_own_motion(self, x, y):
+        tolerance = self.tolerance
+        for target in (self.expected, self.previous):
+            if target is not None and abs(x - target[0]) <= tolerance and abs(y - target[1]) <= tolerance:
+                return True
+        return False
+
+    def on_move(self, x, y):
+        if not self.armed:
+            return
+
+        if self.is_own_motion(x, y):
+            self.anchor = (x, y)
+            return
+
+        anchor = self.anchor
+        if anchor is None:
+            self.anchor = (x, y)
+            return
+        if abs(x - anchor[0]) < self.min_distance and abs(y - anchor[1]) < self.min_distance:
+            return
+
+        with self.lock:
+            if not self.armed:
+                return
+            self.armed = False
+        self.on_trip()
+
+
+class GuardedBackend:
+    """Wraps an input backend and tells the guard where the pointer is going."""
+
+    def __init__(self, backend, guard):
+        self.backend = backend
+        self.guard = guard
+
+    def click(self, position):
+        self.guard.expect(position)
+        self.backend.click(position)
+
+    def double_click(self, position):
+        self.guard.expect(position)
+        self.backend.double_click(position)
+
+    def right_click(self, position):
+        self.guard.expect(position)
+        self.backend.right_click(position)
+
+    def move_to(self, position):
+        self.guard.expect(position)
+        self.backend.move_to(position)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
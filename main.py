@@ -1,111 +1,164 @@
+import os
 import sys
-import pyautogui
-from pynput.mouse import Listener as MouseListener
-from PyQt6.QtCore import Qt, pyqtSlot, pyqtSignal, QTimer, QThread
-from PyQt6.QtGui import QShortcut, QKeySequence
+from PyQt6.QtCore import Qt, pyqtSlot, pyqtSignal, QTimer, QThread, QPoint
+from PyQt6.QtGui import QShortcut, QKeySequence, QUndoStack
 from PyQt6.QtWidgets import QApplication, QVBoxLayout, QPushButton, QLineEdit, QHBoxLayout, QLabel, \
-    QListWidget, QWidget, QComboBox, QProgressBar, QMessageBox
+    QListView, QWidget, QComboBox, QProgressBar, QMessageBox, QFileDialog, QAbstractItemView
+
+from backends import create_backend
+from checkpoint import Checkpoint, read_checkpoint, sequence_digest
+from command_model import CommandListModel, InsertCommands, RemoveCommands, ReplaceCommands, UpdateCommands
+from command_store import ANCHOR_ACTIONS, CommandStore
+from data_source import DataSource
+from engine import (DeadlineScheduler, Engine, EtaEstimator, ProgressChannel, StreamingPlan, check_actions,
+                    compile_commands, format_timing_stats)
+from image_target import parse_anchor
+from input_guard import GuardedBackend, InputGuard
+from optimizer import optimize_commands
+from program import compile_program, uses_control_flow
+from recorder import Recorder
+from sequence_file import open_sequence, save_sequence
+from tracing import StepTracer, describe_commands, write_trace
+from visual_wait import parse_wait
+from watchdog import StepBudgets, Watchdog
+
+
+# Placeholder for the text field of actions that use it for something other than typing
+TEXT_HINTS = {
+    'Wait': 'color #rrggbb, stable WxH or match image.png',
+    'Click': 'Image to click on (optional)',
+    '2Click': 'Image to click on (optional)',
+    'Right Click': 'Image to click on (optional)',
+    'None': 'Image to move to (optional)',
+    'Repeat': 'Number of times to run the rows up to End',
+    'Sub': 'Subroutine name',
+    'Call': 'Subroutine name',
+    'If': 'color #rrggbb, stable WxH or match image.png',
+}
+# Control rows whose text field holds their argument (see program.py)
+ARGUMENT_ACTIONS = ('repeat', 'sub', 'call', 'if')
+# Longest time, in seconds, Stop waits for the automation thread
+STOP_TIMEOUT = 2.0
 
 
 class AutomationThread(QThread):
-    update_progress = pyqtSignal(int)
-    update_loop_indicator = pyqtSignal(int, int)
+    # (loop, step) of the last step run, at most 30 times a second
+    progress = pyqtSignal(int, int)
     automation_completed = pyqtSignal()
+    # Message of the error that ended the run
+    automation_failed = pyqtSignal(str)
 
-    def __init__(self, commands, num_loops):
+    def __init__(self, plan, num_loops, scheduler=None, eta=None, tracer=None, trace_file=None,
+                 checkpoint=None, start=(1, 0), data=None, watchdog=None):
         super().__init__()
-        self.commands = commands
+        self.engine = Engine(plan, num_loops, scheduler, progress=ProgressChannel(self.progress.emit), eta=eta,
+                             tracer=tracer, checkpoint=checkpoint, start=start, data=data, watchdog=watchdog)
+        self.watchdog = watchdog
+        self.data = data
+        self.control = self.engine.control
+        self.scheduler = scheduler
         self.num_loops = num_loops
-        self.paused = False
-        self.running = True
-        self.current_loop = 0
+        self.tracer = tracer
+        self.trace_file = trace_file
+
+    @property
+    def current_loop(self):
+        return self.engine.current_loop
 
     def run(self):
         try:
-            for self.current_loop in range(1, self.num_loops + 1):
-                for command in self.commands:
-                    position, interval, action, *extra_data = command
-                    text = extra_data[0] if extra_data else ""
-
-                    while self.paused or not self.running:
-                        if not self.running:
-                            return
-                        QThread.msleep(100)
-
-                    if action == 'click':
-                        pyautogui.click(position)
-                    elif action == '2click':
-                        pyautogui.doubleClick(position)
-                    elif action == 'right click':
-                        pyautogui.rightClick(position)
-                    elif action == 'copy':
-                        pyautogui.hotkey('ctrl', 'c')
-                    elif action == 'paste':
-                        pyautogui.hotkey('ctrl', 'v')
-                    elif action == 'enter':
-                        pyautogui.press('enter')
-                    elif action == 'close tab':
-                        pyautogui.hotkey('ctrl', 'w')
-                    elif action == 'select all':
-                        pyautogui.hotkey('ctrl', 'a')
-                    elif action == 'text':
-                        pyautogui.typewrite(text)
-                    elif action == 'move up':
-                        pyautogui.press('up')
-                    elif action == 'move down':
-                        pyautogui.press('down')
-                    elif action == 'move left':
-                        pyautogui.press('left')
-                    elif action == 'move right':
-                        pyautogui.press('right')
-                    elif action == 'go to end':
-                        pyautogui.hotkey('end')
-                    elif action == 'go to beginning':
-                        pyautogui.hotkey('home')
-                    elif action == 'backspace':
-                        pyautogui.press('backspace')
-                    elif action == 'none':
-                        pyautogui.moveTo(position)
-
-                    QThread.msleep(int(interval * 1000))
-                    if not self.running:
-                        return
-
-                self.update_progress.emit(int(self.current_loop / self.num_loops * 100))
-                self.update_loop_indicator.emit(self.current_loop, self.num_loops)
-
-            self.automation_completed.emit()
+            if self.engine.run():
+                self.automation_completed.emit()
 
         except Exception as e:
             print(f"Error during automation: {e}")
+            if self.tracer:
+                self.tracer.error(e)
+            self.automation_failed.emit(str(e) or type(e).__name__)
+
+        finally:
+            if self.data:
+                self.data.close()
+            if self.tracer and self.trace_file:
+                try:
+                    write_trace(self.trace_file, self.tracer)
+                except OSError as e:
+                    print(f"Could not write trace: {e}")
 
     def pause(self):
-        self.paused = True
+        self.control.pause()
 
     def resume(self):
-        self.paused = False
+        self.control.resume()
 
     def stop(self):
-        self.running = False
-        while self.isRunning():
-            QThread.msleep(100)
+        """Stop the run. Returns False if the thread is still stuck in a step after STOP_TIMEOUT."""
+        self.control.stop()
+        return self.wait(int(STOP_TIMEOUT * 1000))
 
 class ClickAutomationApp(QWidget):
+    # 'deadline' keeps an absolute schedule, 'interval' sleeps after each step
+    timing_mode = 'deadline'
+    # When late, run the next steps back to back (True) or skip ahead (False)
+    catch_up = True
+    # One of backends.BACKENDS: 'pyautogui', 'xtest', 'null' or 'record'
+    input_backend = 'pyautogui'
+    # Longer sequences are compiled step by step from the command store while
+    # running, instead of holding a bound plan for every step in memory
+    streaming_threshold = 100_000
+    # Characters per second for the 'Chunked' text strategy
+    typing_rate = 200
+    # Write an execution trace of each run here (Chrome trace JSON, or the
+    # binary form for '.bin'). Keeps the last trace_capacity steps.
+    trace_file = None
+    trace_capacity = 100_000
+    # Merge redundant zero-interval steps before running (see optimizer.py)
+    optimize = False
+    # Every completed step is recorded here so a stopped or crashed run can
+    # be resumed after its last step (see checkpoint.py). None disables it.
+    checkpoint_file = os.path.join(os.path.expanduser('~'), '.clickerpro-checkpoint')
+    # Longest time, in seconds, recorded steps may wait to be flushed to disk
+    checkpoint_sync = 1.0
+    # CSV or JSONL file whose rows fill {column} placeholders in text steps,
+    # one row per loop (see data_source.py). With a data file, a blank loop
+    # count runs once per row.
+    data_file = None
+    # Seconds a step may run before the watchdog steps in (see watchdog.py),
+    # with per-action overrides such as {'text': 60}. None disables it.
+    step_budget = 5.0
+    action_budgets = {}
+    # What to do with a step over budget: 'abort', 'skip' or 'retry'
+    timeout_policy = 'abort'
+
+    # Emitted from the input guard's listener thread, delivered on the GUI thread
+    pause_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.initUI()
         self.paused = False  # Initialize paused attribute
 
-        self.commands = []
         self.num_loops = 0
         self.running = False
         self.automation_thread = None
+        # Stopped threads still stuck in a step, kept until they end
+        self.stopped_threads = []
         self.positionMessageShown = False  # Add this line
-        self.mouse_listener = None
+        self.input_guard = None
+        self.backend = None
+        self.recorder = None
+        # Set when the running plan was optimized; maps plan steps to rows
+        self.optimized = None
+        # Set when the running plan is a program with control rows
+        self.program = None
+        self.pause_requested.connect(self.onPauseRequested)
 
         self.estimated_time_timer = QTimer(self)
         self.estimated_time_timer.timeout.connect(self.updateEstimatedTime)
         self.estimated_time_seconds = 0
+        self.eta = None
+        # (command model revision, measured step times) from the last run
+        self.step_estimates = None
 
     def initUI(self):
         # Main layout
@@ -124,6 +177,11 @@ class ClickAutomationApp(QWidget):
         position_layout.addWidget(self.position_input)
         position_layout.addWidget(self.get_position_button)
 
+        # Record live clicks and typing into the command list
+        self.record_button = QPushButton('Record', self)
+        self.record_button.clicked.connect(self.toggleRecording)
+        position_layout.addWidget(self.record_button)
+
         # Row for interval input
         self.interval_input = QLineEdit(self)
         self.interval_label = QLabel('Interval')
@@ -150,8 +208,18 @@ class ClickAutomationApp(QWidget):
         buttons_layout.addWidget(self.add_more_button)
         buttons_layout.addWidget(self.start_button)
 
-        # List to display commands
-        self.command_list = QListWidget(self)
+        # List to display commands, backed by a model over the command store
+        self.command_model = CommandListModel(parent=self)
+        self.undo_stack = QUndoStack(self)
+        self.edit_action = None
+        self.edit_strategy = None
+        self.command_list = QListView(self)
+        self.command_list.setModel(self.command_model)
+        self.command_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.command_list.setUniformItemSizes(True)
+        # Lay out long lists in batches so the window stays responsive
+        self.command_list.setLayoutMode(QListView.LayoutMode.Batched)
+        self.command_list.setBatchSize(2000)
 
         # Action dropdown list
         self.action_dropdown = QComboBox(self)
@@ -159,7 +227,8 @@ class ClickAutomationApp(QWidget):
                                        "Copy", "Paste", "Enter", "Close Tab",
                                        "Select All", "Text", "Move Up", "Move Down",
                                        "Move Left", "Move Right", "Go to End",
-                                       "Go to Beginning", "Backspace"])
+                                       "Go to Beginning", "Backspace", "Wait",
+                                       "Repeat", "End", "Sub", "Call", "If", "Else"])
         self.action_dropdown.setStyleSheet("""
             QComboBox {
                 background-color: #424242; /* Dark gray background */
@@ -188,9 +257,13 @@ class ClickAutomationApp(QWidget):
 
         self.text_input = QLineEdit(self)
         self.text_label = QLabel('Text')
+        # How the text is entered: one key per character, clipboard paste or paced chunks
+        self.text_strategy_dropdown = QComboBox(self)
+        self.text_strategy_dropdown.addItems(["Type", "Paste", "Chunked"])
         text_layout = QHBoxLayout()
         text_layout.addWidget(self.text_label)
         text_layout.addWidget(self.text_input)
+        text_layout.addWidget(self.text_strategy_dropdown)
 
         self.action_dropdown.currentIndexChanged.connect(self.onTextAction)
         self.onTextAction(self.action_dropdown.currentIndex())
@@ -204,95 +277,189 @@ class ClickAutomationApp(QWidget):
         layout.addWidget(self.command_list)
         layout.addLayout(buttons_layout)
 
-        self.control_buttons_layout = QHBoxLayout()  # New horizontal layout for control buttons
+        # Pause, Stop, the loop indicator, the estimated time and the progress
+        # bar only show while running, so they are built on the first Start
+        self.run_layout = QVBoxLayout()
+        layout.addLayout(self.run_layout)
+        self.pause_resume_button = None
 
-        self.pause_resume_button = QPushButton('Pause', self)
-        self.pause_resume_button.clicked.connect(self.togglePauseResume)
-        self.pause_resume_button.hide()
-        self.control_buttons_layout.addWidget(self.pause_resume_button)
+        # Edit, Remove and Back are built when a command is first selected
+        self.buttons_layout = buttons_layout
+        self.edit_button = self.remove_button = self.back_button = None
 
-        self.stop_button = QPushButton('Stop', self)  # New stop button
-        self.stop_button.clicked.connect(self.stopAutomation)
-        self.stop_button.hide()
-        self.control_buttons_layout.addWidget(self.stop_button)
+        # Setting up keyboard shortcut for pause/resume
+        self.pause_resume_shortcut = QShortcut(QKeySequence('P'), self)
 
-        layout.addLayout(self.control_buttons_layout)
+        # Keyboard shortcuts for saving and loading sequences
+        self.save_shortcut = QShortcut(QKeySequence('Ctrl+S'), self)
+        self.save_shortcut.activated.connect(self.saveSequence)
+        self.load_shortcut = QShortcut(QKeySequence('Ctrl+O'), self)
+        self.load_shortcut.activated.connect(self.loadSequence)
 
-        # Loop indicator and Estimated Time layout11
-        status_layout = QHBoxLayout()
-        self.loop_indicator_label = QLabel('Loop: 0/0', self)
-        self.loop_indicator_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
-        self.loop_indicator_label.hide()
+        self.undo_shortcut = QShortcut(QKeySequence(QKeySequence.StandardKey.Undo), self)
+        self.undo_shortcut.activated.connect(self.undo)
+        self.redo_shortcut = QShortcut(QKeySequence(QKeySequence.StandardKey.Redo), self)
+        self.redo_shortcut.activated.connect(self.redo)
 
-        self.estimated_time_label = QLabel('Estimated Time: 00:00:00', self)
-        self.estimated_time_label.setAlignment(Qt.AlignmentFlag.AlignRight)
-        self.estimated_time_label.hide()
+        # Reset button
+        self.reset_button = QPushButton('Reset', self)
+        self.reset_button.clicked.connect(self.resetList)
 
-        status_layout.addWidget(self.loop_indicator_label)
-        status_layout.addStretch()
-        status_layout.addWidget(self.estimated_time_label)
+        # Add the reset button to the buttons layout
+        buttons_layout.addWidget(self.reset_button)
 
-        # Add status_layout above the progress bar
-        layout.addLayout(status_layout)
+        self.setLayout(layout)
+        self.setWindowTitle('Clicker')
 
-        # Progress bar (initially hidden)
-        self.progress_bar = QProgressBar(self)
-        self.progress_bar.setTextVisible(False)
-        self.progress_bar.hide()
-        layout.addWidget(self.progress_bar)
+        # Connect item clicked signal
+        self.command_list.clicked.connect(self.onCommandSelected)
+        self.command_list.selectionModel().selectionChanged.connect(self.resetUIState)
 
-        # Create Edit and Remove buttons but hide them initially
+    def buildEditButtons(self):
+        if self.edit_button:
+            return
         self.edit_button = QPushButton('Edit', self)
         self.edit_button.clicked.connect(self.editCommand)
-        self.edit_button.hide()
 
         self.remove_button = QPushButton('Remove', self)
         self.remove_button.clicked.connect(self.removeCommand)
-        self.remove_button.hide()
 
         self.back_button = QPushButton('Back', self)
         self.back_button.clicked.connect(self.onBackClicked)
-        self.back_button.hide()
 
-        buttons_layout.addWidget(self.edit_button)
-        buttons_layout.addWidget(self.remove_button)
-        buttons_layout.addWidget(self.back_button)
+        # Between Start and Reset
+        for offset, button in enumerate((self.edit_button, self.remove_button, self.back_button)):
+            button.hide()
+            self.buttons_layout.insertWidget(2 + offset, button)
 
-        # Setting up keyboard shortcut for pause/resume
-        self.pause_resume_shortcut = QShortcut(QKeySequence('P'), self)
+    def hideEditButtons(self):
+        if self.edit_button:
+            self.edit_button.hide()
+            self.remove_button.hide()
+            self.back_button.hide()
 
-        # Reset button
-        self.reset_button = QPushButton('Reset', self)
-        self.reset_button.clicked.connect(self.resetList)
+    def buildRunControls(self):
+        if self.pause_resume_button:
+            return
+        control_buttons_layout = QHBoxLayout()
 
-        # Add the reset button to the buttons layout
-        buttons_layout.addWidget(self.reset_button)
+        self.pause_resume_button = QPushButton('Pause', self)
+        self.pause_resume_button.clicked.connect(self.togglePauseResume)
+        control_buttons_layout.addWidget(self.pause_resume_button)
 
-        self.setLayout(layout)
-        self.setWindowTitle('Clicker')
+        self.stop_button = QPushButton('Stop', self)
+        self.stop_button.clicked.connect(self.stopAutomation)
+        control_buttons_layout.addWidget(self.stop_button)
 
-        # Connect item clicked signal
-        self.command_list.itemClicked.connect(self.onCommandSelected)
-        self.command_list.itemSelectionChanged.connect(self.resetUIState)
+        self.run_layout.addLayout(control_buttons_layout)
+
+        # Loop indicator and Estimated Time above the progress bar
+        status_layout = QHBoxLayout()
+        self.loop_indicator_label = QLabel('Loop: 0/0', self)
+        self.loop_indicator_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
+
+        self.estimated_time_label = QLabel('Estimated Time: 00:00:00', self)
+        self.estimated_time_label.setAlignment(Qt.AlignmentFlag.AlignRight)
+
+        status_layout.addWidget(self.loop_indicator_label)
+        status_layout.addStretch()
+        status_layout.addWidget(self.estimated_time_label)
+        self.run_layout.addLayout(status_layout)
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setTextVisible(False)
+        self.run_layout.addWidget(self.progress_bar)
+
+        for widget in (self.pause_resume_button, self.stop_button, self.loop_indicator_label,
+                       self.estimated_time_label, self.progress_bar):
+            widget.hide()
+
+    def inputBackend(self):
+        # pyautogui and the other input libraries are imported here, on the
+        # first Get Position or Start, not when the window opens
+        if self.backend is None:
+            self.backend = create_backend(self.input_backend)
+        return self.backend
+
+    @property
+    def commands(self):
+        return self.command_model.store
+
+    def readCommand(self, old=None):
+        # Build a command from the input fields. When editing several commands
+        # at once, ``old`` is the command being changed and blank fields keep
+        # its values.
+        position_text = self.position_input.text().strip()
+        interval_text = self.interval_input.text().strip()
+        action = self.action_dropdown.currentText().lower()
+
+        if old is None or position_text:
+            position = tuple(map(int, position_text.split(',')))
+        else:
+            position = old[0]
+        if old is None or interval_text:
+            interval = float(interval_text)
+        else:
+            interval = old[1]
+        if old is not None and action == self.edit_action:
+            action = old[2]
+
+        if action == 'text':
+            text = self.text_input.text()
+            if old is not None and old[2] == 'text' and not text:
+                text = old[3]
+            strategy = self.text_strategy_dropdown.currentText().lower()
+            if not strategy:
+                # Left blank when editing several commands: keep each one's own
+                strategy = 'type'
+                if old is not None and old[2] == 'text' and len(old) > 4:
+                    strategy = old[4]
+            elif strategy == 'chunked':
+                # Keep a rate set in the sequence file, otherwise use the default
+                old_strategy = old[4] if old is not None and len(old) > 4 else self.edit_strategy
+                if old_strategy and old_strategy.startswith('chunked'):
+                    strategy = old_strategy
+                else:
+                    strategy = f'chunked:{self.typing_rate}'
+            if strategy == 'type':
+                return position, interval, action, text
+            return position, interval, action, text, strategy
+        if action == 'wait':
+            text = self.text_input.text().strip()
+            if old is not None and old[2] == 'wait' and not text:
+                text = old[3]
+            # Reject a bad condition now rather than when the run starts
+            parse_wait(text)
+            return position, interval, action, text
+        if action in ARGUMENT_ACTIONS:
+            text = self.text_input.text().strip()
+            if old is not None and old[2] == action and not text:
+                text = old[3]
+            if action == 'if':
+                parse_wait(text)
+            elif action == 'repeat' and not text.isdigit():
+                raise ValueError(f"Repeat count '{text}' is not a whole number")
+            elif not text:
+                raise ValueError(f"'{action}' needs a subroutine name")
+            return position, interval, action, text
+        if action in ANCHOR_ACTIONS:
+            image = self.text_input.text().strip()
+            if old is not None and old[2] in ANCHOR_ACTIONS and not image and len(old) > 3:
+                image = old[3]
+            if image:
+                parse_anchor(image)
+                return position, interval, action, image
+        return position, interval, action
+
+    def selectedRows(self):
+        return sorted(index.row() for index in self.command_list.selectionModel().selectedRows())
 
     @pyqtSlot()
     def addMore(self):
         try:
             # Extract position, interval and action.
-            position = tuple(map(int, self.position_input.text().split(',')))
-            interval = float(self.interval_input.text())
-            action = self.action_dropdown.currentText().lower()
-
-            # Special handling for 'Text' action
-            if action == 'text':
-                text = self.text_input.text()
-                # Append command details to the list
-                self.commands.append((position, interval, action, text))
-            else:
-                # Append command details to the list
-                self.commands.append((position, interval, action))
-
-            self.command_list.addItem(f'Action: {action}, Interval: {interval}s')
+            command = self.readCommand()
+            self.undo_stack.push(InsertCommands(self.command_model, len(self.commands), [command]))
 
             # Disable number of loops input after the first command is added
             if len(self.commands) == 1:
@@ -305,12 +472,13 @@ class ClickAutomationApp(QWidget):
             # Handle errors like incorrect data formats
             print("Error adding command:", e)
 
-    def onCommandSelected(self, item):
-        if item:
+    def onCommandSelected(self, index):
+        if index.isValid():
             self.add_more_button.hide()
             self.start_button.hide()
             self.reset_button.hide()
 
+            self.buildEditButtons()
             self.edit_button.show()
             self.remove_button.show()
             self.back_button.show()
@@ -318,21 +486,35 @@ class ClickAutomationApp(QWidget):
             self.resetUIAfterEditOrRemove()
 
     def editCommand(self):
-        selected_item = self.command_list.currentItem()
-        if selected_item:
-            index = self.command_list.row(selected_item)
-            position, interval, action, *extra = self.commands[index]
+        rows = self.selectedRows()
+        if rows:
+            position, interval, action, *extra = self.commands[rows[0]]
 
-            self.position_input.setText(f'{position[0]}, {position[1]}')
-            self.interval_input.setText(str(interval))
+            if len(rows) == 1:
+                self.position_input.setText(f'{position[0]}, {position[1]}')
+                self.interval_input.setText(str(interval))
+            else:
+                # Fields left blank keep each command's own value
+                self.position_input.clear()
+                self.interval_input.clear()
             self.action_dropdown.setCurrentText(action.capitalize())
+            self.edit_action = action if len(rows) > 1 else None
 
-            if action == 'text':
+            if len(rows) > 1:
+                # Blank text and strategy keep each command's own
+                self.text_input.clear()
+                self.text_strategy_dropdown.setCurrentIndex(-1)
+            elif action == 'text':
+                self.text_input.setText(extra[0])
+                strategy = extra[1] if len(extra) > 1 else 'type'
+                self.text_strategy_dropdown.setCurrentText(strategy.partition(':')[0].capitalize())
+                self.edit_strategy = strategy
+            elif action == 'wait' or action in ARGUMENT_ACTIONS or (action in ANCHOR_ACTIONS and extra):
                 self.text_input.setText(extra[0])
 
             self.add_more_button.setText('Update')
             self.add_more_button.clicked.disconnect()
-            self.add_more_button.clicked.connect(lambda: self.updateCommand(index))
+            self.add_more_button.clicked.connect(lambda: self.updateCommand(rows))
 
             self.reset_button.setText('Cancel')
             self.reset_button.clicked.disconnect()
@@ -345,14 +527,12 @@ class ClickAutomationApp(QWidget):
             self.remove_button.hide()
             self.back_button.hide()
 
-            self.num_loops_input.setEnabled(index == 0)
+            self.num_loops_input.setEnabled(rows[0] == 0)
 
     def removeCommand(self):
-        selected_item = self.command_list.currentItem()
-        if selected_item:
-            index = self.command_list.row(selected_item)
-            del self.commands[index]
-            self.command_list.takeItem(index)
+        rows = self.selectedRows()
+        if rows:
+            self.undo_stack.push(RemoveCommands(self.command_model, rows))
             self.resetUIAfterEditOrRemove()
 
             if len(self.commands) == 0:
@@ -361,33 +541,36 @@ class ClickAutomationApp(QWidget):
     def onBackClicked(self):
         self.command_list.clearSelection()
         self.resetUIState()
-        self.back_button.hide()
+        self.hideEditButtons()
 
-    def updateCommand(self, index):
+    def updateCommand(self, rows):
         try:
-            position = tuple(map(int, self.position_input.text().split(',')))
-            interval = float(self.interval_input.text())
-            action = self.action_dropdown.currentText().lower()
-            text = self.text_input.text() if action == 'text' else ''
+            if len(rows) == 1:
+                commands = [self.readCommand()]
+            else:
+                commands = [self.readCommand(self.commands[row]) for row in rows]
 
-            self.commands[index] = (position, interval, action, text) if action == 'text' else (position, interval, action)
-            self.command_list.item(index).setText(f'Action: {action}, Interval: {interval}s')
+            self.undo_stack.push(UpdateCommands(self.command_model, rows, commands))
+            self.edit_action = None
+            self.edit_strategy = None
 
             self.resetUIAfterEditOrRemove()
 
-            if index == 0 and len(self.commands) > 1:
+            if rows[0] == 0 and len(self.commands) > 1:
                 self.num_loops_input.setDisabled(True)
 
         except ValueError as e:
             print("Error updating command:", e)
 
     def cancelEdit(self):
+        self.edit_action = None
+        self.edit_strategy = None
         self.resetUIAfterEditOrRemove()
         if len(self.commands) == 1:
             self.num_loops_input.setDisabled(True)
 
     def resetUIState(self):
-        if not self.command_list.selectedItems():
+        if not self.command_list.selectionModel().hasSelection():
 
             self.add_more_button.setText('Add')
             self.add_more_button.clicked.disconnect()
@@ -401,9 +584,7 @@ class ClickAutomationApp(QWidget):
             self.reset_button.clicked.connect(self.resetList)
             self.reset_button.show()
 
-            self.edit_button.hide()
-            self.remove_button.hide()
-            self.back_button.hide()
+            self.hideEditButtons()
 
     def resetUIAfterEditOrRemove(self):
         # Reset the button text and connections
@@ -419,9 +600,7 @@ class ClickAutomationApp(QWidget):
 
         self.start_button.show()
 
-        self.edit_button.hide()
-        self.remove_button.hide()
-        self.back_button.hide()
+        self.hideEditButtons()
 
         if len(self.commands) == 1:
             self.num_loops_input.setDisabled(True)
@@ -430,11 +609,77 @@ class ClickAutomationApp(QWidget):
 
         self.position_input.clear()
         self.interval_input.clear()
+        if self.text_strategy_dropdown.currentIndex() < 0:
+            self.text_strategy_dropdown.setCurrentIndex(0)
+
+    @pyqtSlot()
+    def undo(self):
+        if not self.running:
+            self.undo_stack.undo()
+            self.afterUndoRedo()
+
+    @pyqtSlot()
+    def redo(self):
+        if not self.running:
+            self.undo_stack.redo()
+            self.afterUndoRedo()
+
+    def afterUndoRedo(self):
+        # A model reset clears the selection without signalling it
+        self.edit_action = None
+        self.edit_strategy = None
+        self.resetUIAfterEditOrRemove()
+        self.num_loops_input.setEnabled(not self.commands)
+
+    @pyqtSlot()
+    def saveSequence(self):
+        if self.running:
+            return
+        if not self.commands:
+            QMessageBox.warning(self, 'No commands', 'Please add at least one command before saving.')
+            return
+
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Sequence', '',
+                                              'Sequence (*.json);;Large sequence (*.jsonl)')
+        if not path:
+            return
+
+        try:
+            loops = int(self.num_loops_input.text())
+        except ValueError:
+            loops = None
+
+        try:
+            save_sequence(path, self.commands, loops)
+        except OSError as e:
+            QMessageBox.warning(self, 'Save failed', f'Could not save the sequence: {e}')
+
+    @pyqtSlot()
+    def loadSequence(self):
+        if self.running:
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, 'Load Sequence', '', 'Sequences (*.json *.jsonl);;All files (*)')
+        if not path:
+            return
+
+        try:
+            sequence = open_sequence(path)
+            commands = CommandStore(sequence)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, 'Load failed', f'Could not load the sequence: {e}')
+            return
+
+        self.undo_stack.push(ReplaceCommands(self.command_model, commands, 'Load'))
+        self.resetUIState()
+        if sequence.loops is not None:
+            self.num_loops_input.setText(str(sequence.loops))
+        self.num_loops_input.setEnabled(not self.commands)
 
     def resetList(self):
         # Code to reset the entire command list
-        self.commands.clear()
-        self.command_list.clear()
+        if self.commands:
+            self.undo_stack.push(ReplaceCommands(self.command_model, CommandStore(), 'Reset'))
         self.resetUIState()
         self.num_loops_input.setEnabled(True)
 
@@ -444,20 +689,60 @@ class ClickAutomationApp(QWidget):
             QMessageBox.information(self, 'Get Position',
                                     'Move your cursor to the desired position. The position will be captured in 3 seconds.')
             self.positionMessageShown = True  # Set the flag to True after showing the message
+        try:
+            # Loaded now so the countdown hides the import
+            self.inputBackend()
+        except Exception as e:
+            QMessageBox.warning(self, 'Input Backend', f"Could not start input backend '{self.input_backend}': {e}")
+            return
         QTimer.singleShot(3000, self.capturePosition)
 
     def capturePosition(self):
-        x, y = pyautogui.position()
+        x, y = self.inputBackend().position()
         self.position_input.setText(f'{x}, {y}')
 
+    @pyqtSlot()
+    def toggleRecording(self):
+        if self.recorder and self.recorder.recording:
+            self.recorder.stop()
+            # Clicks on this window, like the one that stopped recording, are not part of the macro
+            window = self.frameGeometry()
+            commands = self.recorder.commands(ignore=lambda x, y: window.contains(QPoint(int(x), int(y))))
+            self.record_button.setText('Record')
+            self.start_button.setEnabled(True)
+            if commands:
+                self.undo_stack.push(InsertCommands(self.command_model, len(self.commands), commands, 'Record'))
+                self.num_loops_input.setDisabled(True)
+            return
+
+        if self.recorder is None:
+            self.recorder = Recorder()
+        try:
+            self.recorder.start()
+        except Exception as e:
+            QMessageBox.warning(self, 'Record', f"Could not start recording: {e}")
+            return
+        self.record_button.setText('Stop')
+        self.start_button.setEnabled(False)
+
     def onTextAction(self, index):
-        # Enable the text input if "Text" is selected, disable otherwise
+        # Enable the text input if "Text" is selected, disable otherwise.
+        # "Wait" uses it for the condition, e.g. "color #ff0000 timeout=5".
         selected_action = self.action_dropdown.currentText()
+        self.text_input.setPlaceholderText(TEXT_HINTS.get(selected_action, ''))
         if selected_action == "Text":
             self.text_input.setEnabled(True)
+            self.text_strategy_dropdown.setEnabled(True)
+        elif selected_action in ("Wait", "Click", "2Click", "Right Click", "None", "Repeat", "Sub", "Call", "If"):
+            # Pointer actions take an optional image to find on screen
+            self.text_input.setEnabled(True)
+            self.text_strategy_dropdown.setEnabled(False)
+            self.text_strategy_dropdown.setCurrentIndex(0)
         else:
             self.text_input.setEnabled(False)
             self.text_input.clear()
+            self.text_strategy_dropdown.setEnabled(False)
+            self.text_strategy_dropdown.setCurrentIndex(0)
 
     @pyqtSlot()
     def startAutomation(self):
@@ -469,11 +754,50 @@ class ClickAutomationApp(QWidget):
             return
 
         try:
-            self.num_loops = int(self.num_loops_input.text())
+            loops_text = self.num_loops_input.text().strip()
+            self.num_loops = None if self.data_file and not loops_text else int(loops_text)
         except ValueError:
             QMessageBox.warning(self, 'Invalid Input', 'Please enter a valid number of loops.')
             return
 
+        try:
+            backend = self.inputBackend()
+        except Exception as e:
+            QMessageBox.warning(self, 'Input Backend', f"Could not start input backend '{self.input_backend}': {e}")
+            return
+
+        # Opened last, so only a failed compile has to close it
+        data = None
+        if self.data_file:
+            try:
+                data = DataSource(self.data_file)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, 'Data File', f"Could not read {self.data_file}: {e}")
+                return
+
+        input_guard = InputGuard(self.pause_requested.emit)
+        backend = GuardedBackend(backend, input_guard)
+        optimized = program = None
+        try:
+            if uses_control_flow(self.commands.used_actions()):
+                # Repeats, subroutines and branches run without expanding them
+                plan = program = compile_program(self.commands, backend, data)
+            elif len(self.commands) > self.streaming_threshold:
+                check_actions(self.commands.used_actions())
+                plan = StreamingPlan(self.commands, backend, data)
+            elif self.optimize:
+                optimized = optimize_commands(self.commands)
+                plan = optimized.compile(backend, data)
+            else:
+                plan = compile_commands(self.commands, backend, data)
+        except ValueError as e:
+            if data:
+                data.close()
+            QMessageBox.warning(self, 'Invalid Command', str(e))
+            return
+        checkpoint, start = self.openCheckpoint('optimized' if optimized else '', data)
+        self.buildRunControls()
+
         # Reset the progress bar to 0
         self.updateProgressBar(0)
 
@@ -481,30 +805,83 @@ class ClickAutomationApp(QWidget):
         self.updateLoopIndicator(0, self.num_loops)
 
         # Calculate and set the estimated time
+        self.optimized = optimized
+        self.program = program
         self.calculate_total_estimated_time()
         self.displayEstimatedTime(self.estimated_time_seconds)
 
-        # Start the timer for the estimated time
+        # Refresh the estimate from the engine's measurements once a second
         self.estimated_time_timer.start(1000)
 
         self.running = True
-        self.startMouseListener()
-        self.automation_thread = AutomationThread(self.commands, self.num_loops)
-        self.automation_thread.update_progress.connect(self.updateProgressBar)
-        self.automation_thread.update_loop_indicator.connect(self.updateLoopIndicator)
+        self.input_guard = input_guard
+        self.input_guard.start()
+        scheduler = DeadlineScheduler(catch_up=self.catch_up) if self.timing_mode == 'deadline' else None
+        tracer = None
+        if self.trace_file:
+            # Streaming plans run the rows in order, so rows are steps there too
+            tracer = StepTracer(self.trace_capacity,
+                                describe_commands(self.commands, optimized.rows if optimized else None))
+        watchdog = None
+        if self.step_budget is not None:
+            # The commands stay in memory, so streaming plans are budgeted by row too
+            budgets = StepBudgets(self.commands, self.action_budgets, self.step_budget,
+                                  optimized.rows if optimized else None, data)
+            watchdog = Watchdog(budgets, self.timeout_policy, describe=self.describeStep, default=self.step_budget)
+        self.automation_thread = AutomationThread(plan, self.num_loops, scheduler, self.eta,
+                                                  tracer, self.trace_file,
+                                                  checkpoint, start, data, watchdog)
+        self.automation_thread.progress.connect(self.onProgress)
         self.automation_thread.automation_completed.connect(self.onAutomationCompleted)
+        self.automation_thread.automation_failed.connect(self.onAutomationFailed)
 
         self.automation_thread.start()
         self.AutomationState(True)
 
+    def openCheckpoint(self, variant, data=None):
+        # Offer to continue after the last step recorded by a stopped or
+        # crashed run of the same commands
+        if not self.checkpoint_file:
+            return None, (1, 0)
+        if data:
+            variant += f' data={os.path.abspath(data.path)}'
+        digest = sequence_digest(self.commands, variant)
+        start = (1, 0)
+        try:
+            saved = read_checkpoint(self.checkpoint_file, digest)
+        except OSError:
+            saved = None
+        if saved and (self.num_loops is None or saved[0] <= self.num_loops):
+            loop, step, cursor, state = saved
+            answer = QMessageBox.question(self, 'Resume',
+                                          f"The last run of this sequence stopped in loop {loop} "
+                                          f"after step {step}.\n\nResume from there?")
+            if answer == QMessageBox.StandardButton.Yes:
+                start = loop, step, state
+                if data:
+                    # Back to the row the interrupted loop was working on
+                    data.seek(cursor)
+        cursor = (lambda: data.row_index) if data else None
+        checkpoint = Checkpoint(self.checkpoint_file, digest, self.checkpoint_sync, cursor=cursor)
+        try:
+            # Opened here, so a checkpoint that cannot be written does not fail the run
+            checkpoint.open(*start)
+        except OSError as e:
+            QMessageBox.warning(self, 'Checkpoint', f"Could not write {self.checkpoint_file}: {e}\n\n"
+                                                    "The run continues without a checkpoint.")
+            return None, start
+        return checkpoint, start
+
     def AutomationState(self, is_running):
         # Enable or disable UI elements based on the running state
         self.get_position_button.setEnabled(not is_running)
+        self.record_button.setEnabled(not is_running)
         self.command_list.setEnabled(not is_running)
         self.position_input.setEnabled(not is_running)
         self.interval_input.setEnabled(not is_running)
         self.action_dropdown.setEnabled(not is_running)
         self.text_input.setEnabled(not is_running)
+        self.text_strategy_dropdown.setEnabled(not is_running)
 
         # Show or hide buttons based on whether automation is running
         self.add_more_button.setVisible(not is_running)
@@ -520,19 +897,28 @@ class ClickAutomationApp(QWidget):
     @pyqtSlot()
     def stopAutomation(self):
         if self.automation_thread and self.automation_thread.isRunning():
-            current_loop = self.automation_thread.current_loop
-            remaining_loops = self.num_loops - current_loop + 1
-            self.num_loops = max(0, remaining_loops)
-            self.num_loops_input.setText(str(self.num_loops))
-            self.automation_thread.stop()
-            while self.automation_thread.isRunning():
-                QApplication.processEvents()
+            if not self.checkpoint_file and self.num_loops is not None:
+                # Without a checkpoint the partial loop runs again from its start
+                current_loop = self.automation_thread.current_loop
+                remaining_loops = self.num_loops - current_loop + 1
+                self.num_loops = max(0, remaining_loops)
+                self.num_loops_input.setText(str(self.num_loops))
+            thread = self.automation_thread
+            if not thread.stop():
+                # The step it is stuck in cannot be interrupted; the thread
+                # ends when the step returns
+                print("The automation thread did not stop in time; it ends when its current step returns")
+                self.stopped_threads.append(thread)
+                thread.finished.connect(lambda: self.stopped_threads.remove(thread))
+            self.stopInputGuard()
+            self.stopHighlight()
 
             # Reset loop indicator
             self.updateLoopIndicator(0, self.num_loops)
 
             # Stop the estimated time timer
             self.estimated_time_timer.stop()
+            self.keepStepEstimates()
             self.estimated_time_seconds = 0
             self.displayEstimatedTime(self.estimated_time_seconds)
 
@@ -572,10 +958,9 @@ class ClickAutomationApp(QWidget):
             self.pause_resume_button.setText('Pause')
             self.paused = False
 
-            # Restart the mouse listener
-            if not self.mouse_listener:
-                self.mouse_listener = MouseListener(on_move=self.on_mouse_move)
-                self.mouse_listener.start()
+            # Watch for user movement again
+            if self.input_guard:
+                self.input_guard.arm()
         else:
             # Pausing the automation
             self.automation_thread.pause()
@@ -583,30 +968,67 @@ class ClickAutomationApp(QWidget):
             self.pause_resume_button.setText('Resume')
             self.paused = True
 
-            # Stop the mouse listener
-            if self.mouse_listener:
-                self.mouse_listener.stop()
-                self.mouse_listener = None
+            # Ignore movement while paused
+            if self.input_guard:
+                self.input_guard.disarm()
 
-    def startMouseListener(self):
-        # Start listening for mouse movements
-        self.mouse_listener = MouseListener(on_move=self.on_mouse_move)
-        self.mouse_listener.start()
-
-    def on_mouse_move(self, x, y):
-        # Pause the automation when mouse movement is detected
+    @pyqtSlot()
+    def onPauseRequested(self):
+        # Pause the automation when the input guard detects user movement
         if self.running and not self.paused:
             self.togglePauseResume()
 
+    def stopInputGuard(self):
+        if self.input_guard:
+            self.input_guard.stop()
+            self.input_guard = None
+
+    @pyqtSlot(int, int)
+    def onProgress(self, loop, step):
+        # Rate limited by the engine, so this runs at most 30 times a second
+        if not self.running:
+            return
+        if self.optimized:
+            step = self.optimized.rows[step]
+        steps = len(self.commands)
+        if self.program or self.num_loops is None:
+            # Steps may repeat or be skipped, or the number of loops is only
+            # estimated, so go by the estimated time done
+            self.updateProgressBar(int(self.eta.fraction_done() * 100))
+        elif steps and self.num_loops:
+            done = (loop - 1) * steps + step + 1
+            self.updateProgressBar(int(done * 100 / (steps * self.num_loops)))
+        self.updateLoopIndicator(loop, self.num_loops)
+        self.command_model.setCurrentRow(step)
+        self.command_list.scrollTo(self.command_model.index(step))
+
+    def stopHighlight(self):
+        self.command_model.setCurrentRow(-1)
+
     def updateProgressBar(self, progress):
         self.progress_bar.setValue(progress)
 
     def updateLoopIndicator(self, current_loop, total_loops):
-        self.loop_indicator_label.setText(f'Loop: {current_loop}/{total_loops}')
+        # Data-driven runs without a loop count end with their rows
+        self.loop_indicator_label.setText(f'Loop: {current_loop}/{"?" if total_loops is None else total_loops}')
 
     def calculate_total_estimated_time(self):
-        total_interval = sum(command[1] for command in self.commands)
-        self.estimated_time_seconds = total_interval * self.num_loops
+        # Start from the step times measured in the last run of the same
+        # commands, e.g. when restarting after a stop, or else from the
+        # configured intervals
+        if self.step_estimates and self.step_estimates[0] == self.command_model.revision:
+            prior = self.step_estimates[1]
+        elif self.optimized:
+            prior = self.optimized.intervals
+        else:
+            prior = self.commands.intervals
+        self.eta = EtaEstimator(prior, weights=self.program.weights if self.program else None)
+        self.eta.start(self.num_loops or 1)
+        self.estimated_time_seconds = self.eta.remaining()
+
+    def keepStepEstimates(self):
+        if self.eta:
+            self.step_estimates = (self.command_model.revision, self.eta.estimates)
 
     def displayEstimatedTime(self, seconds):
         hours, remainder = divmod(seconds, 3600)
@@ -615,26 +1037,64 @@ class ClickAutomationApp(QWidget):
         self.estimated_time_label.setText(f'Estimated Time: {time_str}')
 
     def updateEstimatedTime(self):
-        if self.estimated_time_seconds > 0:
-            self.estimated_time_seconds -= 1
+        if self.eta:
+            self.estimated_time_seconds = self.eta.remaining()
             self.displayEstimatedTime(self.estimated_time_seconds)
 
     def onAutomationCompleted(self):
         self.running = False
+        self.stopInputGuard()
+        self.stopHighlight()
+        self.estimated_time_timer.stop()
+        self.keepStepEstimates()
         self.AutomationState(False)
-        QMessageBox.information(self, 'Completed', 'Automation completed.')
-
-
-def main():
-    app = QApplication(sys.argv)
-
-    # Set the global stylesheet for the application
-    app.setStyleSheet("""
+        message = 'Automation completed.'
+        scheduler = self.automation_thread.scheduler
+        if scheduler:
+            message += '\n\n' + format_timing_stats(scheduler.stats())
+        if self.optimized:
+            message += '\n\n' + self.optimized.summary()
+        timeouts = self.timeoutReport()
+        if timeouts:
+            message += '\n\n' + timeouts
+        QMessageBox.information(self, 'Completed', message)
+
+    def onAutomationFailed(self, error):
+        self.running = False
+        self.stopInputGuard()
+        self.stopHighlight()
+        self.estimated_time_timer.stop()
+        self.keepStepEstimates()
+        self.AutomationState(False)
+        message = f"Automation stopped: {error}"
+        timeouts = self.timeoutReport()
+        if timeouts:
+            message += '\n\n' + timeouts
+        QMessageBox.warning(self, 'Automation Error', message)
+
+    def describeStep(self, step):
+        row = self.optimized.rows[step] if self.optimized else step
+        return f"Step {row + 1} ({self.commands[row][2]})"
+
+    def timeoutReport(self):
+        # Steps of the last run that went over their time budget
+        watchdog = self.automation_thread.watchdog if self.automation_thread else None
+        if not watchdog or not watchdog.timeouts:
+            return ''
+        lines = [f"{self.describeStep(step)} {outcome} after {seconds:.1f} s"
+                 for step, seconds, outcome in watchdog.timeouts[:10]]
+        if len(watchdog.timeouts) > 10:
+            lines.append(f"... and {len(watchdog.timeouts) - 10} more")
+        return 'Steps over their time budget:\n' + '\n'.join(lines)
+
+
+# Global stylesheet for the application
+STYLE_SHEET = """
     QWidget {
         background-color: #323232;
         color: #EEEEEE;
     }
-    QLineEdit, QListWidget {
+    QLineEdit, QListView {
         background-color: #424242;
         border: 1px solid #555555;
     }
@@ -642,7 +1102,13 @@ def main():
         background-color: #EEEEEE;
         color: #000000;
     }
-    """)
+"""
+
+
+def main():
+    app = QApplication(sys.argv)
+
+    app.setStyleSheet(STYLE_SHEET)
 
     ex = ClickAutomationApp()
     ex.show()
@@ -0,0 +1,96 @@
+"""Optional pass that removes redundant steps before a run.
+
+Only steps with a zero interval are ever merged into the step after them,
+so the timing of the sequence is unchanged: a step with a non-zero interval
+always runs on its own and is followed by its full wait. The rewrites are:
+
+* a 'none' move followed by a click, double click, right click or another
+  move at the same position is dropped, because that step moves there anyway
+* a run of the same single-key action ('enter', arrows, 'backspace') becomes
+  one batched press with a count
+* 'select all' or 'copy' right before the same action is dropped
+
+The result maps each remaining step back to a row of the original list, so
+progress can still highlight the command being run.
+"""
+from array import array
+from functools import partial
+
+from engine import PRESS_KEYS, compile_command
+
+CLICK_ACTIONS = ('click', '2click', 'right click', 'none')
+IDEMPOTENT_ACTIONS = ('select all', 'copy')
+# Rough cost of one input call in seconds, used for the estimate of time saved
+CALL_COST = 0.002
+
+
+class Optimized:
+    """An optimized sequence.
+
+    ``steps`` holds ``(command, presses)`` pairs and ``rows[i]`` is the row of
+    the original command that step ``i`` stands for.
+    """
+
+    def __init__(self, steps, rows, original):
+        self.steps = steps
+        self.rows = rows
+        self.original = original
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def saved_calls(self):
+        # Input calls no longer made per loop. A batched press is one call.
+        return self.original - len(self.steps)
+
+    def estimated_saving(self, call_cost=CALL_COST):
+        """Estimated seconds saved per loop."""
+        return self.saved_calls * call_cost
+
+    @property
+    def intervals(self):
+        return array('d', (command[1] for command, presses in self.steps))
+
+    def summary(self, call_cost=CALL_COST):
+        return (f"Optimizer: {self.original} steps -> {len(self.steps)}, "
+                f"{self.saved_calls} input calls fewer per loop, "
+                f"about {self.estimated_saving(call_cost) * 1000:.0f} ms saved per loop")
+
+    def compile(self, backend, data=None):
+        """Bind the steps like engine.compile_commands does."""
+        plan = []
+        for (command, presses), row in zip(self.steps, self.rows):
+            if presses > 1:
+                plan.append((partial(backend.press, PRESS_KEYS[command[2]], presses), command[1]))
+            else:
+                plan.append(compile_command(row, command, backend, data))
+        return plan
+
+
+def optimize_commands(commands):
+    steps = []
+    rows = array('I')
+    original = 0
+    for row, command in enumerate(commands):
+        original += 1
+        position, interval, action = command[:3]
+        if steps:
+            (previous, presses) = steps[-1]
+            if previous[1] == 0:
+                if (previous[2] == 'none' and action in CLICK_ACTIONS
+                        and tuple(previous[0]) == tuple(position)):
+                    steps[-1] = (command, 1)
+                    rows[-1] = row
+                    continue
+                if action in PRESS_KEYS and previous[2] == action:
+                    steps[-1] = (command, presses + 1)
+                    rows[-1] = row
+                    continue
+                if action in IDEMPOTENT_ACTIONS and previous[2] == action:
+                    steps[-1] = (command, 1)
+                    rows[-1] = row
+                    continue
+        steps.append((command, 1))
+        rows.append(row)
+    return Optimized(steps, rows, original)
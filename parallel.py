@@ -0,0 +1,277 @@
+"""Run sequences on several virtual displays at once.
+
+    python -m parallel sequence.json --workers 8 --loops 10000
+    python -m parallel a.json b.json c.json --workers 3
+
+The runner starts one Xvfb server per worker and a process pool whose
+workers each bind to one of those displays and create their own input
+backend, so they never share a pointer or keyboard. With one sequence its
+loops are split evenly between the workers; with several, each sequence is
+a job of its own. Progress from all workers is merged into one line, and
+every job's result is printed when the batch ends.
+
+The servers belong to the runner and are stopped when it exits. The null
+and record backends need no display, so none is started for them.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import BACKENDS
+
+SCREEN = '1920x1080x24'
+# Seconds an Xvfb server gets to start
+START_TIMEOUT = 10.0
+# Aggregate progress lines per second
+PRINT_RATE = 2
+
+# Set in each worker process by init_worker
+events = None
+stop = None
+
+
+class XvfbDisplay:
+    """An Xvfb server on a display number it picks itself."""
+
+    def __init__(self, screen=SCREEN, timeout=START_TIMEOUT):
+        if not shutil.which('Xvfb'):
+            raise RuntimeError('Xvfb is not installed')
+        # Xvfb writes its display number to -displayfd once it accepts clients
+        read, write = os.pipe()
+        try:
+            self.server = subprocess.Popen(['Xvfb', '-displayfd', str(write), '-screen', '0', screen,
+                                            '-nolisten', 'tcp'], pass_fds=(write,),
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        finally:
+            os.close(write)
+        try:
+            ready, _, _ = select.select([read], [], [], timeout)
+            number = os.read(read, 16).strip() if ready else b''
+        finally:
+            os.close(read)
+        if not number.isdigit():
+            self.close()
+            raise RuntimeError('Xvfb did not start')
+        self.name = f':{int(number)}'
+
+    def close(self):
+        if self.server.poll() is None:
+            self.server.terminate()
+            try:
+                self.server.wait(5)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+                self.server.wait()
+
+
+def split_loops(num_loops, parts):
+    """Split ``num_loops`` into at most ``parts`` near-equal non-zero shares."""
+    share, extra = divmod(num_loops, parts)
+    return [share + (i < extra) for i in range(parts) if share + (i < extra)]
+
+
+def init_worker(event_queue, stop_event, displays):
+    global events, stop
+    # Ctrl+C reaches the runner, which stops the workers through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    events = event_queue
+    stop = stop_event
+    if displays is not None:
+        # Every worker process keeps one display for all of its jobs
+        os.environ['DISPLAY'] = displays.get()
+
+
+def run_job(job, path, num_loops, backend_name):
+    """Run one job in a worker process and return its result as a dict."""
+    from backends import create_backend
+    from cli import compile_sequence
+    from engine import DeadlineScheduler, Engine, ProgressChannel
+    from sequence_file import open_sequence
+
+    result = {'job': job, 'sequence': path, 'display': os.environ.get('DISPLAY'), 'loops': num_loops,
+              'loops_done': 0, 'completed': False, 'error': None, 'elapsed': 0.0}
+    started = time.perf_counter()
+    try:
+        sequence = open_sequence(path)
+        backend = create_backend(backend_name)
+        try:
+            plan = compile_sequence(sequence, backend)[0]
+            progress = ProgressChannel(lambda loop, step: events.put((job, loop, step)), max_rate=PRINT_RATE * 2)
+            engine = Engine(plan, num_loops, DeadlineScheduler(), progress=progress)
+            finished = threading.Event()
+
+            def watch():
+                # Pass a stop of the whole batch on to this engine
+                while not finished.is_set():
+                    if stop.wait(0.1):
+                        engine.control.stop()
+                        return
+
+            watcher = threading.Thread(target=watch, daemon=True)
+            watcher.start()
+            try:
+                result['completed'] = engine.run()
+            finally:
+                finished.set()
+                watcher.join()
+            result['loops_done'] = num_loops if result['completed'] else max(0, engine.current_loop - 1)
+        finally:
+            backend.close()
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    result['elapsed'] = time.perf_counter() - started
+    events.put((job, None, None))
+    return result
+
+
+class BatchProgress:
+    """The merged position of every job in a batch."""
+
+    def __init__(self, loops):
+        self.loops = loops
+        # Current loop of each job, 0 before it starts
+        self.current = [0] * len(loops)
+        self.finished = [False] * len(loops)
+
+    def update(self, job, loop):
+        if loop is None:
+            self.finished[job] = True
+        else:
+            self.current[job] = loop
+
+    def loops_done(self):
+        return sum(total if finished else max(0, loop - 1)
+                   for total, loop, finished in zip(self.loops, self.current, self.finished))
+
+    def summary(self):
+        total = sum(self.loops)
+        running = sum(1 for loop, finished in zip(self.current, self.finished) if loop and not finished)
+        return f"Loops: {self.loops_done()}/{total}, {running} of {len(self.loops)} jobs running"
+
+
+def run_parallel(jobs, workers, backend_name='xtest', screen=SCREEN, publish=None):
+    """Run ``jobs``, a list of ``(sequence path, loops)``, on ``workers`` processes.
+
+    ``publish`` is called with a BatchProgress at most PRINT_RATE times a
+    second. Returns the job results in job order. A KeyboardInterrupt stops
+    every worker before it is passed on.
+    """
+    context = multiprocessing.get_context('spawn')
+    event_queue = context.Queue()
+    stop_event = context.Event()
+    displays = []
+    display_queue = None
+    progress = BatchProgress([loops for path, loops in jobs])
+    try:
+        if backend_name not in ('null', 'record'):
+            display_queue = context.Queue()
+            for _ in range(workers):
+                display = XvfbDisplay(screen)
+                displays.append(display)
+                display_queue.put(display.name)
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                 initargs=(event_queue, stop_event, display_queue)) as pool:
+            futures = [pool.submit(run_job, job, path, loops, backend_name)
+                       for job, (path, loops) in enumerate(jobs)]
+            try:
+                next_publish = 0.0
+                while not all(future.done() for future in futures):
+                    try:
+                        job, loop, step = event_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    progress.update(job, loop)
+                    now = time.monotonic()
+                    if publish and now >= next_publish:
+                        next_publish = now + 1 / PRINT_RATE
+                        publish(progress)
+            except KeyboardInterrupt:
+                stop_event.set()
+                raise
+            results = [future.result() for future in futures]
+        for result in results:
+            progress.update(result['job'], None)
+        if publish:
+            publish(progress)
+        return results
+    finally:
+        for display in displays:
+            display.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m parallel',
+                                     description='Run ClickerPro sequences on several virtual displays at once.')
+    parser.add_argument('sequences', nargs='+', metavar='sequence', help='sequence files to run')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes and displays (default: one per CPU)')
+    parser.add_argument('-n', '--loops', type=int,
+                        help='loops per sequence (default: the value saved in the file, or 1); '
+                             'a single sequence has them split between the workers')
+    parser.add_argument('--backend', default='xtest', choices=sorted(BACKENDS),
+                        help='input backend of each worker (default: xtest)')
+    parser.add_argument('--screen', default=SCREEN, help=f'Xvfb screen as WxHxDEPTH (default: {SCREEN})')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print progress')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers < 1:
+        print("--workers must be at least 1", file=sys.stderr)
+        return 1
+
+    from sequence_file import open_sequence
+
+    jobs = []
+    for path in args.sequences:
+        try:
+            sequence = open_sequence(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading {path}: {e}", file=sys.stderr)
+            return 1
+        num_loops = args.loops if args.loops is not None else sequence.loops or 1
+        if len(args.sequences) == 1:
+            jobs = [(path, loops) for loops in split_loops(num_loops, args.workers)]
+        else:
+            jobs.append((path, num_loops))
+    workers = min(args.workers, len(jobs)) or 1
+
+    def on_progress(progress):
+        print(progress.summary(), flush=True)
+
+    started = time.perf_counter()
+    try:
+        results = run_parallel(jobs, workers, args.backend, args.screen, None if args.quiet else on_progress)
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return 130
+    except RuntimeError as e:
+        print(f"Could not start displays: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+
+    done = 0
+    for result in results:
+        done += result['loops_done']
+        where = f" on {result['display']}" if result['display'] else ''
+        line = (f"Job {result['job'] + 1}: {result['sequence']}{where}, "
+                f"{result['loops_done']}/{result['loops']} loops in {result['elapsed']:.1f} s")
+        if result['error']:
+            line += f", error: {result['error']}"
+        print(line, file=sys.stderr if result['error'] else sys.stdout)
+    print(f"{done} loops in {elapsed:.1f} s with {workers} workers ({done / elapsed if elapsed else 0:.1f} loops/s)")
+    return 0 if all(result['completed'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""Blocks, repeats, subroutines and conditions in a command list.
+
+Control rows sit in the command list next to ordinary steps and keep
+their argument in the text field:
+
+    repeat N        run the rows up to the matching 'end' N times
+    sub NAME        define a subroutine, up to the matching 'end'
+    call NAME       run a subroutine
+    if CONDITION    run the block if a wait condition (see visual_wait.py)
+                    holds within its timeout, otherwise the 'else' block
+    else
+    end
+
+The position of an 'if' row is where its condition is checked. Control
+rows take no time, their interval is not used.
+
+compile_program turns such a list into a Program: a few flat arrays of
+opcodes and jump targets plus one bound callable per step. The Engine
+interprets it one step at a time, so a block repeated a thousand times
+costs the same memory as running it once. Each step is reported with its
+row in the command list.
+
+Progress and ETA come from the structure: every step row gets a weight,
+the number of times it runs per loop (both branches of an 'if' with an
+'else' count half). ``length`` is the expected number of steps per loop
+and ``weights`` seeds engine.EtaEstimator.
+"""
+from array import array
+
+from engine import compile_command
+
+CONTROL_ACTIONS = ('repeat', 'end', 'sub', 'call', 'if', 'else')
+# Calls nested deeper than this are taken for runaway recursion
+MAX_DEPTH = 100
+
+STEP, REPEAT, END_REPEAT, CALL, RETURN, JUMP, IF = range(7)
+
+
+def uses_control_flow(actions):
+    return any(action in CONTROL_ACTIONS for action in actions)
+
+
+class Program:
+    def __init__(self, ops, args, targets, rows, steps, conditions, intervals, weights):
+        # Instruction i is ops[i] with args[i] and targets[i]. For STEP the
+        # arg indexes steps, for IF it indexes conditions, for REPEAT it is
+        # the count. targets hold jump addresses.
+        self.ops = ops
+        self.args = args
+        self.targets = targets
+        # Command row of each instruction
+        self.rows = rows
+        self.steps = steps
+        self.conditions = conditions
+        # Per command row: configured interval and runs per loop
+        self.intervals = intervals
+        self.weights = weights
+        self.length = round(sum(weights))
+        # Interpreter position after the last step yielded, for state()
+        self.pc = 0
+        self.frames = ([], [])
+
+    def indexed(self, state=None, guard=None):
+        """Yield ``(row, (step, interval))`` for each step of one loop.
+
+        With a ``state`` from state(), continue the loop from there instead
+        of from its start. ``guard``, if given, evaluates conditions as
+        ``guard(condition.wait, row)``, e.g. under a watchdog.
+        """
+        ops, args, targets, rows = self.ops, self.args, self.targets, self.rows
+        steps, conditions, intervals = self.steps, self.conditions, self.intervals
+        counters = []
+        returns = []
+        pc = 0
+        if state:
+            pc, depth = state[0], state[1]
+            counters = list(state[2:2 + depth])
+            rest = state[2 + depth:]
+            returns = list(zip(rest[::2], rest[1::2]))
+        self.frames = counters, returns
+        end = len(ops)
+        while pc < end:
+            op = ops[pc]
+            if op == STEP:
+                row = rows[pc]
+                self.pc = pc + 1
+                yield row, (steps[args[pc]], intervals[row])
+                pc += 1
+            elif op == REPEAT:
+                if args[pc] > 0:
+                    counters.append(args[pc])
+                    pc += 1
+                else:
+                    pc = targets[pc]
+            elif op == END_REPEAT:
+                counters[-1] -= 1
+                if counters[-1]:
+                    pc = targets[pc]
+                else:
+                    counters.pop()
+                    pc += 1
+            elif op == CALL:
+                if len(returns) >= MAX_DEPTH:
+                    raise RuntimeError(f"Subroutines nested more than {MAX_DEPTH} deep in command {rows[pc] + 1}")
+                # Loops running in the caller resume after the call returns
+                returns.append((pc + 1, len(counters)))
+                pc = targets[pc]
+            elif op == RETURN:
+                pc, depth = returns.pop()
+                del counters[depth:]
+            elif op == JUMP:
+                pc = targets[pc]
+            elif op == IF:
+                wait = conditions[args[pc]].wait
+                holds = guard(wait, rows[pc]) if guard else wait()
+                pc = pc + 1 if holds else targets[pc]
+
+    def __iter__(self):
+        for row, step in self.indexed():
+            yield step
+
+    def state(self):
+        """Where the loop in progress continues after the last step, as integers."""
+        counters, returns = self.frames
+        state = [self.pc, len(counters), *counters]
+        for address, depth in returns:
+            state += (address, depth)
+        return state
+
+
+def parse_count(text, row):
+    try:
+        count = int(text)
+    except (TypeError, ValueError):
+        raise ValueError(f"Repeat count '{text}' is not a whole number in command {row + 1}") from None
+    if count < 0:
+        raise ValueError(f"Repeat count '{text}' is negative in command {row + 1}")
+    return count
+
+
+def compile_program(commands, backend, data=None):
+    """Compile a command list with control rows into a Program.
+
+    Raises ValueError for unbalanced blocks, unknown subroutines and the
+    errors compile_commands reports for ordinary steps. ``data`` is passed
+    on to the text steps like compile_commands does.
+    """
+    from visual_wait import VisualWait, parse_wait
+
+    ops = array('B')
+    args = array('i')
+    targets = array('i')
+    rows = array('I')
+    steps = []
+    conditions = []
+    intervals = array('d')
+    # Open blocks as (kind, instruction address, row)
+    blocks = []
+    subroutines = {}
+    calls = []
+    elses = {}
+
+    def emit(op, arg=0, target=0, row=0):
+        ops.append(op)
+        args.append(arg)
+        targets.append(target)
+        rows.append(row)
+        return len(ops) - 1
+
+    for row, command in enumerate(commands):
+        position, interval, action, *extra_data = command
+        intervals.append(interval)
+        text = extra_data[0].strip() if extra_data else ''
+        if action == 'repeat':
+            address = emit(REPEAT, parse_count(text, row), row=row)
+            blocks.append(('repeat', address, row))
+        elif action == 'sub':
+            if blocks:
+                raise ValueError(f"Subroutine in command {row + 1} must not be inside a block")
+            if not text:
+                raise ValueError(f"Subroutine in command {row + 1} has no name")
+            if text in subroutines:
+                raise ValueError(f"Subroutine '{text}' defined twice, again in command {row + 1}")
+            # Normal flow jumps over the body; calls enter after the jump
+            address = emit(JUMP, row=row)
+            subroutines[text] = address + 1
+            blocks.append(('sub', address, row))
+        elif action == 'call':
+            calls.append((emit(CALL, row=row), text, row))
+        elif action == 'if':
+            try:
+                condition = VisualWait(backend, position, parse_wait(text))
+            except ValueError as e:
+                raise ValueError(f"{e} in command {row + 1}") from None
+            conditions.append(condition)
+            address = emit(IF, len(conditions) - 1, row=row)
+            blocks.append(('if', address, row))
+        elif action == 'else':
+            if not blocks or blocks[-1][0] != 'if':
+                raise ValueError(f"'else' in command {row + 1} has no matching 'if'")
+            kind, address, start = blocks.pop()
+            # The 'if' block jumps past the else block when it finishes
+            jump = emit(JUMP, row=row)
+            targets[address] = jump + 1
+            elses[address] = jump
+            blocks.append(('else', jump, start))
+        elif action == 'end':
+            if not blocks:
+                raise ValueError(f"'end' in command {row + 1} has no matching block")
+            kind, address, start = blocks.pop()
+            if kind == 'repeat':
+                emit(END_REPEAT, target=address + 1, row=row)
+            elif kind == 'sub':
+                emit(RETURN, row=row)
+            targets[address] = len(ops)
+        else:
+            steps.append(compile_command(row, command, backend, data)[0])
+            emit(STEP, len(steps) - 1, row=row)
+
+    if blocks:
+        kind, address, row = blocks[-1]
+        raise ValueError(f"'{kind}' in command {row + 1} has no matching 'end'")
+    for address, name, row in calls:
+        try:
+            targets[address] = subroutines[name]
+        except KeyError:
+            raise ValueError(f"Unknown subroutine '{name}' in command {row + 1}") from None
+
+    weights = step_weights(ops, args, targets, rows, len(intervals), elses)
+    return Program(ops, args, targets, rows, steps, conditions, intervals, weights)
+
+
+def step_weights(ops, args, targets, rows, count, elses):
+    """Expected runs per loop of every row, from the program structure.
+
+    ``elses`` maps the address of each IF with an else block to the jump
+    that ends its first block.
+    """
+    weights = array('d', bytes(8 * count))
+
+    def walk(pc, stop, factor, active):
+        # Adds ``factor`` runs of instructions pc..stop, following calls
+        multipliers = []
+        while pc < stop:
+            op = ops[pc]
+            if op == STEP:
+                weights[rows[pc]] += factor
+            elif op == REPEAT:
+                multipliers.append(factor)
+                factor *= args[pc]
+            elif op == END_REPEAT:
+                factor = multipliers.pop()
+            elif op == CALL:
+                entry = targets[pc]
+                # Recursion is counted once, its depth is not known here
+                if entry not in active:
+                    walk(entry, targets[entry - 1] - 1, factor, active | {entry})
+            elif op == JUMP:
+                # Only subroutine definitions; else blocks are handled by IF
+                pc = targets[pc]
+                continue
+            elif op == IF:
+                jump = elses.get(pc)
+                if jump is None:
+                    walk(pc + 1, targets[pc], factor, active)
+                    pc = targets[pc]
+                else:
+                    walk(pc + 1, jump, factor / 2, active)
+                    walk(jump + 1, targets[jump], factor / 2, active)
+                    pc = targets[jump]
+                continue
+            pc += 1
+
+    walk(0, len(ops), 1.0, frozenset())
+    return weights
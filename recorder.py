@@ -0,0 +1,204 @@
+"""Record live mouse and keyboard input as a command sequence.
+
+The pynput listeners call the handlers below on their own threads. The
+handlers only append a small tuple to a deque and pointer motion is not
+queued at all: only the latest position is kept, and it is dropped when a
+click follows. The mouse and keyboard threads share that state, so the
+handlers take a lock, and an event is timestamped under it so events stay
+in time order. Turning the raw events into commands happens once, when
+recording stops:
+
+* two left clicks in the same place in quick succession become '2click'
+* runs of typed characters become one 'text' step, with backspaces applied
+* Ctrl shortcuts and special keys map to the matching actions
+
+Every command's interval is the time until the next recorded step, so the
+sequence replays with the recorded pacing.
+"""
+import threading
+import time
+from collections import deque
+
+# Ctrl+<letter> shortcuts that have an action
+HOTKEYS = {
+    'c': 'copy',
+    'v': 'paste',
+    'w': 'close tab',
+    'a': 'select all',
+}
+
+# pynput special key names that have an action
+KEY_ACTIONS = {
+    'enter': 'enter',
+    'up': 'move up',
+    'down': 'move down',
+    'left': 'move left',
+    'right': 'move right',
+    'end': 'go to end',
+    'home': 'go to beginning',
+    'backspace': 'backspace',
+}
+
+CLICK_ACTIONS = {
+    'left': 'click',
+    'right': 'right click',
+}
+
+
+class Recorder:
+    def __init__(self, text_gap=1.0, double_click_time=0.4, min_distance=3, clock=time.perf_counter):
+        # Characters further apart than this (in seconds) start a new text step
+        self.text_gap = text_gap
+        self.double_click_time = double_click_time
+        # Pointer motion smaller than this (in pixels) after a click is ignored
+        self.min_distance = min_distance
+        self.clock = clock
+        self.events = deque()
+        # Guards events, pending_move and last_click across listener threads
+        self.lock = threading.Lock()
+        self.pending_move = None
+        self.last_click = None
+        self.ctrl = False
+        self.listeners = []
+
+    def start(self):
+        from pynput import keyboard, mouse
+
+        self.events.clear()
+        self.pending_move = None
+        self.last_click = None
+        self.listeners = [
+            mouse.Listener(on_move=self.on_move, on_click=self.on_click),
+            keyboard.Listener(on_press=self.on_press, on_release=self.on_release),
+        ]
+        for listener in self.listeners:
+            listener.start()
+
+    def stop(self):
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners = []
+
+    @property
+    def recording(self):
+        return bool(self.listeners)
+
+    # Listener thread handlers. Events are (time, kind, value, x, y).
+
+    def add(self, kind, value, x=0, y=0):
+        with self.lock:
+            self.events.append((self.clock(), kind, value, x, y))
+
+    def on_move(self, x, y):
+        with self.lock:
+            self.pending_move = (self.clock(), x, y)
+
+    def on_click(self, x, y, button, pressed):
+        if not pressed:
+            return
+        with self.lock:
+            self.pending_move = None
+            self.last_click = (x, y)
+            self.events.append((self.clock(), 'click', button.name, x, y))
+
+    def flush_move(self):
+        # A pointer move that no click followed is kept as a 'none' step
+        with self.lock:
+            move = self.pending_move
+            self.pending_move = None
+            if move is None:
+                return
+            when, x, y = move
+            last = self.last_click
+            if last and abs(x - last[0]) < self.min_distance and abs(y - last[1]) < self.min_distance:
+                return
+            self.events.append((when, 'move', None, x, y))
+
+    def on_press(self, key):
+        name = getattr(key, 'name', None)
+        if name in ('ctrl', 'ctrl_l', 'ctrl_r'):
+            self.ctrl = True
+            return
+        self.flush_move()
+        char = getattr(key, 'char', None)
+        if self.ctrl:
+            if char:
+                # With Ctrl held some platforms report control characters
+                letter = chr(ord(char) + 96) if ord(char) < 32 else char.lower()
+                action = HOTKEYS.get(letter)
+                if action:
+                    self.add('key', action)
+            return
+        if name == 'space':
+            char = ' '
+        if char:
+            self.add('char', char)
+        elif name in KEY_ACTIONS:
+            self.add('key', KEY_ACTIONS[name])
+
+    def on_release(self, key):
+        if getattr(key, 'name', None) in ('ctrl', 'ctrl_l', 'ctrl_r'):
+            self.ctrl = False
+
+    def commands(self, ignore=None):
+        """Fold the recorded events into commands.
+
+        ``ignore(x, y)`` may return True for clicks that should be left out,
+        e.g. clicks on the recorder's own window.
+        """
+        self.flush_move()
+        return fold_events(list(self.events), self.text_gap, self.double_click_time, ignore)
+
+
+def fold_events(events, text_gap=1.0, double_click_time=0.4, ignore=None):
+    """Turn ``(time, kind, value, x, y)`` events into commands."""
+    # (time, action, position, text) for each step, before intervals are known
+    steps = []
+    text = None
+    last_char = 0.0
+    for when, kind, value, x, y in events:
+        in_burst = text is not None and when - last_char <= text_gap
+        if kind == 'char':
+            if in_burst:
+                text.append(value)
+            else:
+                text = [value]
+                steps.append([when, 'text', (0, 0), text])
+            last_char = when
+            continue
+        if kind == 'key' and value == 'backspace' and in_burst and text:
+            text.pop()
+            last_char = when
+            continue
+        text = None
+
+        if kind == 'click':
+            if ignore and ignore(x, y):
+                continue
+            action = CLICK_ACTIONS.get(value)
+            if action is None:
+                continue
+            if steps:
+                previous = steps[-1]
+                px, py = previous[2]
+                if (action == 'click' and previous[1] == 'click' and when - previous[0] <= double_click_time
+                        and abs(x - px) <= 2 and abs(y - py) <= 2):
+                    previous[1] = '2click'
+                    continue
+            steps.append([when, action, (x, y), None])
+        elif kind == 'move':
+            steps.append([when, 'none', (x, y), None])
+        elif kind == 'key':
+            steps.append([when, value, (0, 0), None])
+
+    # Backspaces can empty a text step completely
+    steps = [step for step in steps if step[1] != 'text' or step[3]]
+
+    commands = []
+    for i, (when, action, position, text) in enumerate(steps):
+        interval = round(steps[i + 1][0] - when, 3) if i + 1 < len(steps) else 0.0
+        if action == 'text':
+            commands.append((position, interval, action, ''.join(text)))
+        else:
+            commands.append((position, interval, action))
+    return commands
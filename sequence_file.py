@@ -0,0 +1,183 @@
+"""Reading and writing command sequences.
+
+There are two formats, both versioned. The JSON format is for small,
+hand-editable files::
+
+    {"version": 1, "loops": 10, "commands": [
+        {"position": [100, 200], "interval": 0.5, "action": "click"},
+        {"position": [0, 0], "interval": 1, "action": "text", "text": "hello"},
+        {"position": [0, 0], "interval": 1, "action": "text", "text": "long", "strategy": "paste"}
+    ]}
+
+The line format (``.jsonl``) is for very large generated macros. The first
+line is a header and every other line is one compact command::
+
+    {"format": "clickerpro-lines", "version": 1, "loops": 10}
+    [100,200,0.5,"click"]
+    [0,0,1,"text","hello"]
+    [0,0,1,"text","long","paste"]
+
+Line files are read as a stream, so a run can start before the whole file
+has been parsed and memory stays flat. Commands come back in the same
+``(position, interval, action[, text[, strategy]])`` form the GUI builds.
+The strategy is one of engine.TEXT_STRATEGIES and is omitted for plain
+typing. 'wait' steps keep their condition in "text" (see visual_wait.py)
+and pointer steps can name an "image" to find on screen (image_target.py).
+"""
+import json
+
+from command_store import ANCHOR_ACTIONS, TEXT_ACTIONS
+
+VERSION = 1
+LINES_FORMAT = 'clickerpro-lines'
+
+
+def command_from_dict(data):
+    position = tuple(int(v) for v in data['position'])
+    interval = float(data['interval'])
+    action = data['action']
+    if action == 'text' and data.get('strategy'):
+        return position, interval, action, data.get('text', ''), data['strategy']
+    if action in TEXT_ACTIONS:
+        return position, interval, action, data.get('text', '')
+    if action in ANCHOR_ACTIONS and data.get('image'):
+        return position, interval, action, data['image']
+    return position, interval, action
+
+
+def command_to_dict(command):
+    position, interval, action, *extra_data = command
+    data = {'position': list(position), 'interval': interval, 'action': action}
+    if action in TEXT_ACTIONS:
+        data['text'] = extra_data[0] if extra_data else ''
+        if len(extra_data) > 1 and extra_data[1]:
+            data['strategy'] = extra_data[1]
+    elif action in ANCHOR_ACTIONS and extra_data and extra_data[0]:
+        data['image'] = extra_data[0]
+    return data
+
+
+def command_from_line(line):
+    x, y, interval, action, *extra_data = json.loads(line)
+    if action in TEXT_ACTIONS:
+        if len(extra_data) > 1 and extra_data[1]:
+            return (x, y), interval, action, extra_data[0], extra_data[1]
+        return (x, y), interval, action, extra_data[0] if extra_data else ''
+    if action in ANCHOR_ACTIONS and extra_data and extra_data[0]:
+        return (x, y), interval, action, extra_data[0]
+    return (x, y), interval, action
+
+
+def command_to_line(command):
+    position, interval, action, *extra_data = command
+    row = [position[0], position[1], interval, action]
+    if action in TEXT_ACTIONS:
+        row.append(extra_data[0] if extra_data else '')
+        if len(extra_data) > 1 and extra_data[1]:
+            row.append(extra_data[1])
+    elif action in ANCHOR_ACTIONS and extra_data and extra_data[0]:
+        row.append(extra_data[0])
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+
+
+def check_version(version):
+    if version > VERSION:
+        raise ValueError(f"Sequence file version {version} is newer than supported version {VERSION}")
+
+
+class SequenceFile:
+    """An opened sequence file.
+
+    Only the header is read when it is opened. Iterating yields commands.
+    For line files each iteration reads the file again from disk, so it can
+    be iterated once per loop without keeping the commands in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.commands = None
+        with open(path, encoding='utf-8') as f:
+            header = self.read_header(f.readline())
+            if header is None:
+                f.seek(0)
+                data = json.load(f)
+                self.format = 'json'
+                self.version = data.get('version', VERSION)
+                check_version(self.version)
+                self.loops = data.get('loops')
+                self.commands = [command_from_dict(item) for item in data['commands']]
+            else:
+                self.format = 'lines'
+                self.version = header.get('version', VERSION)
+                check_version(self.version)
+                self.loops = header.get('loops')
+
+    @staticmethod
+    def read_header(line):
+        # A line file starts with a complete JSON object naming its format
+        if not line.lstrip().startswith('{'):
+            return None
+        try:
+            header = json.loads(line)
+        except ValueError:
+            return None
+        if isinstance(header, dict) and header.get('format') == LINES_FORMAT:
+            return header
+        return None
+
+    @property
+    def streaming(self):
+        return self.commands is None
+
+    def __iter__(self):
+        if self.commands is not None:
+            yield from self.commands
+            return
+        with open(self.path, encoding='utf-8') as f:
+            f.readline()
+            for number, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                try:
+                    yield command_from_line(line)
+                except (ValueError, TypeError) as e:
+                    raise ValueError(f"{self.path}, line {number}: {e}") from None
+
+
+def open_sequence(path):
+    return SequenceFile(path)
+
+
+def load_sequence(path):
+    """Return ``(commands, loops)``. ``loops`` is None if the file has none."""
+    sequence = SequenceFile(path)
+    return list(sequence), sequence.loops
+
+
+def save_sequence(path, commands, loops=None, format=None):
+    """Write ``commands`` (any iterable) to ``path``.
+
+    ``format`` is 'json' or 'lines'. By default ``.jsonl`` files get the line
+    format and everything else gets JSON. Line files are written one command
+    at a time.
+    """
+    if format is None:
+        format = 'lines' if str(path).endswith('.jsonl') else 'json'
+
+    if format == 'lines':
+        header = {'format': LINES_FORMAT, 'version': VERSION}
+        if loops is not None:
+            header['loops'] = loops
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + '\n')
+            for command in commands:
+                f.write(command_to_line(command) + '\n')
+    elif format == 'json':
+        data = {'version': VERSION}
+        if loops is not None:
+            data['loops'] = loops
+        data['commands'] = [command_to_dict(command) for command in commands]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+    else:
+        raise ValueError(f"Unknown sequence format '{format}'")
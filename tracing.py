@@ -0,0 +1,236 @@
+"""Optional execution trace of a run.
+
+StepTracer records every executed step in preallocated arrays used as a
+ring buffer, so tracing a long run keeps only the most recent
+``capacity`` steps. Each record holds the loop, the step index,
+perf_counter_ns start and end of the action, the time the scheduler
+planned the step for, and the step's action and position. The position is
+where the step acted, so for an image-anchored step it is where the image
+was found. Pauses and errors are kept separately.
+
+A trace can be written as Chrome trace JSON (open it in chrome://tracing
+or https://ui.perfetto.dev) or in a compact binary form that
+``read_binary`` loads back.
+"""
+import json
+import struct
+import time
+from array import array
+
+from image_target import AnchoredStep
+
+MAGIC = b'CPTR'
+VERSION = 2
+HEADER = struct.Struct('<4sHIIII')
+# loop, step, start, end, scheduled, action code, x, y
+RECORD = struct.Struct('<IIqqqHii')
+# Version 1 records had no action or position
+RECORD_V1 = struct.Struct('<IIqqq')
+PAUSE = struct.Struct('<qq')
+
+
+class StepTracer:
+    """Ring buffer of step records.
+
+    ``describe(step)`` returns ``(action, position)`` for a step index, see
+    describe_commands; without it records have no action or position.
+    """
+
+    def __init__(self, capacity=100_000, describe=None):
+        self.capacity = capacity
+        self.describe = describe
+        self.loops = array('I', bytes(4 * capacity))
+        self.steps = array('I', bytes(4 * capacity))
+        self.starts = array('q', bytes(8 * capacity))
+        self.ends = array('q', bytes(8 * capacity))
+        # Planned start in ns, or 0 when the run has no deadline scheduler
+        self.scheduled = array('q', bytes(8 * capacity))
+        # Index into action_names, 0 for no action
+        self.actions = array('H', bytes(2 * capacity))
+        self.xs = array('i', bytes(4 * capacity))
+        self.ys = array('i', bytes(4 * capacity))
+        self.action_names = ['']
+        self.action_ids = {'': 0}
+        self.count = 0
+        self.pauses = []
+        self.errors = []
+        self.paused_at = None
+
+    def record(self, loop, step, start, end, scheduled, bound=None):
+        """Record a step; ``bound`` is the callable that ran it."""
+        i = self.count % self.capacity
+        self.loops[i] = loop
+        self.steps[i] = step
+        self.starts[i] = start
+        self.ends[i] = end
+        self.scheduled[i] = scheduled
+        if self.describe:
+            action, position = self.describe(step)
+            if type(bound) is AnchoredStep:
+                # It acted where the image was found
+                position = bound.target.hit[0]
+            try:
+                self.actions[i] = self.action_ids[action]
+            except KeyError:
+                self.actions[i] = self.action_ids[action] = len(self.action_names)
+                self.action_names.append(action)
+            self.xs[i], self.ys[i] = position
+        self.count += 1
+
+    def pause_started(self):
+        self.paused_at = time.perf_counter_ns()
+
+    def pause_ended(self):
+        if self.paused_at is not None:
+            self.pauses.append((self.paused_at, time.perf_counter_ns()))
+            self.paused_at = None
+
+    def error(self, message):
+        self.errors.append((time.perf_counter_ns(), str(message)))
+
+    def stored(self):
+        """Number of records kept, at most ``capacity``."""
+        return min(self.count, self.capacity)
+
+    def records(self):
+        """Yield ``(loop, step, start, end, scheduled, action, position)`` oldest first.
+
+        ``action`` and ``position`` are None for records without them.
+        """
+        first = self.count - self.stored()
+        names = self.action_names
+        for n in range(first, self.count):
+            i = n % self.capacity
+            action = names[self.actions[i]] or None
+            yield (self.loops[i], self.steps[i], self.starts[i], self.ends[i], self.scheduled[i],
+                   action, (self.xs[i], self.ys[i]) if action else None)
+
+
+def chrome_trace(records, pauses=(), errors=()):
+    """Build a Chrome trace dict.
+
+    Events are named by their action. Times are relative to the earliest
+    one recorded.
+    """
+    records = list(records)
+    times = [r[4] or r[2] for r in records] + [p[0] for p in pauses] + [e[0] for e in errors]
+    origin = min(times, default=0)
+    events = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'steps'}},
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 2, 'args': {'name': 'pauses'}},
+    ]
+    for loop, step, start, end, scheduled, action, position in records:
+        args = {'loop': loop, 'step': step + 1}
+        name = f'step {step + 1}'
+        if action:
+            name = action
+            args['position'] = list(position)
+        if scheduled:
+            args['scheduled_us'] = (scheduled - origin) / 1000
+            args['late_us'] = (start - scheduled) / 1000
+        events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                       'ts': (start - origin) / 1000, 'dur': (end - start) / 1000, 'args': args})
+    for start, end in pauses:
+        events.append({'name': 'paused', 'ph': 'X', 'pid': 1, 'tid': 2,
+                       'ts': (start - origin) / 1000, 'dur': (end - start) / 1000})
+    for when, message in errors:
+        events.append({'name': 'error', 'ph': 'i', 's': 'g', 'pid': 1, 'tid': 1,
+                       'ts': (when - origin) / 1000, 'args': {'message': message}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(path, tracer):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(chrome_trace(tracer.records(), tracer.pauses, tracer.errors), f)
+
+
+def write_binary(path, tracer):
+    errors = [(when, message.encode('utf-8')) for when, message in tracer.errors]
+    names = [name.encode('utf-8') for name in tracer.action_names]
+    ids = tracer.action_ids
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, tracer.stored(), len(tracer.pauses), len(errors), tracer.count))
+        # Action names by code, the first being '' for no action
+        f.write(struct.pack('<H', len(names)))
+        for name in names:
+            f.write(struct.pack('<H', len(name)) + name)
+        for *record, action, position in tracer.records():
+            f.write(RECORD.pack(*record, ids[action or ''], *(position or (0, 0))))
+        for pause in tracer.pauses:
+            f.write(PAUSE.pack(*pause))
+        for when, message in errors:
+            f.write(struct.pack('<qI', when, len(message)) + message)
+
+
+def read_binary(path):
+    """Return ``(records, pauses, errors, total)`` from a binary trace.
+
+    Records are in the form StepTracer.records yields.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, count, pause_count, error_count, total = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a ClickerPro trace")
+    if version > VERSION:
+        raise ValueError(f"Trace version {version} is newer than supported version {VERSION}")
+    offset = HEADER.size
+    if version == 1:
+        records = [RECORD_V1.unpack_from(data, offset + i * RECORD_V1.size) + (None, None) for i in range(count)]
+        offset += count * RECORD_V1.size
+    else:
+        names = []
+        (name_count,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        for _ in range(name_count):
+            (length,) = struct.unpack_from('<H', data, offset)
+            offset += 2
+            names.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        records = []
+        for i in range(count):
+            *record, code, x, y = RECORD.unpack_from(data, offset + i * RECORD.size)
+            action = names[code] or None
+            records.append((*record, action, (x, y) if action else None))
+        offset += count * RECORD.size
+    pauses = [PAUSE.unpack_from(data, offset + i * PAUSE.size) for i in range(pause_count)]
+    offset += pause_count * PAUSE.size
+    errors = []
+    for _ in range(error_count):
+        when, length = struct.unpack_from('<qI', data, offset)
+        offset += 12
+        errors.append((when, data[offset:offset + length].decode('utf-8')))
+        offset += length
+    return records, pauses, errors, total
+
+
+def write_trace(path, tracer):
+    """Write Chrome trace JSON, or the binary form for ``.bin`` paths."""
+    if str(path).endswith('.bin'):
+        write_binary(path, tracer)
+    else:
+        write_chrome_trace(path, tracer)
+
+
+def describe_commands(commands, rows=None):
+    """Make a ``describe`` function from an indexable command sequence.
+
+    ``rows`` maps plan steps to command rows when they differ, e.g. for an
+    optimized plan.
+    """
+    def describe(step):
+        position, interval, action, *extra_data = commands[step if rows is None else rows[step]]
+        return action, position
+    return describe
+
+
+def describe_streamed(plan):
+    """Make a ``describe`` function for an engine.StreamingPlan.
+
+    The plan does not keep its rows, so only the step it is on can be
+    described, which is the one the tracer records.
+    """
+    def describe(step):
+        position, interval, action, *extra_data = plan.current[1]
+        return action, position
+    return describe
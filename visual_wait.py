@@ -0,0 +1,207 @@
+"""'wait' steps: hold the sequence until the screen is ready.
+
+A wait step's text is its condition. The step's position is the pixel to
+watch, or the top-left corner of the region::
+
+    color #1e90ff [tolerance=N]     the pixel becomes this colour
+    stable WxH [for=S]              the region stops changing for S seconds
+    match IMAGE [tolerance=N]       the region under the image matches it
+
+Every condition also takes ``timeout=S`` (default 10) and ``poll=N``
+checks per second (default 20). A wait that times out raises WaitTimeout,
+which ends the run like any other failing step.
+
+Frames come from the backend's ``grab`` and are compared with NumPy.
+The xtest and pyautogui backends read only the watched region on X11;
+on Windows pyautogui goes through Pillow, which captures the whole screen
+on every poll and crops it. NumPy (and Pillow for ``match``) are imported
+when the first wait step runs, not when a sequence is loaded.
+"""
+import shlex
+import time
+
+from engine import interruptible_sleep
+
+KINDS = ('color', 'stable', 'match')
+TIMEOUT = 10.0
+POLL_RATE = 20
+STABLE_FOR = 0.5
+
+
+class WaitTimeout(Exception):
+    pass
+
+
+class WaitCondition:
+    def __init__(self, kind, size=(1, 1), color=None, image=None, tolerance=0, duration=STABLE_FOR,
+                 timeout=TIMEOUT, poll=POLL_RATE):
+        self.kind = kind
+        self.size = size
+        self.color = color
+        self.image = image
+        self.tolerance = tolerance
+        self.duration = duration
+        self.timeout = timeout
+        self.poll = poll
+
+    def __repr__(self):
+        return f'WaitCondition({self.kind!r}, size={self.size})'
+
+
+def parse_number(name, value):
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name} '{value}' in wait condition") from None
+    if number < 0:
+        raise ValueError(f"Invalid {name} '{value}' in wait condition")
+    return number
+
+
+def parse_wait(text):
+    """Parse a wait condition such as ``'color #ff0000 timeout=5'``."""
+    try:
+        words = shlex.split(text or '')
+    except ValueError as e:
+        raise ValueError(f"Invalid wait condition: {e}") from None
+    if not words or words[0] not in KINDS:
+        raise ValueError(f"Wait condition must start with one of {', '.join(KINDS)}")
+    kind, *words = words
+    arguments = [word for word in words if '=' not in word]
+    options = dict(word.split('=', 1) for word in words if '=' in word)
+
+    condition = WaitCondition(kind)
+    if len(arguments) != 1:
+        raise ValueError(f"Wait condition '{kind}' takes one argument")
+    argument = arguments[0]
+    if kind == 'color':
+        value = argument.lstrip('#')
+        try:
+            if len(value) != 6:
+                raise ValueError
+            condition.color = tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            raise ValueError(f"Invalid colour '{argument}' in wait condition") from None
+    elif kind == 'stable':
+        try:
+            width, height = (int(v) for v in argument.lower().split('x'))
+        except ValueError:
+            raise ValueError(f"Invalid region size '{argument}' in wait condition") from None
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Invalid region size '{argument}' in wait condition")
+        condition.size = width, height
+    else:
+        condition.image = argument
+
+    for name, value in options.items():
+        if name == 'timeout':
+            condition.timeout = parse_number(name, value)
+        elif name == 'poll':
+            condition.poll = parse_number(name, value) or POLL_RATE
+        elif name == 'tolerance' and kind in ('color', 'match'):
+            condition.tolerance = parse_number(name, value)
+        elif name == 'for' and kind == 'stable':
+            condition.duration = parse_number(name, value)
+        else:
+            raise ValueError(f"Unknown option '{name}' for wait condition '{kind}'")
+    return condition
+
+
+def load_image(path):
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+class VisualWait:
+    """A compiled wait step. Calling it blocks until the condition holds."""
+
+    def __init__(self, backend, position, condition, clock=time.perf_counter):
+        self.backend = backend
+        self.position = position
+        self.condition = condition
+        self.clock = clock
+        self.reference = None
+
+    def region(self):
+        x, y = self.position
+        width, height = self.condition.size
+        return int(x), int(y), width, height
+
+    def checker(self):
+        # Returns a function of one frame that is True once the condition holds
+        import numpy as np
+
+        condition = self.condition
+        tolerance = condition.tolerance
+        if condition.kind == 'color':
+            color = np.array(condition.color, dtype=np.int16)
+            return lambda frame: int(np.abs(frame.astype(np.int16) - color).max()) <= tolerance
+
+        if condition.kind == 'match':
+            reference = self.reference.astype(np.int16)
+
+            def matches(frame):
+                if frame.shape != reference.shape:
+                    return False
+                return float(np.abs(frame.astype(np.int16) - reference).mean()) <= tolerance
+            return matches
+
+        clock = self.clock
+        state = {'frame': None, 'since': 0.0}
+
+        def stable(frame):
+            now = clock()
+            if state['frame'] is None or not np.array_equal(frame, state['frame']):
+                state['frame'] = frame.copy()
+                state['since'] = now
+                return False
+            return now - state['since'] >= condition.duration
+        return stable
+
+    def prepare(self):
+        """Load what the condition needs, without looking at the screen.
+
+        Dry runs call only this, to check the step without waiting.
+        """
+        condition = self.condition
+        if condition.kind == 'match' and self.reference is None:
+            try:
+                self.reference = load_image(condition.image)
+            except OSError as e:
+                raise ValueError(f"Could not load image '{condition.image}': {e}") from None
+            condition.size = self.reference.shape[1], self.reference.shape[0]
+
+    def wait(self):
+        """Poll until the condition holds.
+
+        Returns True when it holds, False on timeout and None if the run was
+        stopped while waiting.
+        """
+        condition = self.condition
+        self.prepare()
+        grab = self.backend.grab
+        region = self.region()
+        check = self.checker()
+        period = 1 / condition.poll
+        clock = self.clock
+        deadline = clock() + condition.timeout
+        while True:
+            started = clock()
+            if check(grab(region)):
+                return True
+            remaining = deadline - clock()
+            if remaining <= 0:
+                return False
+            # Polls are timed from their start, so slow captures do not lower the rate
+            delay = min(period - (clock() - started), remaining)
+            if delay > 0 and interruptible_sleep(delay):
+                return None
+
+    def __call__(self):
+        if self.wait() is False:
+            condition = self.condition
+            raise WaitTimeout(f"Timed out after {condition.timeout:g} s waiting for {condition.kind} "
+                              f"at {self.position[0]}, {self.position[1]}")
@@ -0,0 +1,268 @@
+"""Time budgets for steps, so a hung input call cannot hang the run.
+
+With a Watchdog the engine hands every step to a worker thread and waits
+for it at most the step's budget. A step still running after that is
+dealt with by the policy:
+
+    'abort'   end the run with StepTimeout (the default)
+    'skip'    leave the step behind and go on with the next one
+    'retry'   leave it behind and run it again, up to ``retries`` times,
+              then abort
+
+A Python thread blocked in a library call cannot be killed, so a step left
+behind keeps its worker thread until the call returns, and the next step
+gets a new worker. Waiting for a step also wakes up on stop, so stopping a
+run takes effect within the engine's own latency however long a step
+hangs.
+
+Budgets are per command row. By default every step gets BUDGET seconds.
+Text steps get the time their strategy needs on top: TEXT_BUDGET_PER_CHAR
+per character when typed, plus the time a 'chunked' rate takes, and with
+a data source a text with placeholders is budgeted on the text it is
+filled with for the current row. Wait and 'if' rows get their
+condition's timeout on top. ``budgets`` overrides this per action, with 0
+for no limit. Streaming plans, whose rows are not kept, are budgeted
+one row at a time as they compile it (see StreamedBudgets).
+"""
+import threading
+import time
+from array import array
+
+from engine import PASTE_SETTLE, active, parse_text_strategy
+
+POLICIES = ('abort', 'skip', 'retry')
+BUDGET = 5.0
+TEXT_BUDGET_PER_CHAR = 0.02
+
+
+class StepTimeout(Exception):
+    pass
+
+
+def text_budget(length, strategy=None, default=BUDGET):
+    """Seconds to allow for entering ``length`` characters with ``strategy``."""
+    try:
+        name, rate = parse_text_strategy(strategy)
+    except ValueError:
+        name, rate = 'type', None
+    if name == 'paste':
+        return default + PASTE_SETTLE
+    budget = default + length * TEXT_BUDGET_PER_CHAR
+    if rate:
+        budget += length / rate
+    return budget
+
+
+def is_template(text):
+    from data_source import template_fields
+    try:
+        return bool(template_fields(text))
+    except ValueError:
+        return False
+
+
+def step_budget(command, budgets=None, default=BUDGET, data=None):
+    """Budget of one command; ``data`` fills text placeholders from its current row."""
+    position, interval, action, *extra_data = command
+    if budgets and action in budgets:
+        return budgets[action]
+    text = extra_data[0] if extra_data else ''
+    if action == 'text':
+        if data is not None and data.row is not None and is_template(text):
+            try:
+                text = data.fill(text)
+            except ValueError:
+                pass
+        return text_budget(len(text), extra_data[1] if len(extra_data) > 1 else None, default)
+    if action in ('wait', 'if'):
+        from visual_wait import parse_wait
+        try:
+            return default + parse_wait(text).timeout
+        except ValueError:
+            return default
+    return default
+
+
+class StepBudgets:
+    """Budget of every plan step in seconds, 0 meaning no limit.
+
+    ``rows`` maps plan steps to command rows when they differ, e.g. for an
+    optimized plan. With a ``data`` source, text steps with placeholders
+    are budgeted when they run, on the current row's text.
+    """
+
+    def __init__(self, commands, budgets=None, default=BUDGET, rows=None, data=None):
+        if rows is not None:
+            commands = [commands[row] for row in rows]
+        self.commands = commands
+        self.budgets = budgets
+        self.default = default
+        self.data = data
+        self.values = array('d', (self.fixed(command) for command in commands))
+
+    def fixed(self, command):
+        # NaN marks a budget that depends on the data row
+        if (self.data is not None and command[2] == 'text' and len(command) > 3
+                and not (self.budgets and 'text' in self.budgets) and is_template(command[3])):
+            return float('nan')
+        return step_budget(command, self.budgets, self.default)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        value = self.values[index]
+        if value != value:
+            return step_budget(self.commands[index], self.budgets, self.default, self.data)
+        return value
+
+
+class StreamedBudgets:
+    """Budgets of an engine.StreamingPlan's steps, from the row it compiled last.
+
+    Only the step the plan is on has a budget; the rest are not read yet.
+    """
+
+    def __init__(self, plan, budgets=None, default=BUDGET, data=None):
+        self.plan = plan
+        self.budgets = budgets
+        self.default = default
+        self.data = data
+
+    def __len__(self):
+        current = self.plan.current
+        return current[0] + 1 if current else 0
+
+    def __getitem__(self, index):
+        row, command = self.plan.current
+        if row != index:
+            return self.default
+        return step_budget(command, self.budgets, self.default, self.data)
+
+
+class StepWorker(threading.Thread):
+    """Runs steps handed over by the engine thread, one at a time."""
+
+    def __init__(self, control):
+        super().__init__(daemon=True)
+        self.control = control
+        self.wakeup = threading.Condition()
+        self.step = None
+        self.done = True
+        self.result = None
+        self.error = None
+        self.closed = False
+
+    def run(self):
+        # Steps such as visual waits look for the running control here
+        active.control = self.control
+        wakeup = self.wakeup
+        condition = self.control.condition
+        while True:
+            with wakeup:
+                wakeup.wait_for(lambda: self.step is not None or self.closed)
+                if self.closed:
+                    return
+                step = self.step
+            result = error = None
+            try:
+                result = step()
+            except BaseException as e:
+                error = e
+            with condition:
+                self.result = result
+                self.error = error
+                self.step = None
+                self.done = True
+                condition.notify_all()
+
+    def submit(self, step):
+        with self.wakeup:
+            self.done = False
+            self.error = None
+            self.step = step
+            self.wakeup.notify()
+
+    def close(self):
+        # A hung step is left to finish; the thread ends after it
+        with self.wakeup:
+            self.closed = True
+            self.wakeup.notify()
+
+
+class Watchdog:
+    """Runs steps for the engine under their time budgets.
+
+    ``budgets`` holds the budget of each step index (see StepBudgets), or
+    is None to give every step ``default``. ``describe`` optionally maps an
+    index to a name for errors, such as 'Step 3 (click)'.
+    ``on_timeout`` is called with ``(index, seconds, outcome)`` for every
+    step that ran over, outcome being 'skipped', 'retried' or 'aborted';
+    the same tuples are kept in ``timeouts``.
+    """
+
+    def __init__(self, budgets=None, policy='abort', retries=1, on_timeout=None, describe=None,
+                 default=BUDGET, clock=time.perf_counter):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown timeout policy '{policy}'")
+        self.budgets = budgets
+        self.default = default
+        self.policy = policy
+        self.retries = retries
+        self.on_timeout = on_timeout
+        self.describe = describe
+        self.clock = clock
+        self.worker = None
+        # What the last step that finished returned
+        self.result = None
+        self.timeouts = []
+
+    def report(self, index, seconds, outcome):
+        self.timeouts.append((index, seconds, outcome))
+        if self.on_timeout:
+            self.on_timeout(index, seconds, outcome)
+
+    def run(self, step, index, control):
+        """Run ``step`` and return True, or False if it did not finish.
+
+        Returns early, with False, if the run is stopped meanwhile.
+        """
+        budgets = self.budgets
+        budget = budgets[index] if budgets is not None and index < len(budgets) else self.default
+        attempts = 0
+        while True:
+            worker = self.worker
+            if worker is None or worker.control is not control:
+                worker = self.worker = StepWorker(control)
+                worker.start()
+            started = self.clock()
+            worker.submit(step)
+            condition = control.condition
+            with condition:
+                condition.wait_for(lambda: worker.done or control.stopped, budget or None)
+            if worker.done:
+                if worker.error is not None:
+                    raise worker.error
+                self.result = worker.result
+                return True
+            seconds = self.clock() - started
+            # Leave the step behind with its thread
+            worker.close()
+            self.worker = None
+            if control.stopped:
+                return False
+            attempts += 1
+            if self.policy == 'skip':
+                self.report(index, seconds, 'skipped')
+                return False
+            if self.policy == 'retry' and attempts <= self.retries:
+                self.report(index, seconds, 'retried')
+                continue
+            self.report(index, seconds, 'aborted')
+            name = self.describe(index) if self.describe else f"Step {index + 1}"
+            raise StepTimeout(f"{name} still running after {seconds:.1f} s (budget {budget:g} s)")
+
+    def close(self):
+        if self.worker:
+            self.worker.close()
+            self.worker = None